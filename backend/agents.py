@@ -1,98 +1,235 @@
 """
 Plain Python Agents — Supplier, Manufacturer, Logistics, Retailer.
-Each agent uses OpenAI to generate realistic, context-aware responses
-based on real partner data from the database.
+Each agent uses the configured LLM provider (OpenAI by default) to generate
+realistic, context-aware responses based on real partner data from the database.
 """
 
-import json
-import openai
-import os
+import contextvars
+import random
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-MAX_RETRIES = 1
-RETRY_DELAY = 0.5  # seconds
+from batching import planner, estimate_component_tokens, MAX_CONCURRENCY
+from scheduler import scheduler, retry_after_seconds
+from resilience import breaker, hedged_call, raise_if_cancelled, CALL_DEADLINE_S, CallCancelled, DeadlineExceeded
+from providers import get_provider, is_rate_limit_error
+from prompts import (
+    Section,
+    build_prompt,
+    system_prompt_for,
+    record_prompt_usage,
+    project_components,
+    project_supplier_data,
+    project_manufacturing,
+    project_logistics,
+)
+from quote_cache import quote_store, component_key, normalize_name, match_supplier_id
+from schemas import validate_response, SchemaError, RESPONSE_SCHEMAS
+from usage import usage_ledger, current_phase
+
+MAX_RETRIES = 2
+RETRY_DELAY = 0.5  # seconds — base of the jittered exponential backoff
+RATE_LIMIT_DELAY = 2.0  # seconds — used when a 429 carries no Retry-After
+CHARS_PER_TOKEN = 4
+REPAIR_ROUNDS = 1  # follow-up calls for quotes the schema validator had to drop
+
+
+def _request_once(agent: str, system_prompt: str, user_prompt: str, max_tokens: int, reserved: int,
+                  timeout_s: float, payload: dict = None, on_stream=None):
+    """One provider attempt, admitted by the scheduler and bounded by timeout_s."""
+    scheduler.acquire(reserved)
+    used = 0
+    try:
+        # Admission can take a while; a caller that gave up meanwhile costs no provider call
+        raise_if_cancelled(agent)
+        provider = get_provider()
+        if on_stream is None:
+            result, info, headers = provider.complete_json(
+                agent, system_prompt, user_prompt, max_tokens, timeout_s, payload=payload,
+                response_schema=RESPONSE_SCHEMAS.get(agent),
+            )
+        else:
+            # A fresh text sink per attempt, so a retry or hedge re-parses from the start
+            result, info, headers = provider.stream_json(
+                agent, system_prompt, user_prompt, max_tokens, timeout_s, on_stream(), payload=payload,
+                response_schema=RESPONSE_SCHEMAS.get(agent),
+            )
+        scheduler.update_from_headers(headers)
+        used = info.get("total_tokens")
+        return result, info
+    finally:
+        scheduler.settle(reserved, used)
 
 
-def _call_openai(system_prompt: str, user_prompt: str, max_tokens: int = 8000) -> dict:
-    """Helper: call OpenAI and parse JSON response with retry logic."""
+def _call_openai(system_prompt: str, user_prompt: str, max_tokens: int = 8000, meta: dict = None,
+                 agent: str = "agent", deadline_s: float = None, payload: dict = None, on_stream=None) -> dict:
+    """
+    Helper: call the configured LLM provider and parse JSON response with retry logic.
+    Every attempt is admitted by the shared scheduler, hedged past the agent's p95
+    and bounded by one overall deadline; 429s pause the scheduler for Retry-After.
+    Raises CircuitOpenError without calling out while the breaker is open.
+    If `meta` is given it is filled with usage, latency, attempt count and the
+    schema validation report. Replies are validated against the agent's schema and
+    repaired locally; only an unrepairable reply costs another attempt.
+    `payload` carries the structured inputs; the offline stand-in answers from it.
+    `on_stream`, if given, is a factory returning a text sink; the reply is then
+    streamed and every attempt feeds its own sink as deltas arrive.
+    """
+    # Providers count max_tokens against TPM up front; the unused part is settled later
+    reserved = (len(system_prompt) + len(user_prompt)) // CHARS_PER_TOKEN + max_tokens
+    started = time.monotonic()
+    end = started + (deadline_s or CALL_DEADLINE_S)
     last_error = None
     for attempt in range(1, MAX_RETRIES + 2):  # 1 initial + MAX_RETRIES retries
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            break
+        raise_if_cancelled(agent)
+        breaker.allow()
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.4,
-                max_tokens=max_tokens,
+            result, info = hedged_call(
+                agent,
+                lambda timeout_s: _request_once(agent, system_prompt, user_prompt, max_tokens, reserved,
+                                                timeout_s, payload, on_stream),
+                remaining,
             )
-            result = json.loads(response.choices[0].message.content)
+            breaker.record(True)
+            print(f"[LLM] {agent}: {info.get('prompt_tokens', 0)} prompt ({info.get('cached_tokens', 0)} cached) + "
+                  f"{info.get('completion_tokens', 0)} completion tokens in {info.get('latency_s', 0):.2f}s (attempt {attempt})")
+            record_prompt_usage(agent, info.get("prompt_tokens", 0), info.get("cached_tokens", 0))
+            try:
+                result, report = validate_response(agent, result, payload)
+            except SchemaError as e:
+                last_error = e
+                print(f"[Schema] {agent} attempt {attempt}/{MAX_RETRIES + 1} unrepairable: {str(e)[:120]}")
+                continue
+            if report["repairs"] or report["invalid_items"]:
+                print(f"[Schema] {agent}: {len(report['repairs'])} local repairs, {len(report['invalid_items'])} invalid items dropped")
+            usage_ledger.record(
+                agent, model=info.get("model"), prompt_tokens=info.get("prompt_tokens", 0),
+                cached_tokens=info.get("cached_tokens", 0), completion_tokens=info.get("completion_tokens", 0),
+                latency_s=time.monotonic() - started, retries=attempt - 1,
+            )
+            if meta is not None:
+                meta.update({**info, "attempts": attempt, "validation": report})
             if attempt > 1:
-                print(f"[INFO] OpenAI call succeeded on attempt {attempt}")
+                print(f"[INFO] LLM call succeeded on attempt {attempt}")
             return result
+        except CallCancelled:
+            breaker.abandon()
+            raise
         except Exception as e:
             last_error = e
-            print(f"[WARN] OpenAI call attempt {attempt}/{MAX_RETRIES + 1} failed: {str(e)[:120]}")
+            breaker.record(False)
+            if is_rate_limit_error(e):
+                delay = retry_after_seconds(e, RATE_LIMIT_DELAY * attempt)
+                scheduler.backoff(delay)
+                print(f"[WARN] LLM rate limited (attempt {attempt}/{MAX_RETRIES + 1}) — scheduler paused {delay:.1f}s")
+                continue
+            print(f"[WARN] LLM call attempt {attempt}/{MAX_RETRIES + 1} failed: {str(e)[:120]}")
             if attempt <= MAX_RETRIES:
-                time.sleep(RETRY_DELAY * attempt)
-    raise last_error
+                time.sleep(RETRY_DELAY * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+    usage_ledger.record(agent, model=get_provider().model, latency_s=time.monotonic() - started,
+                        retries=MAX_RETRIES, ok=False)
+    raise last_error or DeadlineExceeded(f"{agent} call exceeded its deadline")
 
 
 # ═══════════════════════════════════════════
 # SUPPLIER AGENT — Plain Python (Batched)
 # ═══════════════════════════════════════════
 
-SUPPLIER_BATCH_SIZE = 6  # Components per batch — keeps response < 8K tokens
+def _supplier_prompt(batch: list, product_context: str, system_prompt: str) -> str:
+    user_prompt, _ = build_prompt(
+        "supplier", system_prompt,
+        f"Project: {product_context}",
+        [Section(f"Components ({len(batch)} items)", project_components(batch), priority=10, keep_items=True)],
+        "Generate one quote per component. Use realistic USD pricing.",
+    )
+    return user_prompt
+
+
+def _component_name(component) -> str:
+    return component.get("name", "") if isinstance(component, dict) else str(component)
 
 
-def _supplier_batch(project_id: str, batch: list, product_context: str, supplier_info: str) -> dict:
+def _match_quotes(components: list, quotes: list):
+    """
+    Pair quotes with the components they price: exact normalized name first, then the
+    best word overlap for paraphrased names, then whatever is left in order when the
+    counts line up. Matched quotes carry the requested component name.
+    Returns ({component index: quote}, unmatched quotes).
+    """
+    names = [normalize_name(_component_name(c)) for c in components]
+    first_index = {}
+    for idx, name in enumerate(names):
+        first_index.setdefault(name, idx)
+    matched, paraphrased, unmatched = {}, [], []
+    for q in quotes:
+        name = normalize_name(q.get("component_name", ""))
+        idx = first_index.get(name)
+        if idx is None:
+            paraphrased.append(q)
+        elif idx not in matched:
+            matched[idx] = q
+        else:
+            unmatched.append(q)  # a second quote for the same part
+    leftover = []
+    for q in paraphrased:
+        words = set(normalize_name(q.get("component_name", "")).split())
+        best, best_overlap = None, 0.0
+        for idx, name in enumerate(names):
+            if idx in matched or not words or not name:
+                continue
+            candidate = set(name.split())
+            overlap = len(words & candidate) / len(words | candidate)
+            if overlap > best_overlap:
+                best, best_overlap = idx, overlap
+        if best is None:
+            leftover.append(q)
+        else:
+            matched[best] = {**q, "component_name": _component_name(components[best])}
+    open_slots = [idx for idx in range(len(components)) if idx not in matched]
+    if leftover and len(leftover) == len(open_slots):
+        for idx, q in zip(open_slots, leftover):
+            matched[idx] = {**q, "component_name": _component_name(components[idx])}
+        leftover = []
+    return matched, unmatched + leftover
+
+
+def _supplier_batch(project_id: str, batch: list, product_context: str, system_prompt: str,
+                    max_tokens: int = 6000, estimated_tokens: int = 0, selected_suppliers: list = None) -> dict:
     """Process a single batch of components through the supplier agent."""
-    system_prompt = f"""You are a Supplier Agent in a supply chain AI system.
-You have access to these REAL suppliers from your database:
-
-{supplier_info}
-
-For each component, assign it to the BEST matching supplier and generate a quote.
-
-COST RULES:
-- unit_cost_usd = realistic market price in USD (steel rod $15-50, circuit board $8-200, engine block $2000-8000, etc.)
-- Multiply base market price by the supplier's cost_multiplier
-- quantity = units the project needs
-- total_line_cost = unit_cost_usd × quantity
-- Prices MUST be realistic USD, NOT raw cost_multiplier values
-
-Return JSON:
-{{
-  "quotes": [
-    {{
-      "component_name": "...",
-      "assigned_supplier": "supplier name",
-      "supplier_location": "city, country",
-      "available": true,
-      "description": "Product description",
-      "specifications": "Specs",
-      "unit_cost_usd": 0.00,
-      "quantity": 0,
-      "total_line_cost": 0.00,
-      "lead_time_days": 0,
-      "constraints": [],
-      "supplier_notes": "Why this supplier"
-    }}
-  ]
-}}"""
-
-    user_prompt = f"""Project: {product_context}
-Components ({len(batch)} items):
-{json.dumps(batch, indent=2)}
-
-Generate one quote per component. Use realistic USD pricing."""
-
-    return _call_openai(system_prompt, user_prompt, max_tokens=6000)
+    meta = {}
+    started = time.perf_counter()
+    result = _call_openai(system_prompt, _supplier_prompt(batch, product_context, system_prompt),
+                          max_tokens=max_tokens, meta=meta, agent="supplier",
+                          payload={"components": batch, "suppliers": selected_suppliers})
+    planner.observe_batch(estimated_tokens, meta.get("completion_tokens", 0), time.perf_counter() - started)
+
+    # Paraphrased names are matched back to their components first, so only quotes the
+    # validator dropped (or the model skipped) are re-requested on their own
+    matched, extra = _match_quotes(batch, result.get("quotes", []))
+    if extra:
+        print(f"[Supplier] Dropped {len(extra)} quotes that match no requested component")
+    for _ in range(REPAIR_ROUNDS):
+        missing_idx = [idx for idx in range(len(batch)) if idx not in matched]
+        if not missing_idx:
+            break
+        missing = [batch[idx] for idx in missing_idx]
+        print(f"[Supplier] Re-requesting {len(missing)}/{len(batch)} quotes that were invalid or missing")
+        repair_tokens = sum(estimate_component_tokens(c) for c in missing)
+        try:
+            repair = _call_openai(system_prompt, _supplier_prompt(missing, product_context, system_prompt),
+                                  max_tokens=min(max_tokens, max(1000, int(repair_tokens * 1.6))), agent="supplier",
+                                  payload={"components": missing, "suppliers": selected_suppliers})
+        except Exception as e:
+            print(f"[Supplier] Repair request failed: {str(e)[:100]}")
+            break
+        repaired, _ = _match_quotes(missing, repair.get("quotes", []))
+        matched.update({missing_idx[idx]: q for idx, q in repaired.items()})
+    result["quotes"] = [matched[idx] for idx in sorted(matched)]
+    return result
 
 
 def supplier_check_availability(project_id: str, components: list, product_context: str, selected_suppliers: list) -> dict:
@@ -100,49 +237,76 @@ def supplier_check_availability(project_id: str, components: list, product_conte
     Supplier Agent — batches components into groups and runs them in parallel
     so that each API call produces a small, completeable JSON response.
     """
-    supplier_info = json.dumps([
-        {
-            "name": s["name"],
-            "location": f"{s['city']}, {s['country']}",
-            "specialization": s["specialization"],
-            "lead_time_days": s["lead_time_days"],
-            "cost_multiplier": s["cost_multiplier"],
-            "reliability": f"{s['reliability']*100:.0f}%",
-            "certifications": s["certifications"],
-            "min_order_usd": s["min_order_usd"],
-        }
-        for s in selected_suppliers
-    ], indent=2)
-
-    # Split components into batches
-    batches = [components[i:i + SUPPLIER_BATCH_SIZE] for i in range(0, len(components), SUPPLIER_BATCH_SIZE)]
-    print(f"[Supplier] Splitting {len(components)} components into {len(batches)} batches of ≤{SUPPLIER_BATCH_SIZE}")
-
-    all_quotes = []
-    all_suppliers = set()
+    # Same shortlist → byte-identical system prompt across batches and requests
+    system_prompt = system_prompt_for("supplier", selected_suppliers)
+
+    # Serve fresh cached quotes first; only cache misses go to the LLM
+    slots = [quote_store.lookup(c, selected_suppliers) for c in components]
+    misses = [c for c, cached in zip(components, slots) if cached is None]
+    cache_hits = len(components) - len(misses)
+
+    # Size batches to a completion-token budget and pick concurrency from headroom
+    plan = planner.plan(misses)
+    batches = plan["batches"]
+    print(f"[Supplier] {cache_hits}/{len(components)} quotes from cache; splitting {len(misses)} components into "
+          f"{len(batches)} batches (sizes {plan['decision']['batch_sizes']}, {plan['concurrency']} workers — "
+          f"{plan['decision']['concurrency_reason']})")
+
+    batch_results = [[] for _ in batches]
     errors = []
 
     # Run batches in parallel
-    with ThreadPoolExecutor(max_workers=min(len(batches), 4)) as pool:
-        futures = {
-            pool.submit(_supplier_batch, project_id, batch, product_context, supplier_info): idx
-            for idx, batch in enumerate(batches)
-        }
-        for future in as_completed(futures):
-            batch_idx = futures[future]
-            try:
-                result = future.result()
-                batch_quotes = result.get("quotes", [])
-                all_quotes.extend(batch_quotes)
-                for q in batch_quotes:
-                    s = q.get("assigned_supplier")
-                    if s:
-                        all_suppliers.add(s)
-                print(f"[Supplier] Batch {batch_idx + 1}/{len(batches)} OK — {len(batch_quotes)} quotes")
-            except Exception as e:
-                errors.append(str(e))
-                print(f"[Supplier] Batch {batch_idx + 1}/{len(batches)} FAILED: {str(e)[:100]}")
+    if batches:
+        with ThreadPoolExecutor(max_workers=plan["concurrency"]) as pool:
+            futures = {
+                # Copy the context per batch so the request's scheduler priority follows it
+                pool.submit(contextvars.copy_context().run, _supplier_batch, project_id, batch, product_context,
+                            system_prompt, plan["max_tokens"], plan["batch_tokens"][idx], selected_suppliers): idx
+                for idx, batch in enumerate(batches)
+            }
+            for future in as_completed(futures):
+                batch_idx = futures[future]
+                try:
+                    result = future.result()
+                    batch_results[batch_idx] = result.get("quotes", [])
+                    print(f"[Supplier] Batch {batch_idx + 1}/{len(batches)} OK — {len(batch_results[batch_idx])} quotes")
+                except Exception as e:
+                    errors.append(str(e))
+                    print(f"[Supplier] Batch {batch_idx + 1}/{len(batches)} FAILED: {str(e)[:100]}")
+
+    return _merge_supplier_results(
+        project_id, components, slots, batches, batch_results, [selected_suppliers] * len(batches), errors,
+        batching=plan["decision"],
+        reasoning=f"in {len(batches)} parallel batches",
+    )
+
+
+def _merge_supplier_results(project_id: str, components: list, slots: list, batches: list, batch_results: list,
+                            batch_shortlists: list, errors: list, batching: dict, reasoning: str) -> dict:
+    """Put cached and fresh quotes back into component order and remember the fresh ones."""
+    cache_hits = sum(1 for cached in slots if cached is not None)
+    fresh_by_key = {}
+    unmatched = []
+    for batch, quotes, shortlist in zip(batches, batch_results, batch_shortlists):
+        batch_by_name = {normalize_name(c.get("name", "") if isinstance(c, dict) else c): c for c in batch}
+        for q in quotes:
+            component = batch_by_name.get(normalize_name(q.get("component_name", "")))
+            if component is None or component_key(component) in fresh_by_key:
+                unmatched.append(q)
+                continue
+            fresh_by_key[component_key(component)] = q
+            quote_store.store(component, match_supplier_id(q.get("assigned_supplier"), shortlist), q)
 
+    all_quotes = []
+    for component, cached in zip(components, slots):
+        quote = cached or fresh_by_key.pop(component_key(component), None)
+        if quote is not None:
+            all_quotes.append(quote)
+    if unmatched:
+        # Extra or duplicate quotes would price the same part twice
+        print(f"[Supplier] Ignoring {len(unmatched)} quotes that match no requested component")
+
+    all_suppliers = {q.get("assigned_supplier") for q in all_quotes if q.get("assigned_supplier")}
     total_cost = sum(
         q.get("total_line_cost") or (q.get("unit_cost_usd", 0) * q.get("quantity", 1))
         for q in all_quotes
@@ -158,11 +322,128 @@ def supplier_check_availability(project_id: str, components: list, product_conte
         "quotes": all_quotes,
         "suppliers_used": suppliers_list,
         "total_estimated_cost": total_cost,
-        "reasoning": f"Processed {len(components)} components in {len(batches)} parallel batches across {len(suppliers_list)} suppliers",
+        "reasoning": f"Processed {len(components)} components ({cache_hits} cached) {reasoning} across {len(suppliers_list)} suppliers",
+        "batching": batching,
+        "cache_hits": cache_hits,
         **({"errors": errors} if errors else {}),
     }
 
 
+class SupplierPipeline:
+    """
+    Supplier quoting that starts while intent analysis is still streaming components.
+    Each component is checked against the quote cache as it arrives; misses are packed
+    into a batch that is dispatched the moment it is full. The supplier shortlist is
+    re-ranked from all specs seen so far, so later batches see a better-informed list.
+    """
+
+    def __init__(self, project_id: str, product_context: str, select_suppliers_fn):
+        self.project_id = project_id
+        self.product_context = product_context
+        self.select_suppliers_fn = select_suppliers_fn   # components -> shortlist
+        self.components, self.slots = [], []
+        self.batches, self.shortlists, self.futures = [], [], []
+        self.shortlist = []
+        self._shortlist_stale = True
+        self._seen = set()
+        self._pending, self._pending_tokens = [], 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="supplier-pipeline")
+        self.dispatched_early = 0
+
+    def add(self, component):
+        """Accept one component from the analysis stream (duplicates are ignored)."""
+        key = component_key(component)
+        with self._lock:
+            if key in self._seen:
+                return
+            self._seen.add(key)
+            self.components.append(component)
+            # Re-ranked once per batch, from every spec seen when the batch opens
+            if self._shortlist_stale:
+                self.shortlist = self.select_suppliers_fn(self.components)
+                self._shortlist_stale = False
+            cached = quote_store.lookup(component, self.shortlist)
+            self.slots.append(cached)
+            if cached is not None:
+                return
+            est = planner.estimate(component)
+            if planner.batch_full(len(self._pending), self._pending_tokens, est):
+                self._dispatch()
+                self.dispatched_early += 1
+            self._pending.append(component)
+            self._pending_tokens += est
+            # A batch that is now full goes out immediately rather than waiting for the next part
+            if planner.batch_full(len(self._pending), self._pending_tokens):
+                self._dispatch()
+                self.dispatched_early += 1
+
+    def _dispatch(self):
+        batch, tokens, shortlist = self._pending, self._pending_tokens, list(self.shortlist)
+        self._pending, self._pending_tokens = [], 0
+        self._shortlist_stale = True
+        idx = len(self.batches)
+        self.batches.append(batch)
+        self.shortlists.append(shortlist)
+        print(f"[Supplier] Pipelined batch {idx + 1} dispatched — {len(batch)} components, {len(shortlist)} suppliers shortlisted")
+        # Dispatched from the intent phase, but the quotes are supplier work in the usage ledger
+        context = contextvars.copy_context()
+        context.run(current_phase.set, "supplier_coordination")
+        self.futures.append(self._pool.submit(
+            context.run, _supplier_batch, self.project_id, batch, self.product_context,
+            system_prompt_for("supplier", shortlist), planner.completion_cap(tokens), tokens, shortlist,
+        ))
+
+    def finish(self, product_context: str = None, final_shortlist: list = None, components: list = None) -> dict:
+        """
+        Dispatch the last partial batch, wait for every batch and merge as the batch path
+        does. `components` is the winning analysis's list: parts that only an abandoned
+        attempt or a losing hedge streamed are quoted but left out of the result.
+        """
+        with self._lock:
+            if product_context:
+                self.product_context = product_context
+            if final_shortlist is not None:
+                self.shortlist = final_shortlist
+            if self._pending:
+                self._dispatch()
+            streamed, slots = self.components, self.slots
+        if components is not None:
+            slot_by_key = {component_key(c): slot for c, slot in zip(streamed, slots)}
+            final = {}
+            for c in components:
+                final.setdefault(component_key(c), c)
+            dropped = len(streamed) - sum(1 for key in slot_by_key if key in final)
+            if dropped:
+                print(f"[Supplier] Dropping {dropped} streamed components that are not in the final analysis")
+            # The final list is always streamed before finish(); an unseen part simply gets no quote
+            streamed = [c for key, c in final.items() if key in slot_by_key]
+            slots = [slot_by_key[key] for key in final if key in slot_by_key]
+        batch_results, errors = [], []
+        for idx, future in enumerate(self.futures):
+            try:
+                batch_results.append(future.result().get("quotes", []))
+                print(f"[Supplier] Batch {idx + 1}/{len(self.futures)} OK — {len(batch_results[-1])} quotes")
+            except Exception as e:
+                batch_results.append([])
+                errors.append(str(e))
+                print(f"[Supplier] Batch {idx + 1}/{len(self.futures)} FAILED: {str(e)[:100]}")
+        self._pool.shutdown(wait=False)
+        return _merge_supplier_results(
+            self.project_id, streamed, slots, self.batches, batch_results, self.shortlists, errors,
+            batching={
+                "pipelined": True,
+                "batch_sizes": [len(b) for b in self.batches],
+                "dispatched_during_analysis": self.dispatched_early,
+            },
+            reasoning=f"in {len(self.batches)} pipelined batches ({self.dispatched_early} started during analysis)",
+        )
+
+    def cancel(self):
+        """Drop the pipeline (analysis failed); in-flight batches finish but are ignored."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
 # ═══════════════════════════════════════════
 # MANUFACTURER AGENT — Plain Python
 # ═══════════════════════════════════════════
@@ -171,60 +452,21 @@ def manufacturer_check_capacity(project_id: str, components: list, supplier_data
     """
     Manufacturer Agent uses real manufacturer data to create assembly plans.
     """
-    mfg_info = json.dumps([
-        {
-            "name": m["name"],
-            "location": f"{m['city']}, {m['country']}",
-            "specialization": m["specialization"],
-            "capabilities": m["capabilities"],
-            "lead_time_days": m["lead_time_days"],
-            "cost_per_hour": f"${m['cost_per_unit_hour']}",
-            "reliability": f"{m['reliability']*100:.0f}%",
-            "capacity_units_monthly": m["capacity_units_monthly"],
-            "facility_size_sqm": f"{m['facility_size_sqm']:,}",
-            "certifications": m["certifications"],
-        }
-        for m in selected_manufacturers
-    ], indent=2)
-
-    system_prompt = f"""You are a Manufacturer Agent in a supply chain AI system.
-You have access to these REAL manufacturing facilities:
-
-{mfg_info}
-
-Choose the BEST manufacturer from the list and create an assembly plan.
-
-Return JSON:
-{{
-  "agent_id": "manufacturer_prime",
-  "project_id": "{project_id}",
-  "status": "assembly_plan_created",
-  "selected_manufacturer": "manufacturer name",
-  "manufacturer_location": "city, country",
-  "can_assemble": true,
-  "assembly_plan": {{
-    "steps": [
-      {{"step": 1, "description": "...", "duration_hours": 0, "dependencies": ["..."]}}
-    ],
-    "total_assembly_time_days": 0,
-    "facility": "facility name and location",
-    "quality_checks": ["..."]
-  }},
-  "capacity_status": "available",
-  "estimated_completion_date_offset_days": 0,
-  "selection_rationale": "Why this manufacturer was chosen over others",
-  "constraints": ["..."],
-  "reasoning": "Full reasoning"
-}}"""
-
-    user_prompt = f"""Project ID: {project_id}
-Product: {product_context}
-Components: {json.dumps(components, indent=2)}
-Supplier data: {json.dumps(supplier_data, indent=2) if supplier_data else 'Pending'}
-
-Choose the best manufacturer and create a detailed assembly plan."""
-
-    return _call_openai(system_prompt, user_prompt)
+    system_prompt = system_prompt_for("manufacturer", selected_manufacturers)
+
+    user_prompt, _ = build_prompt(
+        "manufacturer", system_prompt,
+        f"Product: {product_context}",
+        [
+            Section("Components", project_components(components, ("name", "category", "estimated_quantity")), priority=10),
+            Section("Supplier data", project_supplier_data(supplier_data) if supplier_data else "Pending", priority=5),
+        ],
+        f"Choose the best manufacturer and create a detailed assembly plan.\nProject ID: {project_id}",
+    )
+
+    return _call_openai(system_prompt, user_prompt, agent="manufacturer", payload={
+        "project_id": project_id, "components": components, "manufacturers": selected_manufacturers,
+    })
 
 
 # ═══════════════════════════════════════════
@@ -235,68 +477,21 @@ def logistics_plan_route(project_id: str, pickup_details: dict, delivery_details
     """
     Logistics Agent uses real logistics provider data to plan routes.
     """
-    log_info = json.dumps([
-        {
-            "name": l["name"],
-            "hub": f"{l['city']}, {l['country']}",
-            "modes": l["modes"],
-            "coverage": l["coverage_regions"],
-            "cost_per_km": f"${l['cost_per_km_usd']}",
-            "base_fee": f"${l['base_fee_usd']}",
-            "avg_speed_kmh": l["avg_speed_kmh"],
-            "reliability": f"{l['reliability']*100:.0f}%",
-            "max_weight_tons": l["max_weight_tons"],
-            "customs_capable": l.get("customs_capable", False),
-            "hazmat_certified": l.get("hazmat_certified", False),
-            "tracking": l.get("tracking", "none"),
-        }
-        for l in selected_logistics
-    ], indent=2)
-
-    system_prompt = f"""You are a Logistics Provider Agent in a supply chain AI system.
-You have access to these REAL logistics providers:
-
-{log_info}
-
-Choose the BEST provider(s) and plan optimal routes.
-
-Return JSON:
-{{
-  "agent_id": "logistics_global",
-  "project_id": "{project_id}",
-  "status": "route_planned",
-  "selected_provider": "provider name",
-  "provider_hub": "city, country",
-  "routes": [
-    {{
-      "route_id": "...",
-      "provider": "provider name",
-      "mode": "ground/air/sea",
-      "segments": [
-        {{"from": "...", "to": "...", "carrier": "...", "duration_days": 0}}
-      ],
-      "total_duration_days": 0,
-      "cost_usd": 0.00,
-      "risk_level": "low/medium/high",
-      "risk_flags": ["..."],
-      "insurance_cost_usd": 0.00,
-      "tracking_type": "..."
-    }}
-  ],
-  "recommended_route": "route_id",
-  "selection_rationale": "Why this provider and route were chosen",
-  "customs_requirements": ["..."],
-  "reasoning": "Full reasoning"
-}}"""
-
-    user_prompt = f"""Project ID: {project_id}
-Product: {product_context}
-Pickup: {json.dumps(pickup_details, indent=2)}
-Delivery: {json.dumps(delivery_details, indent=2)}
-
-Choose the best logistics provider and plan the optimal route."""
-
-    return _call_openai(system_prompt, user_prompt)
+    system_prompt = system_prompt_for("logistics", selected_logistics)
+
+    user_prompt, _ = build_prompt(
+        "logistics", system_prompt,
+        f"Product: {product_context}",
+        [
+            Section("Pickup", pickup_details, priority=10),
+            Section("Delivery", delivery_details, priority=10),
+        ],
+        f"Choose the best logistics provider and plan the optimal route.\nProject ID: {project_id}",
+    )
+
+    return _call_openai(system_prompt, user_prompt, agent="logistics", payload={
+        "project_id": project_id, "pickup": pickup_details, "delivery": delivery_details, "providers": selected_logistics,
+    })
 
 
 # ═══════════════════════════════════════════
@@ -308,57 +503,34 @@ def retailer_plan_delivery(project_id: str, product_context: str, manufacturing_
     Retailer Agent handles final delivery, customer communication, and post-sale.
     cost_data should include: parts_cost_usd, shipping_cost_usd, total_procurement_cost_usd
     """
-    # Build cost context so the agent knows the actual procurement costs
+    # Actual procurement costs are per-request, so they go in the user prompt
     cost_context = ""
     if cost_data:
         parts = cost_data.get("parts_cost_usd", 0)
         shipping = cost_data.get("shipping_cost_usd", 0)
         total = cost_data.get("total_procurement_cost_usd", parts + shipping)
-        cost_context = f"""
-IMPORTANT — ACTUAL PROCUREMENT COSTS (you MUST use these numbers):
-- Parts & materials cost: ${parts:,.2f}
-- Shipping & logistics cost: ${shipping:,.2f}
-- Total procurement cost: ${total:,.2f}
-
-The final_retail_price_usd MUST be calculated as:
-  final_retail_price_usd = total_procurement_cost × (1 + margin_percentage / 100)
-A typical margin is 15-35% depending on product complexity.
-The retail price must ALWAYS be HIGHER than the total procurement cost of ${total:,.2f}.
-NEVER return a retail price lower than the total procurement cost."""
-
-    system_prompt = f"""You are a Retailer Agent in a supply chain AI system.
-You manage the final delivery to the customer and post-sale experience.
-{cost_context}
-
-Return JSON:
-{{
-  "agent_id": "retailer_direct",
-  "project_id": "{project_id}",
-  "status": "delivery_planned",
-  "delivery_plan": {{
-    "packaging": "...",
-    "delivery_method": "...",
-    "estimated_delivery_date_offset_days": 0,
-    "tracking_number": "...",
-    "notifications": ["order confirmed", "shipped", "out for delivery", "delivered"]
-  }},
-  "customer_experience": {{
-    "warranty": "...",
-    "return_policy": "...",
-    "support_channel": "...",
-    "documentation_included": ["..."]
-  }},
-  "final_retail_price_usd": 0.00,
-  "margin_percentage": 0,
-  "reasoning": "Delivery plan rationale including how retail price was calculated from procurement costs"
-}}"""
-
-    user_prompt = f"""Project ID: {project_id}
-Product: {product_context}
-Manufacturing: {json.dumps(manufacturing_data, indent=2) if manufacturing_data else 'Pending'}
-Logistics: {json.dumps(logistics_data, indent=2) if logistics_data else 'Pending'}
-
-Create a detailed retail delivery and customer experience plan.
-Remember: the retail price MUST be based on the actual procurement costs provided above."""
-
-    return _call_openai(system_prompt, user_prompt)
+        cost_context = (
+            "ACTUAL PROCUREMENT COSTS (you MUST use these numbers):\n"
+            f"- Parts & materials cost: ${parts:,.2f}\n"
+            f"- Shipping & logistics cost: ${shipping:,.2f}\n"
+            f"- Total procurement cost: ${total:,.2f}\n"
+            f"The retail price must be HIGHER than ${total:,.2f}."
+        )
+
+    system_prompt = system_prompt_for("retailer")
+
+    user_prompt, _ = build_prompt(
+        "retailer", system_prompt,
+        f"Product: {product_context}\n{cost_context}".rstrip(),
+        [
+            Section("Manufacturing", project_manufacturing(manufacturing_data) if manufacturing_data else "Pending", priority=5),
+            Section("Logistics", project_logistics(logistics_data) if logistics_data else "Pending", priority=5),
+        ],
+        "Create a detailed retail delivery and customer experience plan.\n"
+        "Remember: the retail price MUST be based on the actual procurement costs provided above.\n"
+        f"Project ID: {project_id}",
+    )
+
+    return _call_openai(system_prompt, user_prompt, agent="retailer", payload={
+        "project_id": project_id, "cost_data": cost_data,
+    })
@@ -0,0 +1,173 @@
+"""
+Batch Orchestration — many intents in one request, sharing work across them.
+Identical intents run once; partner selection is computed once per unique component
+set; the distinct components of all intents are quoted once up front in shared supplier
+batches (filling the quote cache), then every intent's pipeline runs from there.
+Results stream back as JSON lines in completion order.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+
+from agents import supplier_check_availability
+from encoding import dumps
+from intent_cache import normalize_intent
+from orchestration import Run, execute, intent_node, selection_node
+from pacing import Pacer
+from project_store import project_store
+from quote_cache import QUOTE_CACHE_ENABLED, component_key, component_quantity, quantity_band
+from replan import phase_cache
+from scheduler import BATCH, request_priority
+from usage import usage_ledger, current_project
+from views import project_plan
+
+BATCH_MAX_INTENTS = int(os.getenv("BATCH_MAX_INTENTS", "500"))
+# Intents analysed / pipelines run at the same time within one batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Suppliers offered in the shared quote prompt (the union of every set's shortlist, capped)
+SHARED_SHORTLIST_MAX = 16
+
+
+def requirement_key(components: list) -> tuple:
+    """Component set that determines the partner shortlist, independent of order and wording."""
+    return tuple(sorted({component_key(c) for c in components}))
+
+
+def _quote_key(component) -> tuple:
+    # Cached quotes are re-costed within a quantity band, so one quote per band is enough
+    return component_key(component), quantity_band(component_quantity(component))
+
+
+def _line(data: dict) -> bytes:
+    return dumps(data) + b"\n"
+
+
+async def run_batch(intents: list, speculative: bool, intent_backend=None, view: str = "full", fields=None):
+    """Async generator of JSONL lines: one "result" per intent (plan projected per view/fields), then a "summary"."""
+    started = time.perf_counter()
+    batch_id = f"batch_{uuid.uuid4().hex[:8]}"
+    request_priority.set(BATCH)
+    limit = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+
+    # ── 1. Identical intents (after normalization) run once ──
+    groups = {}  # normalized intent -> [indices]
+    for idx, intent in enumerate(intents):
+        groups.setdefault(normalize_intent(intent) or intent.strip().lower(), []).append(idx)
+    runs = {
+        key: Run(
+            f"proj_{uuid.uuid4().hex[:8]}", intents[idxs[0]], Pacer(0.0),
+            speculative=speculative, intent_backend=intent_backend,
+            # Supplier work is shared across the batch below; prose enrichment is skipped
+            stream_suppliers=False, enrich_retail=False,
+        )
+        for key, idxs in groups.items()
+    }
+
+    async def analyse(key):
+        run = runs[key]
+        current_project.set(run.project_id)
+        async with limit:
+            return key, await intent_node(run, {})
+
+    analyses = dict(await asyncio.gather(*(analyse(key) for key in runs)))
+
+    # ── 2. Partner selection once per requirement set ──
+    requirement_sets = {}  # requirement key -> [intent keys]
+    for key, analysis in analyses.items():
+        requirement_sets.setdefault(requirement_key(analysis["components"]), []).append(key)
+    selections = {}
+    for req, keys in requirement_sets.items():
+        selections[req] = await selection_node(runs[keys[0]], {"intent": analyses[keys[0]]})
+
+    # ── 3. Shared supplier batches: every distinct component across the batch, quoted once ──
+    # One union over all intents (name + quantity band), so parts that overlap between
+    # different requirement sets are packed into the same BatchPlanner batches
+    components_total = sum(len(a["components"]) for a in analyses.values())
+    union = {}
+    for key in runs:
+        for component in analyses[key]["components"]:
+            union.setdefault(_quote_key(component), component)
+    # Quoted against every set's shortlist (best score first) so each intent's DAG can
+    # reuse a quote whenever its assigned supplier is on that intent's shortlist
+    shortlist = {}
+    for selection in selections.values():
+        for supplier in selection["best_suppliers"]:
+            shortlist.setdefault(supplier["id"], supplier)
+    shortlist = sorted(shortlist.values(), key=lambda s: s.get("_score", 0), reverse=True)[:SHARED_SHORTLIST_MAX]
+    context = "; ".join(sorted({a["product_name"] for a in analyses.values()}))[:200]
+    components_unique = len(union)
+
+    if not QUOTE_CACHE_ENABLED:
+        print("[Batch] QUOTE_CACHE=0 — supplier quotes cannot be shared, each intent is quoted on its own")
+    elif union:
+        current_project.set(batch_id)
+        await asyncio.to_thread(supplier_check_availability, batch_id, list(union.values()), context, shortlist)
+
+    # ── 4. Each unique intent's pipeline, seeded with its analysis and shared selection ──
+    req_of = {key: req for req, keys in requirement_sets.items() for key in keys}
+
+    async def finish(key):
+        run = runs[key]
+        current_project.set(run.project_id)
+        project_store.start(run.project_id, run.intent)
+        try:
+            async with limit:
+                dag_run = await execute(run, seed={"intent": analyses[key], "selection": selections[req_of[key]]})
+            plan = dag_run.results["report"]["plan"]
+            plan["execution"] = dag_run.breakdown()
+            plan["batch_id"] = batch_id
+            phase_cache.put(run, dag_run.results)
+            project_store.save_plan(run.project_id, plan)
+            project_store.finish(run.project_id, "completed")
+            return key, plan, None
+        except Exception as e:
+            print(f"[Batch] {run.project_id} failed: {str(e)[:160]}")
+            project_store.finish(run.project_id, "error")
+            return key, None, str(e)[:300]
+
+    failed = 0
+    for next_done in asyncio.as_completed([finish(key) for key in runs]):
+        key, plan, error = await next_done
+        failed += 1 if error else 0
+        first = groups[key][0]
+        for idx in groups[key]:
+            line = {
+                "type": "result",
+                "index": idx,
+                "intent": intents[idx],
+                "project_id": runs[key].project_id,
+                "status": "error" if error else "completed",
+            }
+            if idx != first:
+                line["duplicate_of"] = first
+            if error:
+                line["error"] = error
+            else:
+                line["plan"] = project_plan(plan, view, fields)
+            yield _line(line)
+
+    # ── Summary ──
+    elapsed = time.perf_counter() - started
+    usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+    for project_id in [batch_id] + [run.project_id for run in runs.values()]:
+        totals = usage_ledger.project_summary(project_id)["totals"]
+        for k in usage:
+            usage[k] += totals[k]
+    usage["cost_usd"] = round(usage["cost_usd"], 6)
+    print(f"[Batch] {batch_id}: {len(intents)} intents in {elapsed:.1f}s "
+          f"({len(runs)} unique, {len(requirement_sets)} requirement sets, {usage['calls']} LLM calls)")
+    yield _line({
+        "type": "summary",
+        "batch_id": batch_id,
+        "intents": len(intents),
+        "unique_intents": len(runs),
+        "requirement_sets": len(requirement_sets),
+        "components_total": components_total,
+        "components_unique": components_unique,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "intents_per_min": round(len(intents) / elapsed * 60, 1) if elapsed > 0 else None,
+        "llm_usage": usage,
+    })
@@ -0,0 +1,159 @@
+"""
+Adaptive Batch Planner — sizes supplier quote batches and picks worker concurrency.
+Batches are packed against a completion-token budget using a per-component output
+estimate; concurrency follows the scheduler's rate-limit headroom and observed batch latency.
+Every decision is recorded so the knobs below can be tuned from real runs.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from scheduler import scheduler
+
+TARGET_COMPLETION_TOKENS = int(os.getenv("SUPPLIER_BATCH_TARGET_TOKENS", "2400"))
+MAX_BATCH_SIZE = int(os.getenv("SUPPLIER_BATCH_MAX_SIZE", "10"))
+MAX_CONCURRENCY = int(os.getenv("SUPPLIER_MAX_CONCURRENCY", "8"))
+MAX_COMPLETION_TOKENS = 8000
+
+BASE_QUOTE_TOKENS = 220    # JSON skeleton + supplier fields of one quote
+SPEC_ECHO_RATIO = 0.5      # share of the spec text the model echoes back
+CHARS_PER_TOKEN = 4
+EWMA_ALPHA = 0.3
+DECISION_LOG_SIZE = 200
+
+
+def estimate_component_tokens(component) -> int:
+    """Rough completion tokens needed to quote one component."""
+    if not isinstance(component, dict):
+        return BASE_QUOTE_TOKENS
+    text = f"{component.get('name', '')} {component.get('specifications', '')}"
+    return BASE_QUOTE_TOKENS + int(len(text) / CHARS_PER_TOKEN * SPEC_ECHO_RATIO)
+
+
+class BatchPlanner:
+    """Plans supplier batches from token estimates and live provider feedback."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._decisions = deque(maxlen=DECISION_LOG_SIZE)
+        self._tokens_per_quote_scale = 1.0   # observed / estimated completion tokens
+        self._latency_s = None               # EWMA of per-batch wall time
+
+    # ── Feedback ──
+
+    def observe_batch(self, estimated_tokens: int, completion_tokens: int, latency_s: float):
+        """Feed back the real completion size and wall time of one finished batch."""
+        with self._lock:
+            if estimated_tokens and completion_tokens:
+                ratio = completion_tokens / estimated_tokens
+                self._tokens_per_quote_scale += EWMA_ALPHA * (ratio - self._tokens_per_quote_scale)
+            if latency_s:
+                if self._latency_s is None:
+                    self._latency_s = latency_s
+                else:
+                    self._latency_s += EWMA_ALPHA * (latency_s - self._latency_s)
+
+    # ── Planning ──
+
+    def estimate(self, component) -> int:
+        """Completion-token estimate for one component, scaled by observed output sizes."""
+        with self._lock:
+            return max(1, int(estimate_component_tokens(component) * self._tokens_per_quote_scale))
+
+    @staticmethod
+    def batch_full(count: int, tokens: int, next_tokens: int = 0) -> bool:
+        """Whether a batch of `count` components / `tokens` estimate takes no more components."""
+        return count >= MAX_BATCH_SIZE or (count > 0 and tokens + next_tokens > TARGET_COMPLETION_TOKENS)
+
+    @staticmethod
+    def completion_cap(tokens: int) -> int:
+        # Headroom over the estimate so a verbose batch is not cut mid-JSON
+        return min(MAX_COMPLETION_TOKENS, max(1000, int(tokens * 1.6)))
+
+    def _concurrency(self, num_batches: int, tokens_per_batch: int):
+        """Pick worker count from rate-limit headroom; returns (workers, reason, headroom)."""
+        headroom = scheduler.headroom()
+        remaining_req = headroom["remaining_requests"]
+        remaining_tok = headroom["remaining_tokens"]
+
+        # Remaining budgets are per rolling minute; a slot that takes `latency`
+        # seconds per batch consumes 60/latency requests of that budget.
+        latency = self._latency_s or 10.0
+        per_slot_per_minute = max(60.0 / latency, 1.0)
+        caps = [MAX_CONCURRENCY, num_batches]
+        reason = "one worker per batch" if num_batches <= MAX_CONCURRENCY else "max concurrency"
+        req_cap = max(1, math.floor(remaining_req / per_slot_per_minute))
+        if req_cap < min(caps):
+            reason = "request headroom"
+        caps.append(req_cap)
+        tok_cap = max(1, math.floor(remaining_tok / (per_slot_per_minute * max(tokens_per_batch, 1))))
+        if tok_cap < min(caps):
+            reason = "token headroom"
+        caps.append(tok_cap)
+        return min(caps), reason, headroom
+
+    def plan(self, components: list) -> dict:
+        """
+        Split components into batches and choose concurrency.
+        Returns {"batches", "concurrency", "max_tokens"} plus the recorded decision.
+        """
+        with self._lock:
+            scale = self._tokens_per_quote_scale
+            estimates = [max(1, int(estimate_component_tokens(c) * scale)) for c in components]
+
+            batches, batch_tokens = [], []
+            current, current_tokens = [], 0
+            for component, est in zip(components, estimates):
+                if self.batch_full(len(current), current_tokens, est):
+                    batches.append(current)
+                    batch_tokens.append(current_tokens)
+                    current, current_tokens = [], 0
+                current.append(component)
+                current_tokens += est
+            if current:
+                batches.append(current)
+                batch_tokens.append(current_tokens)
+
+            largest = max(batch_tokens, default=0)
+            concurrency, reason, headroom = self._concurrency(len(batches), largest)
+            max_tokens = self.completion_cap(largest)
+
+            decision = {
+                "timestamp": time.time(),
+                "components": len(components),
+                "batch_sizes": [len(b) for b in batches],
+                "estimated_tokens": batch_tokens,
+                "token_scale": round(scale, 3),
+                "concurrency": concurrency,
+                "concurrency_reason": reason,
+                "max_tokens": max_tokens,
+                "observed_latency_s": round(self._latency_s, 2) if self._latency_s else None,
+                "headroom": headroom,
+            }
+            self._decisions.append(decision)
+
+        return {
+            "batches": batches,
+            "batch_tokens": batch_tokens,
+            "concurrency": max(1, concurrency),
+            "max_tokens": max_tokens,
+            "decision": decision,
+        }
+
+    def snapshot(self) -> dict:
+        """Current tuning state and the most recent decisions."""
+        with self._lock:
+            return {
+                "target_completion_tokens": TARGET_COMPLETION_TOKENS,
+                "max_batch_size": MAX_BATCH_SIZE,
+                "max_concurrency": MAX_CONCURRENCY,
+                "token_scale": round(self._tokens_per_quote_scale, 3),
+                "observed_latency_s": round(self._latency_s, 2) if self._latency_s else None,
+                "recent_decisions": list(self._decisions)[-20:],
+            }
+
+
+planner = BatchPlanner()
@@ -0,0 +1,97 @@
+"""
+Batch Throughput Benchmark — N intents one /api/run at a time vs one /api/run/batch.
+
+    python bench_batch.py [-n 24] [--mode both|single|batch]
+
+Each mode runs in a fresh process so the quote and intent caches start cold. Intents
+cycle through the intent benchmark corpus, so n > 8 includes the repeats a nightly
+workload has. Under LLM_PROVIDER=offline set OFFLINE_LATENCY_MS to model real calls.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from bench_intent import INTENT_CORPUS
+
+
+def corpus(n: int) -> list:
+    return [INTENT_CORPUS[i % len(INTENT_CORPUS)][0] for i in range(n)]
+
+
+def _llm_calls(client) -> int:
+    return client.get("/api/metrics").json()["llm_usage"]["totals"]["calls"]
+
+
+def run_single(intents: list) -> dict:
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        for intent in intents:
+            with client.stream("POST", "/api/run", json={"intent": intent, "pace": 0, "priority": "batch"}) as r:
+                for _ in r.iter_lines():
+                    pass
+        elapsed = time.perf_counter() - started
+        return {"elapsed_s": elapsed, "llm_calls": _llm_calls(client)}
+
+
+def run_batch(intents: list) -> dict:
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        summary = {}
+        with client.stream("POST", "/api/run/batch", json={"intents": intents}) as r:
+            for line in r.iter_lines():
+                if line:
+                    data = json.loads(line)
+                    if data["type"] == "summary":
+                        summary = data
+        elapsed = time.perf_counter() - started
+        return {
+            "elapsed_s": elapsed,
+            "llm_calls": _llm_calls(client),
+            "unique_intents": summary.get("unique_intents"),
+            "requirement_sets": summary.get("requirement_sets"),
+            "components": f"{summary.get('components_unique')}/{summary.get('components_total')} unique",
+        }
+
+
+def _in_subprocess(mode: str, n: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, __file__, "--mode", mode, "-n", str(n), "--json"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--intents", type=int, default=24)
+    parser.add_argument("--mode", choices=["both", "single", "batch"], default="both")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    intents = corpus(args.intents)
+
+    if args.json:
+        result = run_single(intents) if args.mode == "single" else run_batch(intents)
+        print(json.dumps(result))
+        return
+
+    modes = ["single", "batch"] if args.mode == "both" else [args.mode]
+    print(f"\nBatch throughput — {len(intents)} intents ({len(set(intents))} distinct)")
+    for mode in modes:
+        result = _in_subprocess(mode, args.intents)
+        rate = len(intents) / result["elapsed_s"] * 60
+        extra = "".join(f"   {k} {result[k]}" for k in ("unique_intents", "requirement_sets", "components") if k in result)
+        print(f"  {mode:<7} {result['elapsed_s']:8.2f} s   {rate:8.1f} intents/min   {result['llm_calls']:5d} LLM calls{extra}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
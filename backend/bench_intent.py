@@ -0,0 +1,132 @@
+"""
+Intent Analysis Benchmark — procurement crew overhead and backend comparison.
+
+    python bench_intent.py setup [-n 50]                      # crew construction: fresh vs pooled checkout
+    python bench_intent.py backends [--runs 2] [--only direct]  # CrewAI vs direct JSON on a fixed corpus
+
+`setup` needs CrewAI installed but makes no LLM calls. `backends` calls the configured
+provider; under LLM_PROVIDER=offline the CrewAI path is the keyword stand-in, so only
+the direct path's overheads are meaningful there.
+"""
+
+import argparse
+import statistics
+import time
+
+from procurement import TASK_TEMPLATE, CrewPool, build_crew, analyze_intent
+from providers import LLM_MODEL, get_provider
+from usage import usage_ledger, current_project
+
+# Fixed corpus: (intent, keywords a complete decomposition should mention)
+INTENT_CORPUS = [
+    ("Build 10 electric scooters for a city sharing fleet", ["battery", "motor", "frame", "brake", "controller"]),
+    ("I need 3 custom gaming PCs with liquid cooling", ["processor", "memory", "power supply", "cooling", "case"]),
+    ("Assemble 500 smart thermostats with WiFi", ["sensor", "display", "pcb", "wifi", "housing"]),
+    ("Produce 2 prototype electric delivery vans", ["battery", "motor", "chassis", "seat", "brake"]),
+    ("Manufacture 50 industrial air compressors", ["motor", "tank", "valve", "pressure", "frame"]),
+    ("Build 20 agricultural survey drones with multispectral cameras", ["motor", "camera", "battery", "frame", "gps"]),
+    ("Make 100 ergonomic office chairs", ["base", "seat", "armrest", "caster", "cylinder"]),
+    ("Assemble 5 solar-powered water pumping stations", ["solar", "pump", "inverter", "pipe", "controller"]),
+]
+
+
+def _summary(label: str, samples: list) -> str:
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    return f"  {label:<28} mean {statistics.mean(ms):8.2f} ms   p50 {statistics.median(ms):8.2f} ms   p95 {p95:8.2f} ms"
+
+
+def bench_setup(iterations: int):
+    intents = [f"Build {n} units of product variant {n}" for n in range(iterations)]
+    build_crew(LLM_MODEL)  # import + first-use costs are paid once per process, not per request
+
+    # Before: every request builds its own Agent + Task + Crew
+    fresh = []
+    for intent in intents:
+        started = time.perf_counter()
+        build_crew(LLM_MODEL, intent)
+        fresh.append(time.perf_counter() - started)
+
+    # After: crews are built at startup; a request only checks one out and swaps the task text
+    pool = CrewPool(size=1)
+    warm_started = time.perf_counter()
+    pool.warm(LLM_MODEL)
+    warm_s = time.perf_counter() - warm_started
+    pooled = []
+    for intent in intents:
+        started = time.perf_counter()
+        with pool.checkout(LLM_MODEL) as slot:
+            slot["task"].description = TASK_TEMPLATE.format(intent=intent)
+        pooled.append(time.perf_counter() - started)
+
+    print(f"\nProcurement crew setup — {iterations} requests, model {LLM_MODEL}")
+    print(_summary("fresh crew per request", fresh))
+    print(_summary("pooled checkout + swap", pooled))
+    print(f"  one-time warm-up (startup)   {warm_s * 1000:8.2f} ms")
+    print(f"  saved per request            {(statistics.mean(fresh) - statistics.mean(pooled)) * 1000:8.2f} ms\n")
+
+
+def _recall(analysis: dict, keywords: list) -> float:
+    text = " ".join(
+        f"{c.get('name', '')} {c.get('category', '')} {c.get('specifications', '')}".lower()
+        for c in analysis.get("components", []) if isinstance(c, dict)
+    )
+    return sum(1 for kw in keywords if kw in text) / len(keywords)
+
+
+def bench_backends(runs: int, backends: list):
+    results = {}
+    for backend in backends:
+        latencies, tokens, components, recalls, valid = [], [], [], [], 0
+        for run in range(runs):
+            for idx, (intent, keywords) in enumerate(INTENT_CORPUS):
+                project = f"bench_{backend}_{run}_{idx}"
+                token = current_project.set(project)
+                started = time.perf_counter()
+                try:
+                    analysis = analyze_intent(intent, backend=backend)
+                except Exception as e:
+                    print(f"  [{backend}] {intent[:40]!r} failed: {str(e)[:80]}")
+                    analysis = {}
+                finally:
+                    latencies.append(time.perf_counter() - started)
+                    current_project.reset(token)
+                usage = usage_ledger.project_summary(project)["totals"]
+                tokens.append(usage["prompt_tokens"] + usage["completion_tokens"])
+                comps = analysis.get("components", [])
+                fallback = str(analysis.get("notes", "")).startswith("Fallback")
+                valid += bool(comps) and not fallback
+                components.append(len(comps))
+                recalls.append(_recall(analysis, keywords))
+        results[backend] = (latencies, tokens, components, recalls, valid)
+
+    total = runs * len(INTENT_CORPUS)
+    print(f"\nIntent analysis backends — {len(INTENT_CORPUS)} intents × {runs} runs, {get_provider().name} provider, model {get_provider().model}")
+    for backend, (latencies, tokens, components, recalls, valid) in results.items():
+        print(f"\n[{backend}]")
+        print(_summary("latency", latencies))
+        print(f"  {'tokens / intent':<28} mean {statistics.mean(tokens):8.0f}")
+        print(f"  {'valid analyses':<28} {valid}/{total}")
+        print(f"  {'components / intent':<28} mean {statistics.mean(components):8.1f}")
+        print(f"  {'keyword recall':<28} mean {statistics.mean(recalls):8.2f}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    setup = sub.add_parser("setup", help="crew construction overhead, fresh vs pooled")
+    setup.add_argument("-n", "--iterations", type=int, default=50)
+    backends = sub.add_parser("backends", help="CrewAI vs direct JSON intent analysis on a fixed corpus")
+    backends.add_argument("--runs", type=int, default=1)
+    backends.add_argument("--only", choices=["crewai", "direct"], help="benchmark a single backend")
+    args = parser.parse_args()
+
+    if args.command == "setup":
+        bench_setup(args.iterations)
+    elif args.command == "backends":
+        bench_backends(args.runs, [args.only] if args.only else ["crewai", "direct"])
+
+
+if __name__ == "__main__":
+    main()
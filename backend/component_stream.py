@@ -0,0 +1,79 @@
+"""
+Component Stream — incremental parser for a streamed intent-analysis reply.
+Complete objects of the top-level "components" array are handed out as soon as
+their closing brace arrives, long before the rest of the JSON document is done.
+"""
+
+import json
+import re
+
+_PRODUCT_RE = re.compile(r'"product"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_COMPONENTS_RE = re.compile(r'"components"\s*:\s*\[')
+
+
+class ComponentStream:
+    """Feed text chunks; get back the component dicts completed by each chunk."""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0            # next unscanned index once inside the array
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._start = None       # index of the current object's opening brace
+        self._in_string = False
+        self._escape = False
+        self.product = None
+        self.emitted = 0
+
+    def feed(self, text: str) -> list:
+        if self._done or not text:
+            return []
+        self._buf += text
+        if self.product is None:
+            match = _PRODUCT_RE.search(self._buf)
+            if match:
+                self.product = json.loads(f'"{match.group(1)}"')
+        if not self._in_array:
+            match = _COMPONENTS_RE.search(self._buf)
+            if not match:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+
+        found = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    try:
+                        item = json.loads(buf[self._start:i + 1])
+                    except json.JSONDecodeError:
+                        item = None
+                    if isinstance(item, dict):
+                        found.append(item)
+                    self._start = None
+            elif ch == "]" and self._depth == 0:
+                self._done = True
+                i += 1
+                break
+            i += 1
+        self._pos = i
+        self.emitted += len(found)
+        return found
@@ -0,0 +1,156 @@
+"""
+DAG Executor — declarative async phase graph with per-node timings.
+Each node names the nodes whose outputs it needs before it can start (`inputs`) and
+the ones it may wait on mid-run (`awaits`, e.g. to confirm a speculative start).
+Every node is started as soon as its inputs are done, so independent phases overlap;
+start/finish offsets are recorded and reduced to a critical-path breakdown.
+"""
+
+import asyncio
+import time
+
+
+class Node:
+    def __init__(self, name: str, fn, inputs=(), awaits=()):
+        self.name = name
+        self.fn = fn            # async fn(ctx, inputs: dict) -> output
+        self.inputs = tuple(inputs)
+        self.awaits = tuple(awaits)
+
+
+class Dag:
+    """A validated graph; `run()` executes it once against a per-run context."""
+
+    def __init__(self, nodes: list):
+        self.nodes = {n.name: n for n in nodes}
+        if len(self.nodes) != len(nodes):
+            raise ValueError("DAG node names must be unique")
+        for node in nodes:
+            for dep in node.inputs + node.awaits:
+                if dep not in self.nodes:
+                    raise ValueError(f"Node {node.name!r} depends on unknown node {dep!r}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> list:
+        order, state = [], {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"DAG cycle: {' -> '.join(path + [name])}")
+            state[name] = "visiting"
+            node = self.nodes[name]
+            for dep in node.inputs + node.awaits:
+                visit(dep, path + [name])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.nodes:
+            visit(name, [])
+        return order
+
+    def downstream(self, names) -> set:
+        """`names` plus every node that (transitively) depends on one of them."""
+        dirty = set(names)
+        for name in self.order:
+            node = self.nodes[name]
+            if dirty.intersection(node.inputs + node.awaits):
+                dirty.add(name)
+        return dirty
+
+    async def run(self, ctx, seed: dict = None) -> "DagRun":
+        """
+        Execute every node, reusing outputs from `seed` ({node: output}) instead of
+        running those nodes. `ctx.dag` is set to the DagRun so nodes can `await
+        ctx.dag.result(name)` for their `awaits`.
+        """
+        state = DagRun(self, seed or {})
+        ctx.dag = state
+        await state.execute(ctx)
+        return state
+
+
+class DagRun:
+    """Futures, outputs and timings of one execution."""
+
+    def __init__(self, dag: Dag, seed: dict):
+        self.dag = dag
+        self.seed = seed
+        self.futures = {}
+        self.timings = {}  # name -> {"started_s", "finished_s", "reused"}
+        self.started = None
+
+    def _offset(self) -> float:
+        return time.perf_counter() - self.started
+
+    async def result(self, name: str):
+        return await asyncio.shield(self.futures[name])
+
+    @property
+    def results(self) -> dict:
+        return {name: f.result() for name, f in self.futures.items() if f.done() and not f.cancelled() and f.exception() is None}
+
+    async def _run_node(self, ctx, node: Node):
+        inputs = {dep: await self.futures[dep] for dep in node.inputs}
+        started = self._offset()
+        if node.name in self.seed:
+            output, reused = self.seed[node.name], True
+        else:
+            output, reused = await node.fn(ctx, inputs), False
+        self.timings[node.name] = {"started_s": started, "finished_s": self._offset(), "reused": reused}
+        self.futures[node.name].set_result(output)
+
+    async def execute(self, ctx):
+        loop = asyncio.get_running_loop()
+        self.started = time.perf_counter()
+        self.futures = {name: loop.create_future() for name in self.dag.order}
+        tasks = [asyncio.create_task(self._run_node(ctx, self.dag.nodes[name])) for name in self.dag.order]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            for future in self.futures.values():
+                future.cancel()
+            raise
+
+    def breakdown(self) -> dict:
+        """Per-node timings and the chain of nodes that determined the wall-clock time."""
+        nodes = {}
+        for name in self.dag.order:
+            t = self.timings.get(name)
+            if t is None:
+                continue
+            node = self.dag.nodes[name]
+            nodes[name] = {
+                "started_s": round(t["started_s"], 3),
+                "finished_s": round(t["finished_s"], 3),
+                "duration_s": round(t["finished_s"] - t["started_s"], 3),
+                "inputs": list(node.inputs),
+                "awaits": list(node.awaits),
+                "reused": t["reused"],
+            }
+
+        # Walk back from the last node to finish, always through the dependency that
+        # finished last; each step's share is the time between the two finishes.
+        path = []
+        current = max(self.timings, key=lambda n: self.timings[n]["finished_s"], default=None)
+        while current is not None:
+            node = self.dag.nodes[current]
+            t = self.timings[current]
+            deps = [d for d in node.inputs + node.awaits if d in self.timings]
+            # An `awaits` dependency only gated the node if it finished after the node started
+            gating = [d for d in deps if d in node.inputs or self.timings[d]["finished_s"] > t["started_s"]]
+            previous = max(gating, key=lambda d: self.timings[d]["finished_s"], default=None)
+            since = self.timings[previous]["finished_s"] if previous else 0.0
+            path.append({"node": current, "critical_s": round(t["finished_s"] - since, 3)})
+            current = previous
+        path.reverse()
+        wall = max((t["finished_s"] for t in self.timings.values()), default=0.0)
+        return {
+            "wall_s": round(wall, 3),
+            "nodes": nodes,
+            "critical_path": path,
+            "sum_of_nodes_s": round(sum(v["duration_s"] for v in nodes.values()), 3),
+        }
@@ -0,0 +1,193 @@
+"""
+Encoding — one fast JSON encoder for every event, plan and stored payload.
+Events are encoded to bytes exactly once (orjson when installed, stdlib json otherwise)
+and those bytes are what the job buffer, the project store and every viewer share.
+Streams can be gzip/brotli-compressed per connection; encode time and bytes are
+counted per run and in total for /api/metrics.
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+import zlib
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+# "orjson" (default when installed) or "json"
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson" if orjson else "json")
+if JSON_ENCODER == "orjson" and orjson is None:
+    print("[Encoding] JSON_ENCODER=orjson but orjson is not installed — using json")
+    JSON_ENCODER = "json"
+
+# Stream compression: "off" (default), "auto" (br, else gzip, as the client accepts),
+# "gzip" or "br". Per request: body/query "compress".
+SSE_COMPRESSION = os.getenv("SSE_COMPRESSION", "off").lower()
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(obj) -> bytes:
+    if JSON_ENCODER == "orjson":
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits — the stdlib copes
+    return json.dumps(obj, default=str).encode()
+
+
+def loads(data):
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+# ═══════════════════════════════════════════
+# Per-run accounting
+# ═══════════════════════════════════════════
+
+class WireStats:
+    """Events, encoded bytes and encode time — for one run, or summed over all runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.events = 0
+        self.bytes = 0
+        self.encode_s = 0.0
+        self.compressed_in = 0
+        self.compressed_out = 0
+
+    def add(self, size: int, seconds: float):
+        with self._lock:
+            self.events += 1
+            self.bytes += size
+            self.encode_s += seconds
+
+    def add_compressed(self, raw: int, sent: int):
+        with self._lock:
+            self.compressed_in += raw
+            self.compressed_out += sent
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "encoder": JSON_ENCODER,
+                "events": self.events,
+                "bytes": self.bytes,
+                "encode_ms": round(self.encode_s * 1000, 3),
+            }
+
+    def snapshot(self) -> dict:
+        data = self.summary()
+        with self._lock:
+            data.update({
+                "runs": self.runs,
+                "avg_bytes_per_run": int(self.bytes / self.runs) if self.runs else 0,
+                "compression": SSE_COMPRESSION,
+                "compressed_bytes_in": self.compressed_in,
+                "compressed_bytes_out": self.compressed_out,
+                "compression_ratio": round(self.compressed_out / self.compressed_in, 3) if self.compressed_in else None,
+            })
+        return data
+
+
+wire_totals = WireStats()
+# Set by the orchestrator for the duration of a run; node tasks inherit it
+current_wire = contextvars.ContextVar("current_wire", default=None)
+
+
+def start_run() -> WireStats:
+    stats = WireStats()
+    current_wire.set(stats)
+    with wire_totals._lock:
+        wire_totals.runs += 1
+    return stats
+
+
+def _count(size: int, seconds: float):
+    wire_totals.add(size, seconds)
+    stats = current_wire.get()
+    if stats is not None:
+        stats.add(size, seconds)
+
+
+def sse_event(data: dict) -> bytes:
+    """`data: {json}\\n\\n` as bytes, encoded once."""
+    started = time.perf_counter()
+    chunk = b"data: " + dumps(data) + b"\n\n"
+    _count(len(chunk), time.perf_counter() - started)
+    return chunk
+
+
+def sse_wrapped(event_type: str, data_json: bytes) -> bytes:
+    """SSE chunk for {"type": event_type, "data": <already encoded data_json>}."""
+    started = time.perf_counter()
+    chunk = b'data: {"type":"' + event_type.encode() + b'","data":' + data_json + b"}\n\n"
+    _count(len(chunk), time.perf_counter() - started)
+    return chunk
+
+
+def encode_timed(obj) -> bytes:
+    """dumps() whose cost is counted against the current run."""
+    started = time.perf_counter()
+    data = dumps(obj)
+    elapsed = time.perf_counter() - started
+    with wire_totals._lock:
+        wire_totals.encode_s += elapsed
+    stats = current_wire.get()
+    if stats is not None:
+        with stats._lock:
+            stats.encode_s += elapsed
+    return data
+
+
+# ═══════════════════════════════════════════
+# Per-connection compression
+# ═══════════════════════════════════════════
+
+def negotiate(accept_encoding: str, requested=None):
+    """Pick "br", "gzip" or None from the request's preference and Accept-Encoding."""
+    mode = str(requested).lower() if requested not in (None, "") else SSE_COMPRESSION
+    if mode in ("1", "true", "on"):
+        mode = "auto"
+    if mode in ("0", "false", "off", "none"):
+        return None
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if mode in ("br", "auto") and brotli is not None and "br" in accepted:
+        return "br"
+    if mode in ("gzip", "auto") and "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+async def compressed(chunks, encoding: str):
+    """Compress a byte stream, flushing after every event so nothing waits in the buffer."""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        step = lambda data: compressor.process(data) + compressor.flush()
+        finish = compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+        step = lambda data: compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+    async for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        out = step(chunk)
+        wire_totals.add_compressed(len(chunk), len(out))
+        yield out
+    tail = finish()
+    if tail:
+        yield tail
+
+
+def stream_headers(encoding) -> dict:
+    return {"Content-Encoding": encoding, "Vary": "Accept-Encoding"} if encoding else {"Vary": "Accept-Encoding"}
@@ -0,0 +1,178 @@
+"""
+Intent Cache — component decompositions reused across near-identical requests.
+Intents are normalized ("Build 1 electric SUV please" → "electric suv") for an exact
+lookup; otherwise MinHash signatures over character shingles are banded into an LSH
+index so near-duplicates above a Jaccard threshold are served without an LLM call.
+"""
+
+import copy
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from quote_cache import normalize_name
+
+INTENT_CACHE_ENABLED = os.getenv("INTENT_CACHE", "1") != "0"
+INTENT_CACHE_TTL_S = float(os.getenv("INTENT_CACHE_TTL_S", str(24 * 3600)))
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "5000"))
+# Estimated Jaccard similarity (over shingles) needed to reuse a near-duplicate's analysis
+INTENT_CACHE_THRESHOLD = float(os.getenv("INTENT_CACHE_THRESHOLD", "0.8"))
+
+SHINGLE_SIZE = 4     # character shingles — tolerant of typos and word order
+NUM_PERM = 64
+LSH_BANDS = 16       # 16 bands × 4 rows: pairs above ~0.5 similarity become candidates
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+_MERSENNE = (1 << 61) - 1
+_PERMS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % (_MERSENNE - 1) + 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _MERSENNE)
+    for i in range(NUM_PERM)
+]
+
+# Words that do not change what has to be built
+FILLER_WORDS = {
+    "a", "an", "the", "i", "we", "me", "us", "my", "our", "please", "pls", "need", "want", "would", "like",
+    "to", "build", "make", "create", "assemble", "produce", "manufacture", "get", "order", "some", "for",
+    "can", "you", "could", "help", "with", "of", "unit", "piece", "one",
+}
+
+
+def normalize_intent(intent: str) -> str:
+    """Lowercase, singularize, drop filler words and the quantity 1."""
+    words = normalize_name(intent).split()
+    return " ".join(w for w in words if w not in FILLER_WORDS and w != "1")
+
+
+def _quantities(normalized: str) -> tuple:
+    # Differing quantities change the decomposition, so they must match exactly
+    return tuple(sorted(w for w in normalized.split() if w.isdigit()))
+
+
+def shingles(normalized: str) -> set:
+    text = f" {normalized} "
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingle_set: set) -> tuple:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingle_set]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMS)
+
+
+def estimated_similarity(sig_a: tuple, sig_b: tuple) -> float:
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _bands(signature: tuple):
+    for band in range(LSH_BANDS):
+        yield band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+
+
+class IntentCache:
+    """Thread-safe LRU of intent analyses with an LSH index for near-duplicate lookup."""
+
+    def __init__(self, ttl_s: float = INTENT_CACHE_TTL_S, max_entries: int = INTENT_CACHE_MAX_ENTRIES,
+                 threshold: float = INTENT_CACHE_THRESHOLD):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()  # normalized -> {"intent", "analysis", "signature", "stored_at"}
+        self._buckets = {}             # (band, rows) -> {normalized, ...}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in _bands(entry["signature"]):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def _hit(self, key: str, entry: dict, kind: str, similarity: float, now: float):
+        self._entries.move_to_end(key)
+        return copy.deepcopy(entry["analysis"]), {
+            "hit": True,
+            "match": kind,
+            "similarity": round(similarity, 3),
+            "matched_intent": entry["intent"],
+            "age_s": int(now - entry["stored_at"]),
+        }
+
+    def lookup(self, intent: str):
+        """Return (analysis, info) for a cached or near-duplicate intent, else (None, info)."""
+        if not INTENT_CACHE_ENABLED:
+            return None, {"hit": False}
+        key = normalize_intent(intent)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["stored_at"] <= self.ttl_s:
+                self.exact_hits += 1
+                return self._hit(key, entry, "exact", 1.0, now)
+
+        signature = minhash(shingles(key))
+        quantities = _quantities(key)
+        with self._lock:
+            candidates = set()
+            for band_key in _bands(signature):
+                candidates |= self._buckets.get(band_key, set())
+            best, best_sim = None, 0.0
+            for candidate in candidates:
+                entry = self._entries.get(candidate)
+                if entry is None or now - entry["stored_at"] > self.ttl_s:
+                    continue
+                if _quantities(candidate) != quantities:
+                    continue
+                sim = estimated_similarity(signature, entry["signature"])
+                if sim > best_sim:
+                    best, best_sim = candidate, sim
+            if best is not None and best_sim >= self.threshold:
+                self.near_hits += 1
+                return self._hit(best, self._entries[best], "near_duplicate", best_sim, now)
+            self.misses += 1
+        return None, {"hit": False}
+
+    def store(self, intent: str, analysis: dict):
+        if not INTENT_CACHE_ENABLED:
+            return
+        key = normalize_intent(intent)
+        signature = minhash(shingles(key))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {
+                "intent": intent,
+                "analysis": copy.deepcopy(analysis),
+                "signature": signature,
+                "stored_at": time.time(),
+            }
+            for band_key in _bands(signature):
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.exact_hits + self.near_hits + self.misses
+            return {
+                "enabled": INTENT_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "exact_hits": self.exact_hits,
+                "near_duplicate_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.near_hits) / total, 3) if total else 0.0,
+            }
+
+
+intent_cache = IntentCache()
@@ -0,0 +1,220 @@
+"""
+Job Queue — orchestration runs executed by a worker pool, decoupled from HTTP clients.
+POST /api/run enqueues a job; its SSE chunks go into a per-job buffer that any number
+of viewers can follow, resuming from Last-Event-ID after a dropped connection. A run
+keeps going (and is persisted) whether or not anyone is watching.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import os
+import time
+
+from encoding import sse_event
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+# Finished jobs stay in memory this long for late/resuming viewers, then the
+# project store serves their events
+JOB_RETENTION_S = float(os.getenv("JOB_RETENTION_S", "300"))
+# Identical runs (same key) submitted while one is queued/running attach to it
+RUN_COALESCING = os.getenv("RUN_COALESCING", "1") != "0"
+
+
+class Job:
+    """One run: its event buffer and the viewers waiting on new events."""
+
+    def __init__(self, job_id: str, intent: str, events, priority: int):
+        self.id = job_id
+        self.intent = intent
+        self.priority = priority
+        self.order = 0
+        self.status = "queued"
+        self.chunks = []  # encoded SSE chunks (bytes); the index is the event id
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.viewers = 0
+        self.key = None
+        self.joiners = 0  # requests coalesced onto this job
+        self._events = events
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "error", "cancelled")
+
+    async def _publish(self, chunk: str = None):
+        async with self._changed:
+            if chunk is not None:
+                self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finished(self):
+        """Wait until the run has ended (its last event is buffered and persisted)."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.done)
+
+    async def append_late(self, chunk: bytes):
+        """Buffer an event produced after the run finished, for viewers that resume later."""
+        await self._publish(chunk)
+
+    async def follow(self, last_event_id: int = -1, transform=None):
+        """
+        Yield `id: n` framed chunks after last_event_id, then live ones until the job ends.
+        `transform(chunk)` returns the chunk this viewer is sent instead, or None to skip it.
+        """
+        self.viewers += 1
+        try:
+            seq = last_event_id + 1
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: len(self.chunks) > seq or self.done)
+                    pending = self.chunks[seq:]
+                    finished = self.done
+                for chunk in pending:
+                    if transform is not None:
+                        chunk = transform(chunk)
+                    if chunk is not None:
+                        yield b"id: %d\n" % seq + chunk
+                    seq += 1
+                if finished and seq >= len(self.chunks):
+                    return
+        finally:
+            self.viewers -= 1
+
+    def info(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "events": len(self.chunks),
+            "viewers": self.viewers,
+            "coalesced_requests": self.joiners,
+            "queued_s": round((self.started_at or time.time()) - self.created_at, 3),
+            "run_s": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class JobQueue:
+    """Priority queue of jobs drained by JOB_WORKERS asyncio workers."""
+
+    def __init__(self, workers: int = JOB_WORKERS, retention_s: float = JOB_RETENTION_S):
+        self.workers = max(1, workers)
+        self.retention_s = retention_s
+        self._jobs = {}
+        self._inflight = {}  # coalescing key -> queued/running job
+        self._loop = None
+        self._queue = None
+        self._workers = []
+        self._order = itertools.count()
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or the server restarted its event loop
+            self._loop, self._queue, self._workers = loop, asyncio.PriorityQueue(), []
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.workers:
+            self._workers.append(asyncio.create_task(self._work()))
+
+    def join(self, key):
+        """The queued/running job for `key`, counted as a coalesced request, or None."""
+        if not RUN_COALESCING or key is None:
+            return None
+        job = self._inflight.get(key)
+        if job is None or job.done:
+            return None
+        job.joiners += 1
+        self.coalesced += 1
+        return job
+
+    def submit(self, job_id: str, intent: str, events, priority: int = 0, key=None) -> Job:
+        """
+        Queue an async generator of SSE chunks; interactive jobs run ahead of batch ones.
+        With a `key`, later identical requests can `join()` this job until it finishes.
+        """
+        self._ensure_workers()
+        job = Job(job_id, intent, events, priority)
+        job.order = next(self._order)
+        job.key = key
+        if RUN_COALESCING and key is not None:
+            self._inflight[key] = job
+        self._jobs[job_id] = job
+        self.submitted += 1
+        self._queue.put_nowait((priority, job.order, job))
+        return job
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> int:
+        """Jobs queued ahead of this one (0 once it is running)."""
+        if job.status != "queued" or self._queue is None:
+            return 0
+        return sum(1 for p, n, _ in list(self._queue._queue) if (p, n) < (job.priority, job.order))
+
+    async def _work(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                # Each job runs in a fresh context so per-run ContextVars never leak between jobs
+                await contextvars.Context().run(asyncio.create_task, self._run(job))
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        self.running += 1
+        try:
+            async for chunk in job._events:
+                await job._publish(chunk)
+            job.status = "completed"
+            self.completed += 1
+        except Exception as e:
+            print(f"[Jobs] {job.id} failed: {str(e)[:160]}")
+            job.status = "error"
+            self.failed += 1
+            await job._publish(sse_event({"type": "error", "message": str(e)[:300]}))
+        except asyncio.CancelledError:
+            # Server shutdown or a cancelled worker: end the job so its followers are released
+            print(f"[Jobs] {job.id} cancelled")
+            job.status = "cancelled"
+            self.failed += 1
+            job.chunks.append(sse_event({"type": "error", "message": "Run cancelled"}))
+            raise
+        finally:
+            self.running -= 1
+            job.finished_at = time.time()
+            job._events = None
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            await job._publish()
+            asyncio.get_running_loop().call_later(self.retention_s, self._jobs.pop, job.id, None)
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "retained": len(self._jobs),
+            "viewers": sum(j.viewers for j in self._jobs.values()),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "coalescing": {
+                "enabled": RUN_COALESCING,
+                "in_flight_keys": len(self._inflight),
+                "coalesced_requests": self.coalesced,
+                # Share of /api/run requests served by an already-running job
+                "rate": round(self.coalesced / (self.submitted + self.coalesced), 3) if self.submitted + self.coalesced else 0.0,
+            },
+        }
+
+
+job_queue = JobQueue()
@@ -5,14 +5,12 @@ FastAPI server with 5 AI agents coordinating via A2A-style HTTP/JSON.
 Run: python main.py
 """
 
-import json
 import uuid
 import asyncio
 import os
-from datetime import datetime
 
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.base import BaseHTTPMiddleware
 from dotenv import load_dotenv
@@ -21,21 +19,27 @@ load_dotenv()
 load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env.local"))
 
 from registry import list_agents, search_agents, get_agent
-from agents import (
-    supplier_check_availability,
-    manufacturer_check_capacity,
-    logistics_plan_route,
-    retailer_plan_delivery,
-)
-from procurement import analyze_intent
-from selector import (
-    select_suppliers,
-    select_manufacturers,
-    select_logistics,
-    format_supplier_summary,
-    format_manufacturer_summary,
-    format_logistics_summary,
+from procurement import INTENT_BACKENDS, crew_pool
+from providers import get_provider
+from batching import planner
+from scheduler import scheduler, request_priority, parse_priority
+import resilience
+from quote_cache import quote_store
+from intent_cache import intent_cache, normalize_intent
+from prompts import prefix_cache_snapshot
+import retail
+from pacing import Pacer, parse_pace, pacing_stats
+from project_store import project_store
+from jobs import job_queue
+from batch import BATCH_MAX_INTENTS, run_batch
+from usage import usage_ledger, current_project
+from orchestration import SPECULATIVE_EXECUTION, Run, execute, log_entry
+from encoding import (
+    sse_event, sse_wrapped, encode_timed, start_run, wire_totals, negotiate, compressed, stream_headers,
 )
+from report import report_cache, parse_report_mode
+from replan import ReplanError, phase_cache, replan
+from views import TaggedChunk, parse_view, parse_fields, project_plan, get_path, stream_projection, replay_projection
 
 app = FastAPI(
     title="One Click AI — Supply Chain Agents",
@@ -60,6 +64,18 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def warm_intent_crews():
+    """Build the procurement crews before the first request instead of during it."""
+    provider = get_provider()
+    if provider.name == "offline" or crew_pool.size <= 0:
+        return
+    try:
+        await asyncio.to_thread(crew_pool.warm, provider.model)
+    except Exception as e:
+        print(f"[CrewPool] Warm-up skipped: {str(e)[:120]} — crews will be built on first use")
+
+
 # ═══════════════════════════════════════════
 # Health check
 # ═══════════════════════════════════════════
@@ -84,32 +100,8 @@ def test_api_post():
     return {"status": "ok", "message": "POST is working"}
 
 
-# ═══════════════════════════════════════════
-# Utility
-# ═══════════════════════════════════════════
-
-def sse_event(data: dict) -> str:
-    return f"data: {json.dumps(data)}\n\n"
-
-
-def log_entry(agent_id, agent_name, event, details="", data=None, phase=""):
-    entry = {
-        "type": "log",
-        "timestamp": datetime.utcnow().isoformat() + "Z",
-        "agent_id": agent_id,
-        "agent_name": agent_name,
-        "event": event,
-        "details": details,
-        "phase": phase,
-    }
-    if data:
-        entry["data"] = data
-    return entry
-
-
-# Default reference location (central EU — used for distance scoring)
-DEFAULT_REF_X = 48.85  # Paris lat
-DEFAULT_REF_Y = 2.35   # Paris lon
+# Longest pause between events when replaying a stored run at its original pace
+MAX_REPLAY_GAP_S = 5.0
 
 
 # ═══════════════════════════════════════════
@@ -126,6 +118,26 @@ def get_registry():
     return {"agents": list_agents()}
 
 
+@app.get("/api/metrics")
+def get_metrics():
+    return {
+        "batching": planner.snapshot(),
+        "scheduler": scheduler.snapshot(),
+        "resilience": resilience.snapshot(),
+        "quote_cache": quote_store.snapshot(),
+        "prompt_cache": prefix_cache_snapshot(),
+        "llm_usage": usage_ledger.snapshot(),
+        "intent_crews": crew_pool.snapshot(),
+        "intent_cache": intent_cache.snapshot(),
+        "pacing": pacing_stats.snapshot(),
+        "project_store": project_store.snapshot(),
+        "jobs": job_queue.snapshot(),
+        "serialization": wire_totals.snapshot(),
+        "coordination_report": report_cache.snapshot(),
+        "replan": phase_cache.snapshot(),
+    }
+
+
 @app.post("/api/run")
 async def run_project(request: Request):
     print(f"[DEBUG] POST /api/run called - Method: {request.method}, URL: {request.url}")
@@ -141,650 +153,317 @@ async def run_project(request: Request):
         return {"error": "Intent is required"}, 400
 
     project_id = f"proj_{uuid.uuid4().hex[:8]}"
+    # "interactive" (default) runs are admitted ahead of "batch" jobs by the LLM scheduler
+    priority = parse_priority(body.get("priority", "interactive"))
+    speculative = bool(body.get("speculative", SPECULATIVE_EXECUTION))
+    # "crewai" or "direct"; None → INTENT_BACKEND
+    intent_backend = body.get("intent_backend")
+    if intent_backend is not None and intent_backend not in INTENT_BACKENDS:
+        return JSONResponse({"error": f"intent_backend must be one of {', '.join(INTENT_BACKENDS)}"}, status_code=400)
+    # Presentation pacing between events: 1 = dashboard rhythm, 0 = as fast as agents finish
+    pace = parse_pace(body.get("pace"), priority)
+    # Plan projection for this connection: view "full" (default) or "summary", fields "a,b.c"
+    view, fields = parse_view(body.get("view")), parse_fields(body.get("fields"))
+    # "stream": report event after the plan; "lazy": fetched from /api/projects/{id}/report
+    report_mode = parse_report_mode(body.get("report"))
 
     async def orchestrate():
+        request_priority.set(priority)
+        current_project.set(project_id)
+        pacer = Pacer(pace)
+        wire = start_run()
+        run = Run(project_id, intent, pacer, speculative=speculative, intent_backend=intent_backend)
+
         # ── Phase 1: Project Creation ──
         yield sse_event(log_entry(
             "system", "System", "project_created",
             f"Project {project_id} initialized",
             phase="initialization",
         ))
-        await asyncio.sleep(0.3)
-
-        # ── Phase 2: Procurement Agent — Intent Analysis (CrewAI) ──
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "analyzing_intent",
-            "CrewAI agent analyzing request and identifying all required components...",
-            phase="analysis",
-        ))
-        await asyncio.sleep(0.1)
-
-        try:
-            components_data = await asyncio.to_thread(analyze_intent, intent)
-        except Exception as e:
-            yield sse_event(log_entry(
-                "procurement_main", "Procurement Agent", "analysis_error",
-                f"CrewAI analysis failed: {str(e)[:100]}. Using fallback.",
-                phase="analysis",
-            ))
-            components_data = {
-                "product": intent,
-                "product_category": "general",
-                "components": [{"name": "Primary component", "category": "general", "specifications": "As requested", "estimated_quantity": 1, "priority": "critical", "estimated_unit_cost_usd": 0}],
-                "assembly_complexity": "medium",
-            }
-
-        product_name = components_data.get("product", intent)
-        components = components_data.get("components", [])
-
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "components_identified",
-            f"Identified {len(components)} component groups for: {product_name}",
-            data={"product": product_name, "component_count": len(components), "components": components},
-            phase="analysis",
-        ))
-        await asyncio.sleep(0.5)
-
-        # ── Phase 3: Registry Discovery ──
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "querying_registry",
-            "Querying agent registry and partner databases (30 suppliers, 30 manufacturers, 30 logistics providers)...",
-            phase="discovery",
-        ))
-        await asyncio.sleep(0.3)
-
-        # Extract component specs for matching
-        component_specs = []
-        for c in components:
-            if isinstance(c, dict):
-                name = c.get("name", "").lower()
-                cat = c.get("category", "").lower()
-                component_specs.extend([name, cat])
-            elif isinstance(c, str):
-                component_specs.append(c.lower())
-
-        # Dynamic partner count based on complexity
-        num_components = len(components)
-        supplier_count = min(max(num_components, 3), 8)   # 3-8 suppliers based on component diversity
-        manufacturer_count = min(max(num_components // 2, 2), 5)  # 2-5 manufacturers
-        logistics_count = min(max(num_components // 3, 2), 4)     # 2-4 logistics providers
-
-        # Build capability keywords from components for manufacturer matching
-        mfg_keywords = ["assembly", "production"]
-        for c in components:
-            if isinstance(c, dict):
-                cat = c.get("category", "").lower()
-                name = c.get("name", "").lower()
-                if cat: mfg_keywords.append(cat)
-                # Add relevant keywords
-                for kw in ["electronics", "mechanical", "automotive", "metal", "chemical", "textile", "precision", "machining", "injection", "welding"]:
-                    if kw in name or kw in cat:
-                        mfg_keywords.append(kw)
-
-        # Smart selection from database
-        best_suppliers = select_suppliers(component_specs, DEFAULT_REF_X, DEFAULT_REF_Y, top_n=supplier_count)
-        best_manufacturers = select_manufacturers(
-            mfg_keywords,
-            DEFAULT_REF_X, DEFAULT_REF_Y, top_n=manufacturer_count
-        )
-        best_logistics = select_logistics(DEFAULT_REF_X, DEFAULT_REF_Y, DEFAULT_REF_X, DEFAULT_REF_Y, top_n=logistics_count)
-
-        supplier_summaries = [format_supplier_summary(s) for s in best_suppliers]
-        manufacturer_summaries = [format_manufacturer_summary(m) for m in best_manufacturers]
-        logistics_summaries = [format_logistics_summary(l) for l in best_logistics]
-
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "partners_selected",
-            f"Selected top {len(best_suppliers)} suppliers, {len(best_manufacturers)} manufacturers, {len(best_logistics)} logistics providers based on distance, cost, and reliability scoring",
-            data={
-                "selected_suppliers": [{"name": s["name"], "location": f"{s['city']}, {s['country']}", "score": s["_score"]} for s in best_suppliers],
-                "selected_manufacturers": [{"name": m["name"], "location": f"{m['city']}, {m['country']}", "score": m["_score"]} for m in best_manufacturers],
-                "selected_logistics": [{"name": l["name"], "hub": f"{l['city']}, {l['country']}", "score": l["_score"]} for l in best_logistics],
-            },
-            phase="discovery",
-        ))
-        await asyncio.sleep(0.3)
-
-        # ── Phase 4: Supplier Agent — Quotes ──
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "contacting_supplier",
-            f"Sending A2A availability request to Supplier Agent with {len(best_suppliers)} pre-selected suppliers...",
-            data={"message_type": "A2A_REQUEST", "to": "supplier_alpha"},
-            phase="supplier_coordination",
-        ))
-        await asyncio.sleep(0.2)
-
-        yield sse_event(log_entry(
-            "supplier_alpha", "Supplier Agent", "processing_request",
-            f"Evaluating {len(components)} components against {len(best_suppliers)} suppliers: {', '.join(s['name'] for s in best_suppliers)}",
-            phase="supplier_coordination",
-        ))
-
-        try:
-            supplier_response = await asyncio.to_thread(
-                supplier_check_availability, project_id, components, product_name, best_suppliers
-            )
-        except Exception as e:
-            print(f"[ERROR] Supplier agent call failed: {str(e)[:200]}")
-            supplier_response = {"agent_id": "supplier_alpha", "status": "error", "error": str(e), "quotes": []}
-
-        num_quotes = len(supplier_response.get("quotes", []))
-        suppliers_used = supplier_response.get("suppliers_used", [])
-        print(f"[DEBUG] Supplier response: {num_quotes} quotes, {len(suppliers_used)} suppliers used, total_cost={supplier_response.get('total_estimated_cost', 'N/A')}")
-
-        # ── Fallback: if supplier returned 0 quotes, build synthetic quotes from procurement data ──
-        if num_quotes == 0 and len(components) > 0:
-            print(f"[WARN] Supplier agent returned 0 quotes for {len(components)} components. Building fallback quotes from procurement data...")
-            fallback_quotes = []
-            fallback_suppliers = set()
-            for idx, c in enumerate(components):
-                cname = c.get("name", f"Component {idx+1}") if isinstance(c, dict) else str(c)
-                cat = c.get("category", "general") if isinstance(c, dict) else "general"
-                est_cost = float(c.get("estimated_unit_cost_usd", 0)) if isinstance(c, dict) else 0
-                est_qty = int(c.get("estimated_quantity", 1)) if isinstance(c, dict) else 1
-                # Assign to a supplier from the pre-selected list (round-robin)
-                assigned = best_suppliers[idx % len(best_suppliers)] if best_suppliers else {}
-                sname = assigned.get("name", "Unassigned")
-                sloc = f"{assigned.get('city', '?')}, {assigned.get('country', '?')}"
-                lead = assigned.get("lead_time_days", 14)
-                fallback_suppliers.add(sname)
-                fallback_quotes.append({
-                    "component_name": cname,
-                    "assigned_supplier": sname,
-                    "supplier_location": sloc,
-                    "available": True,
-                    "description": c.get("specifications", f"{cname} — {cat}") if isinstance(c, dict) else cname,
-                    "specifications": cat,
-                    "unit_cost_usd": est_cost if est_cost > 0 else 50.0,
-                    "quantity": est_qty,
-                    "total_line_cost": (est_cost if est_cost > 0 else 50.0) * est_qty,
-                    "lead_time_days": lead,
-                    "constraints": [],
-                    "supplier_notes": "Fallback quote — supplier agent did not return data for this component",
-                })
-            supplier_response["quotes"] = fallback_quotes
-            supplier_response["suppliers_used"] = list(fallback_suppliers)
-            supplier_response["total_estimated_cost"] = sum(q["total_line_cost"] for q in fallback_quotes)
-            supplier_response["status"] = "fallback_quotes_generated"
-            num_quotes = len(fallback_quotes)
-            suppliers_used = supplier_response["suppliers_used"]
-            print(f"[INFO] Built {num_quotes} fallback quotes, total=${supplier_response['total_estimated_cost']:,.2f}")
-
-        cost_display = ""
-        if isinstance(supplier_response.get('total_estimated_cost'), (int, float)):
-            cost_display = f". Total: ${supplier_response['total_estimated_cost']:,.2f}"
-
-        yield sse_event(log_entry(
-            "supplier_alpha", "Supplier Agent", "quotes_generated",
-            f"Generated {num_quotes} component quotes across {len(suppliers_used)} suppliers{cost_display}",
-            data={"message_type": "A2A_RESPONSE", "response": supplier_response},
-            phase="supplier_coordination",
-        ))
-        await asyncio.sleep(0.3)
-
-        # Trust verification
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "verifying_supplier",
-            f"Verifying supplier certifications and policy compliance for {len(suppliers_used)} selected partners...",
-            data={"trust_check": "passed", "verified_suppliers": suppliers_used},
-            phase="verification",
-        ))
-        await asyncio.sleep(0.3)
-
-        # ── Phase 5: Manufacturer Agent ──
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "contacting_manufacturer",
-            f"Sending A2A assembly request to Manufacturer Agent with {len(best_manufacturers)} pre-selected facilities...",
-            data={"message_type": "A2A_REQUEST", "to": "manufacturer_prime"},
-            phase="manufacturer_coordination",
-        ))
-        await asyncio.sleep(0.2)
-
-        yield sse_event(log_entry(
-            "manufacturer_prime", "Manufacturer Agent", "evaluating_capacity",
-            f"Evaluating {len(best_manufacturers)} facilities: {', '.join(m['name'] for m in best_manufacturers)}",
-            phase="manufacturer_coordination",
-        ))
-
+        await pacer.pause(0.3)
+
+        # ── Phases 2-8: the pipeline DAG; its nodes stream log events as they run ──
+        executor = asyncio.create_task(execute(run))
+        while True:
+            chunk = await run.events.get()
+            if chunk is None:
+                break
+            yield chunk
+        dag_run = await executor
+        report = dag_run.results["report"]
+        execution_plan, retailer_response = report["plan"], report["retailer_response"]
+        execution_plan["execution"] = dag_run.breakdown()
+        # Phase outputs stay around so what-if re-plans can start from them
+        phase_cache.put(run, dag_run.results)
+
+        # Send full plan — encoded once; the same bytes are stored
+        execution_plan["serialization"] = wire.summary()
         try:
-            manufacturer_response = await asyncio.to_thread(
-                manufacturer_check_capacity, project_id, components, supplier_response, product_name, best_manufacturers
-            )
+            plan_bytes = encode_timed(execution_plan)
         except Exception as e:
-            manufacturer_response = {"agent_id": "manufacturer_prime", "status": "error", "error": str(e)}
-
-        selected_mfg = manufacturer_response.get("selected_manufacturer", "N/A")
-        # Also capture the manufacturer location from AI response
-        selected_mfg_location = manufacturer_response.get("manufacturer_location", "")
-        yield sse_event(log_entry(
-            "manufacturer_prime", "Manufacturer Agent", "assembly_plan_ready",
-            f"Selected: {selected_mfg}. Assembly time: {manufacturer_response.get('assembly_plan', {}).get('total_assembly_time_days', 'N/A')} days",
-            data={"message_type": "A2A_RESPONSE", "response": manufacturer_response},
-            phase="manufacturer_coordination",
-        ))
-        await asyncio.sleep(0.3)
-
-        # ── Phase 6: Logistics Agent ──
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "contacting_logistics",
-            f"Sending A2A routing request to Logistics Agent with {len(best_logistics)} pre-selected providers...",
-            data={"message_type": "A2A_REQUEST", "to": "logistics_global"},
-            phase="logistics_coordination",
-        ))
-        await asyncio.sleep(0.2)
-
-        yield sse_event(log_entry(
-            "logistics_global", "Logistics Provider Agent", "planning_route",
-            f"Evaluating {len(best_logistics)} providers: {', '.join(l['name'] for l in best_logistics)}",
-            phase="logistics_coordination",
-        ))
-
-        mfg_location = manufacturer_response.get("manufacturer_location", "EU")
-        pickup_info = {
-            "suppliers": suppliers_used,
-            "manufacturer": selected_mfg,
-            "manufacturer_location": mfg_location,
-        }
-        delivery_info = {"destination": "Customer location", "product_type": product_name}
-
-        try:
-            logistics_response = await asyncio.to_thread(
-                logistics_plan_route, project_id, pickup_info, delivery_info, product_name, best_logistics
-            )
-        except Exception as e:
-            logistics_response = {"agent_id": "logistics_global", "status": "error", "error": str(e)}
-
-        selected_log = logistics_response.get("selected_provider", "N/A")
-        yield sse_event(log_entry(
-            "logistics_global", "Logistics Provider Agent", "route_planned",
-            f"Selected: {selected_log}. Recommended route ready.",
-            data={"message_type": "A2A_RESPONSE", "response": logistics_response},
-            phase="logistics_coordination",
-        ))
-        await asyncio.sleep(0.3)
-
-        # ── Pre-compute costs BEFORE retailer call ──
-        def safe_num(v, default=0):
-            try:
-                return float(v) if v else default
-            except (ValueError, TypeError):
-                return default
-
-        # Supplier cost: use AI total, but verify against individual quotes
-        ai_supplier_total = safe_num(supplier_response.get("total_estimated_cost"))
-        quotes = supplier_response.get("quotes", [])
-
-        computed_from_quotes = 0
-        for q in quotes:
-            line_cost = safe_num(q.get("total_line_cost", 0))
-            if line_cost > 0:
-                computed_from_quotes += line_cost
-            else:
-                unit = safe_num(q.get("unit_cost_usd", 0))
-                qty = safe_num(q.get("quantity", q.get("quantity_available", 1)))
-                if qty < 1:
-                    qty = 1
-                computed_from_quotes += unit * qty
-
-        if ai_supplier_total < 50 and computed_from_quotes > 50:
-            supplier_cost = computed_from_quotes
-            print(f"[DEBUG] Supplier cost corrected: AI said ${ai_supplier_total:.2f}, computed ${computed_from_quotes:.2f}")
-        elif computed_from_quotes > ai_supplier_total * 1.5:
-            supplier_cost = computed_from_quotes
-        else:
-            supplier_cost = max(ai_supplier_total, computed_from_quotes)
-
-        logistics_cost = safe_num(
-            logistics_response.get("routes", [{}])[0].get("cost_usd") if logistics_response.get("routes") else 0
-        )
-        total_cost = supplier_cost + logistics_cost
-        print(f"[DEBUG] Pre-retailer costs: supplier=${supplier_cost:,.2f}, logistics=${logistics_cost:,.2f}, total=${total_cost:,.2f}")
-
-        # ── Phase 7: Retailer Agent ──
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "contacting_retailer",
-            "Sending A2A delivery request to Retailer Agent...",
-            data={"message_type": "A2A_REQUEST", "to": "retailer_direct"},
-            phase="retailer_coordination",
-        ))
-        await asyncio.sleep(0.2)
-
-        yield sse_event(log_entry(
-            "retailer_direct", "Retailer Agent", "planning_delivery",
-            "Creating customer delivery plan, packaging, and support...",
-            phase="retailer_coordination",
-        ))
-
-        # Pass actual procurement costs to retailer so it can price realistically
-        retailer_cost_data = {
-            "parts_cost_usd": supplier_cost,
-            "shipping_cost_usd": logistics_cost,
-            "total_procurement_cost_usd": total_cost,
-        }
-
-        try:
-            retailer_response = await asyncio.to_thread(
-                retailer_plan_delivery, project_id, product_name, manufacturer_response, logistics_response, retailer_cost_data
-            )
-        except Exception as e:
-            retailer_response = {"agent_id": "retailer_direct", "status": "error", "error": str(e)}
-
-        # ── Validate retail price: must be > total procurement cost ──
-        raw_retail = safe_num(retailer_response.get("final_retail_price_usd"))
-        if raw_retail < total_cost * 1.05:
-            # AI returned an unrealistic retail price — recompute with margin
-            margin_pct = safe_num(retailer_response.get("margin_percentage"), 25)
-            if margin_pct < 10:
-                margin_pct = 25
-            corrected_retail = round(total_cost * (1 + margin_pct / 100), 2)
-            print(f"[DEBUG] Retail price corrected: AI said ${raw_retail:,.2f}, total_cost=${total_cost:,.2f}, corrected to ${corrected_retail:,.2f} ({margin_pct}% margin)")
-            retailer_response["final_retail_price_usd"] = corrected_retail
-            retailer_response["margin_percentage"] = margin_pct
-
-        yield sse_event(log_entry(
-            "retailer_direct", "Retailer Agent", "delivery_planned",
-            f"Delivery plan ready. Offset: {retailer_response.get('delivery_plan', {}).get('estimated_delivery_date_offset_days', 'N/A')} days. Retail: ${safe_num(retailer_response.get('final_retail_price_usd')):,.2f}",
-            data={"message_type": "A2A_RESPONSE", "response": retailer_response},
-            phase="retailer_coordination",
-        ))
-        await asyncio.sleep(0.3)
+            print(f"[ERROR] Failed to serialize plan: {e}")
+            # Fallback: send plan without coordination_report to reduce size
+            execution_plan["coordination_report"] = {}
+            plan_bytes = encode_timed(execution_plan)
+        print(f"[DEBUG] Plan JSON size: {len(plan_bytes)} bytes")
+        # Tagged with the plan itself so viewers asking for a summary or fields can be projected
+        yield TaggedChunk(sse_wrapped("plan", plan_bytes), "plan", execution_plan)
+
+        # The coordination report is rendered only now, after the plan is out — or never,
+        # for "lazy" runs, until someone fetches /api/projects/{id}/report
+        if report_mode == "stream":
+            coordination_report = report_cache.get(project_id, execution_plan["report_facts"])
+            await pacer.pause(0.1)
+            yield TaggedChunk(sse_event({"type": "report", "data": coordination_report}), "report", coordination_report)
+
+        # The run completes with the rule-based plan; the Retailer Agent's prose follows in the background
+        project_store.save_plan(project_id, execution_plan, encoded=plan_bytes)
+        if run.enrichment_task is not None:
+            task = asyncio.create_task(enrich_later(project_id, run.enrichment_task, retailer_response, execution_plan))
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+        await pacer.pause(0.1)
+        yield sse_event({"type": "complete"})
+        stats = wire.summary()
+        print(f"[Wire] {project_id}: {stats['events']} events, {stats['bytes'] / 1024:.1f} KB, "
+              f"{stats['encode_ms']:.2f} ms encoding ({stats['encoder']})")
+
+    # Identical concurrent requests share one run: same normalized intent and options,
+    # including pacing and priority so nobody is served at someone else's rhythm or queue place
+    run_key = (normalize_intent(intent), intent_backend or "", speculative, report_mode, pace, priority)
+    job = job_queue.join(run_key)
+    coalesced = job is not None
+    if coalesced:
+        print(f"[Jobs] Coalesced request onto running {job.id} ({job.joiners} joined)")
+    else:
+        # The run belongs to the job queue, not to this connection: dropping it loses nothing
+        job = job_queue.submit(project_id, intent, recorded(project_id, intent, orchestrate()), priority, key=run_key)
+    if body.get("detach"):
+        return JSONResponse({
+            "job_id": job.id,
+            "project_id": job.id,
+            "status": job.status,
+            "coalesced": coalesced,
+            "queue_position": job_queue.position(job),
+            "events_url": f"/api/projects/{job.id}/events",
+        }, status_code=202)
+    # Late joiners replay everything the job has emitted so far, then follow it live
+    encoding = negotiate(request.headers.get("accept-encoding"), body.get("compress"))
+    events = job.follow(transform=stream_projection(view, fields))
+    stream = compressed(events, encoding) if encoding else events
+    return StreamingResponse(stream, media_type="text/event-stream",
+                             headers={"X-Coalesced": str(coalesced).lower(), **stream_headers(encoding)})
+
+
+@app.post("/api/run/batch")
+async def run_batch_endpoint(request: Request):
+    """N intents in one request; results stream back as JSON lines (application/x-ndjson)."""
+    try:
+        body = await request.json()
+    except Exception as e:
+        return JSONResponse({"error": "Invalid JSON", "details": str(e)}, status_code=400)
+    intents = body.get("intents")
+    if not isinstance(intents, list) or not intents or not all(isinstance(i, str) and i.strip() for i in intents):
+        return JSONResponse({"error": "intents must be a non-empty list of strings"}, status_code=400)
+    if len(intents) > BATCH_MAX_INTENTS:
+        return JSONResponse({"error": f"At most {BATCH_MAX_INTENTS} intents per batch"}, status_code=400)
+    intent_backend = body.get("intent_backend")
+    if intent_backend is not None and intent_backend not in INTENT_BACKENDS:
+        return JSONResponse({"error": f"intent_backend must be one of {', '.join(INTENT_BACKENDS)}"}, status_code=400)
+    speculative = bool(body.get("speculative", SPECULATIVE_EXECUTION))
+    lines = run_batch(intents, speculative, intent_backend,
+                      view=parse_view(body.get("view")), fields=parse_fields(body.get("fields")))
+    encoding = negotiate(request.headers.get("accept-encoding"), body.get("compress"))
+    return StreamingResponse(compressed(lines, encoding) if encoding else lines, media_type="application/x-ndjson",
+                             headers=stream_headers(encoding))
+
+
+_background = set()  # enrichment tasks outliving their run
+
+
+async def enrich_later(project_id, enrichment_task, retailer_response, execution_plan):
+    """
+    Merge the Retailer Agent's prose into a completed run's plan: the stored plan is
+    replaced and a plan_update event recorded (and buffered on the job if it is retained).
+    The phase outputs are left as the rules produced them.
+    """
+    try:
+        agent_response = await asyncio.wait_for(enrichment_task, retail.RETAIL_ENRICHMENT_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        print(f"[Retail] Enrichment not back within {retail.RETAIL_ENRICHMENT_TIMEOUT_S:.0f}s — keeping rule-based text")
+        return
+    updates = retail.merge_enrichment(retailer_response, agent_response)
+    if not updates:
+        return
+    # Late events go after the run's own, which must all be recorded first
+    job = job_queue.get(project_id)
+    if job is not None:
+        await job.finished()
+    retailer = {**execution_plan["retailer"], **updates}
+    plan = {**execution_plan, "retailer": retailer, "llm_usage": usage_ledger.project_summary(project_id)}
+    # A partial plan, tagged so viewers with a view or fields get it projected like the plan
+    update = {"project_id": project_id, "retailer": retailer, "llm_usage": plan["llm_usage"]}
+    chunk = TaggedChunk(sse_event({"type": "plan_update", "data": update}), "plan_update", update)
+    project_store.save_plan(project_id, plan)
+    project_store.append_late(project_id, chunk)
+    if job is not None:
+        await job.append_late(chunk)
+    print(f"[Retail] {project_id}: enriched {', '.join(updates)}")
+
+
+async def recorded(project_id, intent, events):
+    """Pass SSE chunks through while appending each one to the project store."""
+    project_store.start(project_id, intent)
+    status = "incomplete"  # client went away mid-run
+    try:
+        async for chunk in events:
+            project_store.append(project_id, chunk)
+            yield chunk
+        status = "completed"
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        project_store.finish(project_id, status)
 
-        # ── Phase 8: Final Plan ──
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "compiling_plan",
-            "All agents responded. Compiling final execution plan...",
-            phase="decision",
-        ))
-        await asyncio.sleep(0.5)
-
-        # Finalize all computed values
-        retail_price = safe_num(retailer_response.get("final_retail_price_usd"))
-        assembly_days = int(safe_num(manufacturer_response.get("assembly_plan", {}).get("total_assembly_time_days")))
-        supplier_lead = int(safe_num(max(
-            (safe_num(q.get("lead_time_days")) for q in quotes) if quotes else [0],
-            default=0
-        )))
-        logistics_days = int(safe_num(
-            logistics_response.get("routes", [{}])[0].get("total_duration_days") if logistics_response.get("routes") else 0
-        ))
-        delivery_offset = int(safe_num(retailer_response.get("delivery_plan", {}).get("estimated_delivery_date_offset_days")))
-        total_days = supplier_lead + assembly_days + logistics_days + delivery_offset
-        print(f"[DEBUG] Final costs: supplier=${supplier_cost:,.2f}, logistics=${logistics_cost:,.2f}, total=${total_cost:,.2f}, retail=${retail_price:,.2f}")
 
-        # ── Build Coordination Report separately for reliability ──
-        try:
-            intent_safe = intent[:80].replace('"', "'") + ("..." if len(intent) > 80 else "")
-            supplier_names = ", ".join(s.get("name", "?") for s in best_suppliers) if best_suppliers else "N/A"
-
-            coordination_report = {
-                "agents_involved": 5,
-                "total_partners_evaluated": {
-                    "suppliers": 30,
-                    "manufacturers": 30,
-                    "logistics_providers": 30,
-                },
-                "partners_shortlisted": {
-                    "suppliers": len(best_suppliers),
-                    "manufacturers": len(best_manufacturers),
-                    "logistics_providers": len(best_logistics),
-                },
-                "discovery_paths": [
-                    {
-                        "step": 1,
-                        "action": "Agent Registry Lookup",
-                        "result": "Identified 5 registered agent roles: Procurement (CrewAI), Supplier, Manufacturer, Logistics, Retailer (Python)",
-                        "reasoning": "Queried the global agent registry to discover all available agent endpoints, roles, and capabilities before initiating coordination.",
-                    },
-                    {
-                        "step": 2,
-                        "action": "Supplier Database Scan",
-                        "result": "Scored all 30 suppliers, shortlisted top " + str(len(best_suppliers)) + " based on composite score",
-                        "reasoning": "Ranked suppliers using weighted scoring: Haversine distance from reference location (40%), capability match with required components (30%), reliability rating (20%), cost multiplier (10%).",
-                    },
-                    {
-                        "step": 3,
-                        "action": "Manufacturer Database Scan",
-                        "result": "Scored all 30 manufacturers, shortlisted top " + str(len(best_manufacturers)) + " facilities",
-                        "reasoning": "Evaluated manufacturing facilities by assembly capabilities, geographic proximity to supplier cluster, facility size, certifications, and cost per hour.",
-                    },
-                    {
-                        "step": 4,
-                        "action": "Logistics Provider Discovery",
-                        "result": "Scored all 30 logistics providers, shortlisted top " + str(len(best_logistics)) + " carriers",
-                        "reasoning": "Ranked logistics providers by hub proximity to pickup/delivery points, transport mode coverage, cost per km, average speed, and customs capabilities.",
-                    },
-                    {
-                        "step": 5,
-                        "action": "Intent Decomposition (CrewAI)",
-                        "result": "Decomposed user intent into " + str(len(components)) + " component groups for product: " + str(product_name),
-                        "reasoning": "CrewAI Procurement Agent used GPT-4o-mini to analyze the user's natural language request and identify all required parts, categories, specifications, and estimated costs.",
-                    },
-                ],
-                "trust_verification": [
-                    {
-                        "check": "ISO 9001 Quality Management",
-                        "status": "passed",
-                        "details": "All " + str(len(suppliers_used)) + " selected suppliers verified for ISO 9001 certification. Quality management systems confirmed operational.",
-                    },
-                    {
-                        "check": "IATF 16949 Automotive Standard",
-                        "status": "verified",
-                        "details": "Automotive-grade certification cross-checked for all suppliers providing safety-critical or structural components.",
-                    },
-                    {
-                        "check": "Manufacturer Facility Verification",
-                        "status": "passed",
-                        "details": "Selected manufacturer (" + str(selected_mfg) + ") verified for adequate facility size, assembly capability, and quality control systems.",
-                    },
-                    {
-                        "check": "Logistics Provider Licensing",
-                        "status": "passed",
-                        "details": "Selected logistics provider (" + str(selected_log) + ") verified for transport licensing, cargo insurance, and hazmat certification where applicable.",
-                    },
-                    {
-                        "check": "Reliability Score Threshold",
-                        "status": "passed",
-                        "details": "All selected partners exceed minimum reliability threshold of 0.85 (scale 0-1). Historical performance data validated.",
-                    },
-                    {
-                        "check": "Data Integrity and Agent Authentication",
-                        "status": "passed",
-                        "details": "All agent-to-agent messages authenticated via A2A protocol. Response payloads validated against expected schema.",
-                    },
-                ],
-                "policy_enforcement": [
-                    {
-                        "policy": "Budget Constraint Validation",
-                        "status": "compliant",
-                        "details": "Total procurement cost of $" + f"{total_cost:,.2f}" + " validated. Parts: $" + f"{supplier_cost:,.2f}" + ", Shipping: $" + f"{logistics_cost:,.2f}" + ".",
-                    },
-                    {
-                        "policy": "Jurisdiction Compliance",
-                        "status": "compliant",
-                        "details": "All selected partners operate within approved trade jurisdictions. No sanctioned entities detected. Cross-border compliance verified.",
-                    },
-                    {
-                        "policy": "Quality Standards Enforcement",
-                        "status": "enforced",
-                        "details": "ISO 9001 minimum required for all tier-1 partners. IATF 16949 enforced for automotive-critical components. AS9100 checked for aerospace-adjacent parts.",
-                    },
-                    {
-                        "policy": "Environmental and Regulatory Compliance",
-                        "status": "compliant",
-                        "details": "All partners meet environmental regulatory requirements in their operating regions. REACH/RoHS compliance verified for applicable materials.",
-                    },
-                    {
-                        "policy": "Lead Time Optimization",
-                        "status": "optimized",
-                        "details": "Total timeline of " + str(total_days) + " days optimized by selecting geographically proximate partners. Critical path: procurement (" + str(supplier_lead) + "d) then assembly (" + str(assembly_days) + "d) then shipping (" + str(logistics_days) + "d) then delivery (" + str(delivery_offset) + "d).",
-                    },
-                    {
-                        "policy": "Supply Chain Redundancy",
-                        "status": "noted",
-                        "details": "Primary partners selected from top-scored candidates. " + str(len(best_suppliers)) + " backup suppliers, " + str(len(best_manufacturers)) + " backup manufacturers, and " + str(len(best_logistics)) + " backup logistics providers identified for contingency.",
-                    },
-                ],
-                "message_exchanges": [
-                    {"from": "User", "to": "Procurement Agent", "message": "Submitted procurement request: " + intent_safe, "protocol": "HTTP/JSON"},
-                    {"from": "Procurement Agent", "to": "Agent Registry", "message": "Queried registry for all available agent endpoints, roles, and capabilities", "protocol": "Internal"},
-                    {"from": "Procurement Agent", "to": "Partner Database", "message": "Executed scoring algorithm across 90 partners (30 suppliers + 30 manufacturers + 30 logistics). Weights: distance 40%, capability 30%, reliability 20%, cost 10%", "protocol": "Internal"},
-                    {"from": "Procurement Agent", "to": "Supplier Agent", "message": "A2A Request: Check availability for " + str(len(components)) + " components. Pre-selected " + str(len(best_suppliers)) + " suppliers: " + supplier_names, "protocol": "A2A/HTTP"},
-                    {"from": "Supplier Agent", "to": "Procurement Agent", "message": "A2A Response: Generated " + str(num_quotes) + " component quotes across " + str(len(suppliers_used)) + " suppliers. Total parts cost: $" + f"{supplier_cost:,.2f}", "protocol": "A2A/HTTP"},
-                    {"from": "Procurement Agent", "to": "Supplier Agent", "message": "Trust verification: Requested certification proof for " + str(len(suppliers_used)) + " selected suppliers", "protocol": "A2A/HTTP"},
-                    {"from": "Supplier Agent", "to": "Procurement Agent", "message": "Certifications confirmed: ISO 9001, IATF 16949 where applicable. All suppliers passed verification.", "protocol": "A2A/HTTP"},
-                    {"from": "Procurement Agent", "to": "Manufacturer Agent", "message": "A2A Request: Evaluate assembly capacity for " + str(product_name) + ". Pre-selected " + str(len(best_manufacturers)) + " facilities. Forwarding " + str(num_quotes) + " confirmed parts.", "protocol": "A2A/HTTP"},
-                    {"from": "Manufacturer Agent", "to": "Procurement Agent", "message": "A2A Response: Selected " + str(selected_mfg) + ". Assembly plan created. Facility capacity confirmed.", "protocol": "A2A/HTTP"},
-                    {"from": "Procurement Agent", "to": "Logistics Agent", "message": "A2A Request: Plan routing from supplier locations through " + str(selected_mfg) + " to customer. Pre-selected " + str(len(best_logistics)) + " carriers.", "protocol": "A2A/HTTP"},
-                    {"from": "Logistics Agent", "to": "Procurement Agent", "message": "A2A Response: Selected " + str(selected_log) + ". Optimal route planned. Shipping cost: $" + f"{logistics_cost:,.2f}" + ". Duration: " + str(logistics_days) + " days.", "protocol": "A2A/HTTP"},
-                    {"from": "Procurement Agent", "to": "Retailer Agent", "message": "A2A Request: Create delivery plan for " + str(product_name) + ". Assembly at " + str(selected_mfg) + ", shipping via " + str(selected_log) + ".", "protocol": "A2A/HTTP"},
-                    {"from": "Retailer Agent", "to": "Procurement Agent", "message": "A2A Response: Delivery plan ready. Estimated delivery offset: " + str(delivery_offset) + " days. Packaging, warranty, and support configured.", "protocol": "A2A/HTTP"},
-                    {"from": "Procurement Agent", "to": "User", "message": "Final execution plan compiled. Total cost: $" + f"{total_cost:,.2f}" + ". Timeline: " + str(total_days) + " days. " + str(len(suppliers_used)) + " suppliers, 1 manufacturer, 1 logistics provider, 1 retailer engaged.", "protocol": "HTTP/SSE"},
-                ],
-                "execution_summary": {
-                    "order_sequence": [
-                        "Procurement Agent receives and decomposes user intent using CrewAI + GPT-4o-mini",
-                        "Identified " + str(len(components)) + " required component groups for " + str(product_name),
-                        "Scored and shortlisted " + str(len(best_suppliers)) + " suppliers, " + str(len(best_manufacturers)) + " manufacturers, " + str(len(best_logistics)) + " logistics providers from 90-partner database",
-                        "Supplier Agent evaluated components against " + str(len(best_suppliers)) + " pre-selected suppliers and generated " + str(num_quotes) + " quotes",
-                        "Manufacturer Agent selected " + str(selected_mfg) + " and created detailed assembly plan",
-                        "Logistics Agent selected " + str(selected_log) + " and planned optimal shipping route",
-                        "Retailer Agent finalized delivery plan, packaging, warranty, and customer experience",
-                        "Procurement Agent compiled and delivered final execution plan to user",
-                    ],
-                    "timing": {
-                        "parts_procurement": str(supplier_lead) + " days - sourcing, verification, and supplier coordination",
-                        "manufacturing_assembly": str(assembly_days) + " days - assembly, quality testing, and inspection",
-                        "shipping_transit": str(logistics_days) + " days - transportation from manufacturer to delivery hub",
-                        "final_delivery": str(delivery_offset) + " days - last-mile delivery and customer handoff",
-                        "total": str(total_days) + " days end-to-end",
-                    },
-                    "routing": "Parts sourced from " + str(len(suppliers_used)) + " suppliers across multiple locations. Consolidated and assembled at " + str(selected_mfg) + ". Shipped via " + str(selected_log) + " to delivery hub. Last-mile delivery to customer.",
-                    "cost_breakdown": {
-                        "parts_and_materials": "$" + f"{supplier_cost:,.2f}",
-                        "shipping_and_logistics": "$" + f"{logistics_cost:,.2f}",
-                        "total_procurement_cost": "$" + f"{total_cost:,.2f}",
-                        "retail_margin": (f"{safe_num(retailer_response.get('margin_percentage'), 25):.0f}%") if retail_price else "TBD",
-                        "estimated_retail_price": ("$" + f"{retail_price:,.2f}") if retail_price else "TBD by retailer",
-                    },
-                },
-                "selection_criteria": [
-                    "Geographic proximity (Haversine distance from reference location)",
-                    "Capability/specialization match with required components",
-                    "Reliability score (historical performance rating)",
-                    "Cost efficiency (cost multiplier vs. baseline)",
-                    "Lead time optimization (shortest critical path)",
-                    "Certification compliance (ISO 9001, IATF 16949, AS9100)",
-                ],
-            }
-            print(f"[DEBUG] Coordination report built OK — {len(json.dumps(coordination_report))} bytes")
-        except Exception as e:
-            print(f"[ERROR] Failed to build coordination report: {e}")
-            import traceback; traceback.print_exc()
-            coordination_report = {
-                "agents_involved": 5,
-                "total_partners_evaluated": {"suppliers": 30, "manufacturers": 30, "logistics_providers": 30},
-                "partners_shortlisted": {"suppliers": len(best_suppliers), "manufacturers": len(best_manufacturers), "logistics_providers": len(best_logistics)},
-                "discovery_paths": [{"step": 1, "action": "Error building detailed report", "result": str(e), "reasoning": "Fallback report used"}],
-                "trust_verification": [{"check": "Report generation", "status": "error", "details": str(e)}],
-                "policy_enforcement": [{"policy": "Report generation", "status": "error", "details": str(e)}],
-                "message_exchanges": [{"from": "System", "to": "User", "message": "Report generation encountered an error: " + str(e), "protocol": "Internal"}],
-                "execution_summary": {"order_sequence": ["Error generating detailed summary"], "timing": {"total": str(total_days) + " days"}, "routing": "N/A", "cost_breakdown": {"total_procurement_cost": "$" + f"{total_cost:,.2f}"}},
-                "selection_criteria": [],
-            }
-
-        # ── Match selected partners to their actual database details ──
-        def find_matching_summary(summaries, selected_name, fallback_index=0):
-            """Find the summary that matches the AI's selected partner by name."""
-            if not summaries:
-                return {}
-            selected_lower = (selected_name or "").lower().strip()
-            for s in summaries:
-                if selected_lower and selected_lower in s.get("name", "").lower():
-                    return s
-                if selected_lower and s.get("name", "").lower() in selected_lower:
-                    return s
-            return summaries[fallback_index] if summaries else {}
-
-        matched_mfg_summary = find_matching_summary(manufacturer_summaries, selected_mfg)
-        matched_log_summary = find_matching_summary(logistics_summaries, selected_log)
-
-        execution_plan = {
-            "project_id": project_id,
-            "product": product_name,
-            "intent": intent,
-            "status": "completed",
-            "components": components,  # Always include full component list from procurement agent
-            "suppliers": {
-                "selected": suppliers_used,
-                "selected_details": supplier_summaries,
-                "component_count": max(num_quotes, len(components)),
-                "quote_count": num_quotes,
-                "total_parts_cost_usd": supplier_cost,
-                "quotes": supplier_response.get("quotes", []),
-            },
-            "manufacturer": {
-                "selected": selected_mfg,
-                "selected_details": matched_mfg_summary,
-                "assembly_plan": manufacturer_response.get("assembly_plan", {}),
-                "can_assemble": manufacturer_response.get("can_assemble", False),
-                "selection_rationale": manufacturer_response.get("selection_rationale", ""),
-            },
-            "logistics": {
-                "selected": selected_log,
-                "selected_details": matched_log_summary,
-                "route": logistics_response.get("routes", [{}])[0] if logistics_response.get("routes") else {},
-                "recommended": logistics_response.get("recommended_route", ""),
-                "shipping_cost_usd": logistics_cost,
-                "selection_rationale": logistics_response.get("selection_rationale", ""),
-            },
-            "retailer": {
-                "selected": "retailer_direct",
-                "delivery_plan": retailer_response.get("delivery_plan", {}),
-                "customer_experience": retailer_response.get("customer_experience", {}),
-                "retail_price_usd": retail_price,
-            },
-            "timeline": {
-                "parts_procurement_days": supplier_lead,
-                "assembly_days": assembly_days,
-                "shipping_days": logistics_days,
-                "delivery_days": delivery_offset,
-                "total_days": total_days,
-            },
-            "cost_summary": {
-                "parts_cost_usd": supplier_cost,
-                "shipping_cost_usd": logistics_cost,
-                "total_cost_usd": total_cost,
-                "retail_price_usd": retail_price,
-            },
-            "coordination_report": coordination_report,
-        }
+# ═══════════════════════════════════════════
+# Project history
+# ═══════════════════════════════════════════
 
-        yield sse_event(log_entry(
-            "procurement_main", "Procurement Agent", "plan_complete",
-            "Execution plan complete. Total cost: $" + f"{total_cost:,.2f}" + ". Timeline: " + str(total_days) + " days.",
-            phase="decision",
-        ))
-        await asyncio.sleep(0.3)
+@app.get("/api/projects")
+async def list_projects(limit: int = 20, before: float = None):
+    projects = await asyncio.to_thread(project_store.recent, limit, before)
+    return {"projects": projects}
+
+
+@app.get("/api/projects/{project_id}")
+async def get_project(project_id: str, view: str = "full", fields: str = None):
+    """The stored project; ?view=summary references large plan sections, ?fields=a,b.c selects paths."""
+    project = await asyncio.to_thread(project_store.get, project_id)
+    if project is None:
+        return JSONResponse({"error": f"Unknown project {project_id}"}, status_code=404)
+    if project["plan"] is not None:
+        project["plan"] = project_plan(project["plan"], parse_view(view), parse_fields(fields))
+    return project
+
+
+def _live_plan(project_id: str):
+    """The plan a retained job has already emitted, before (or instead of) reading the store."""
+    job = job_queue.get(project_id)
+    for chunk in reversed(job.chunks if job is not None else []):
+        if getattr(chunk, "kind", None) == "plan":
+            return chunk.data
+    return None
+
+
+async def _find_plan(project_id: str):
+    plan = _live_plan(project_id)
+    if plan is None:
+        project = await asyncio.to_thread(project_store.get, project_id)
+        plan = project["plan"] if project is not None else None
+    return plan
+
+
+@app.get("/api/projects/{project_id}/plan/{section:path}")
+async def get_plan_section(project_id: str, section: str):
+    """One plan section by path (e.g. suppliers/quotes) — the target of a summary view's $ref."""
+    plan = await _find_plan(project_id)
+    if plan is None:
+        return JSONResponse({"error": f"No plan for {project_id}"}, status_code=404)
+    found, value = get_path(plan, section.strip("/").replace("/", "."))
+    if not found:
+        return JSONResponse({"error": f"Unknown plan section {section}"}, status_code=404)
+    return {"project_id": project_id, "section": section.strip("/"), "data": value}
+
+
+@app.get("/api/projects/{project_id}/report")
+async def get_report(project_id: str):
+    """The coordination report, rendered from the plan's facts on first request and cached."""
+    plan = await _find_plan(project_id)
+    if plan is None:
+        return JSONResponse({"error": f"No plan for {project_id}"}, status_code=404)
+    report = plan.get("coordination_report")
+    if isinstance(report, dict) and "$ref" not in report:
+        return report  # stored before reports were rendered lazily
+    if not plan.get("report_facts"):
+        return JSONResponse({"error": f"No report facts for {project_id}"}, status_code=404)
+    return report_cache.get(project_id, plan["report_facts"])
+
+
+@app.post("/api/projects/{project_id}/replan")
+async def replan_project(project_id: str, request: Request):
+    """
+    What-if re-plan: {"constraints": {"transport_mode": "sea", "exclude_suppliers": ["X"]}}.
+    Only the phases a changed constraint invalidates are re-run; the answer is a new
+    project whose plan is given as a JSON Patch against this one.
+    """
+    try:
+        body = await request.json()
+    except Exception as e:
+        return JSONResponse({"error": "Invalid JSON", "details": str(e)}, status_code=400)
+    request_priority.set(parse_priority(body.get("priority", "interactive")))
+    try:
+        return await replan(project_id, body.get("constraints"))
+    except ReplanError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status)
 
-        # Send coordination report as separate event first (for reliability)
-        yield sse_event({"type": "report", "data": coordination_report})
-        await asyncio.sleep(0.1)
 
-        # Send full plan
-        try:
-            plan_json = json.dumps({"type": "plan", "data": execution_plan})
-            print(f"[DEBUG] Plan JSON size: {len(plan_json)} bytes")
-            yield f"data: {plan_json}\n\n"
-        except Exception as e:
-            print(f"[ERROR] Failed to serialize plan: {e}")
-            # Fallback: send plan without coordination_report to reduce size
-            execution_plan["coordination_report"] = {}
-            yield sse_event({"type": "plan", "data": execution_plan})
+@app.get("/api/projects/{project_id}/job")
+def get_job(project_id: str):
+    job = job_queue.get(project_id)
+    if job is None:
+        return JSONResponse({"error": f"No active job for {project_id}"}, status_code=404)
+    return {**job.info(), "queue_position": job_queue.position(job)}
 
-        await asyncio.sleep(0.1)
-        yield sse_event({"type": "complete"})
 
-    return StreamingResponse(orchestrate(), media_type="text/event-stream")
+def last_event_id(request: Request, after: int) -> int:
+    """Resume point: the Last-Event-ID header (set by EventSource on reconnect) or ?after=."""
+    header = request.headers.get("last-event-id")
+    try:
+        return int(header) if header is not None else after
+    except ValueError:
+        return after
+
+
+@app.get("/api/projects/{project_id}/events")
+async def replay_project(project_id: str, request: Request, pace: float = 0.0, after: int = -1, compress: str = None,
+                         view: str = "full", fields: str = None):
+    """
+    Follow a run as SSE. Queued/running (and recently finished) jobs stream from their
+    live buffer; older runs replay from the store, pace > 0 reproducing the original timing.
+    """
+    after = last_event_id(request, after)
+    encoding = negotiate(request.headers.get("accept-encoding"), compress)
+    view, fields = parse_view(view), parse_fields(fields)
+    job = job_queue.get(project_id)
+    if job is not None:
+        events = job.follow(after, transform=stream_projection(view, fields))
+        stream = compressed(events, encoding) if encoding else events
+        return StreamingResponse(stream, media_type="text/event-stream", headers=stream_headers(encoding))
+
+    events = await asyncio.to_thread(project_store.events, project_id, after)
+    if not events:
+        project = await asyncio.to_thread(project_store.get, project_id)
+        if project is None:
+            return JSONResponse({"error": f"Unknown project {project_id}"}, status_code=404)
+
+    transform = replay_projection(view, fields)
+
+    async def replay():
+        previous = events[0][1] if events else 0.0
+        for seq, elapsed, event_type, payload in events:
+            if pace > 0 and elapsed > previous:
+                await asyncio.sleep(min((elapsed - previous) * pace, MAX_REPLAY_GAP_S))
+            previous = elapsed
+            if transform is not None:
+                payload = transform(event_type, payload)
+                if payload is None:
+                    continue
+            yield b"id: %d\ndata: " % seq + payload + b"\n\n"
+
+    stream = compressed(replay(), encoding) if encoding else replay()
+    return StreamingResponse(stream, media_type="text/event-stream", headers=stream_headers(encoding))
 
 
 if __name__ == "__main__":
@@ -792,6 +471,7 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", "8000"))
     print(f"\n⚡ One Click AI — Supply Chain Agent Backend")
     print(f"  Agents registered: {len(list_agents())}")
+    print(f"  LLM provider: {os.getenv('LLM_PROVIDER', 'openai')} ({os.getenv('LLM_MODEL', 'gpt-4o-mini')})")
     print(f"  OpenAI key: {'✓ set' if os.getenv('OPENAI_API_KEY') else '✗ missing'}")
     print(f"  Port: {port}")
     print()
@@ -0,0 +1,861 @@
+"""
+Orchestration — the run_project pipeline as a DAG of phase nodes.
+intent → selection → supplier → manufacturer ⇢ logistics → pricing → retailer → report.
+Nodes stream their log events through the run's queue as they go; the executor starts
+each node once its inputs are done and records the timings that end up in the plan.
+"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime
+
+from agents import (
+    SupplierPipeline,
+    supplier_check_availability,
+    manufacturer_check_capacity,
+    logistics_plan_route,
+    retailer_plan_delivery,
+)
+from dag import Dag, Node
+from encoding import sse_event
+from intent_cache import intent_cache
+from procurement import analyze_intent, analyze_intent_streaming
+import retail
+from report import report_facts, report_url
+from resilience import call_cancelled
+from selector import (
+    select_suppliers,
+    select_manufacturers,
+    select_logistics,
+    format_supplier_summary,
+    format_manufacturer_summary,
+    format_logistics_summary,
+)
+from usage import usage_ledger, current_phase
+
+# Start logistics/retailer from the top-scored manufacturer while the Manufacturer
+# Agent runs; per-request override with {"speculative": false}
+SPECULATIVE_EXECUTION = os.getenv("SPECULATIVE_EXECUTION", "1") != "0"
+
+
+# Start supplier batches while intent analysis is still streaming components
+INTENT_PIPELINE = os.getenv("INTENT_PIPELINE", "1") != "0"
+
+
+# Default reference location (central EU — used for distance scoring)
+DEFAULT_REF_X = 48.85  # Paris lat
+DEFAULT_REF_Y = 2.35   # Paris lon
+
+
+# ═══════════════════════════════════════════
+# Utility
+# ═══════════════════════════════════════════
+
+def log_entry(agent_id, agent_name, event, details="", data=None, phase=""):
+    entry = {
+        "type": "log",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "agent_id": agent_id,
+        "agent_name": agent_name,
+        "event": event,
+        "details": details,
+        "phase": phase,
+    }
+    if data:
+        entry["data"] = data
+    return entry
+
+
+def safe_num(v, default=0):
+    try:
+        return float(v) if v else default
+    except (ValueError, TypeError):
+        return default
+
+
+def names_match(a, b):
+    """Loose partner-name comparison (the agents paraphrase names)."""
+    a = (a or "").lower().strip()
+    b = (b or "").lower().strip()
+    return bool(a and b) and (a in b or b in a)
+
+
+def component_specs_for(components):
+    """Lowercase names and categories used to match partners to components."""
+    specs = []
+    for c in components:
+        if isinstance(c, dict):
+            specs.extend([c.get("name", "").lower(), c.get("category", "").lower()])
+        elif isinstance(c, str):
+            specs.append(c.lower())
+    return specs
+
+
+def pick_suppliers(components):
+    # 3-8 suppliers based on component diversity
+    supplier_count = min(max(len(components), 3), 8)
+    return select_suppliers(component_specs_for(components), DEFAULT_REF_X, DEFAULT_REF_Y, top_n=supplier_count)
+
+
+# Partner shortlists as the selection node stores them: (partners key, summaries key, formatter)
+SHORTLISTS = {
+    "suppliers": ("best_suppliers", "supplier_summaries", format_supplier_summary),
+    "manufacturers": ("best_manufacturers", "manufacturer_summaries", format_manufacturer_summary),
+    "logistics": ("best_logistics", "logistics_summaries", format_logistics_summary),
+}
+
+# Run constraints (set on what-if re-plans) and the first phase each one changes
+CONSTRAINT_PHASES = {
+    "exclude_suppliers": "supplier",
+    "exclude_manufacturers": "manufacturer",
+    "exclude_logistics": "logistics",
+    "transport_mode": "logistics",
+}
+TRANSPORT_MODES = ("ground", "rail", "sea", "air", "barge")
+
+
+class ConstraintError(RuntimeError):
+    """A run constraint the agents' answers could not be made to satisfy."""
+
+
+def shortlist(run, selection, kind, pickup=None):
+    """
+    (partners, summaries) of one selection shortlist after the run's constraints.
+    `pickup` (lat, lon) is where logistics collects the goods, used when re-scoring for a transport mode.
+    """
+    partners_key, summaries_key, summarize = SHORTLISTS[kind]
+    partners, summaries = selection[partners_key], selection[summaries_key]
+    excluded = run.constraints.get(f"exclude_{kind}") or []
+    mode = run.constraints.get("transport_mode") if kind == "logistics" else None
+    if not excluded and not mode:
+        return partners, summaries
+    if mode:
+        # Re-scored for the mode (providers without it score 0 and drop out)
+        pickup_x, pickup_y = pickup or (DEFAULT_REF_X, DEFAULT_REF_Y)
+        partners = select_logistics(pickup_x, pickup_y, DEFAULT_REF_X, DEFAULT_REF_Y,
+                                    required_mode=mode, top_n=max(len(partners), 2) + len(excluded))
+    kept = [p for p in partners
+            if not any(names_match(p["name"], name) or p.get("id") == name for name in excluded)]
+    if mode:
+        kept = kept[:max(len(selection[partners_key]), 2)]
+    # Never leave a phase without partners: fall back to the unconstrained shortlist
+    if not kept:
+        print(f"[Replan] Constraints leave no {kind} — keeping the original shortlist")
+        return selection[partners_key], selection[summaries_key]
+    return kept, [summarize(p) for p in kept]
+
+
+def route_for_mode(response, mode):
+    """The first route in a logistics response that travels by `mode` (any route when no mode is required)."""
+    routes = [r for r in response.get("routes") or [] if isinstance(r, dict)]
+    if not mode:
+        return routes[0] if routes else {}
+    return next((r for r in routes if mode in str(r.get("mode", "")).lower()), None)
+
+
+def find_matching_summary(summaries, selected_name, fallback_index=0):
+    """Find the summary that matches the AI's selected partner by name."""
+    if not summaries:
+        return {}
+    selected_lower = (selected_name or "").lower().strip()
+    for s in summaries:
+        if selected_lower and selected_lower in s.get("name", "").lower():
+            return s
+        if selected_lower and s.get("name", "").lower() in selected_lower:
+            return s
+    return summaries[fallback_index] if summaries else {}
+
+
+async def call_agent(agent_id, fn, *args, cancel=None):
+    """`cancel` (a threading.Event) lets the caller abandon the call before it reaches the provider."""
+    def call():
+        if cancel is not None:
+            call_cancelled.set(cancel)
+        return fn(*args)
+
+    try:
+        return await asyncio.to_thread(call)
+    except Exception as e:
+        return {"agent_id": agent_id, "status": "error", "error": str(e)}
+
+
+class Run:
+    """Per-run context shared by the nodes: request options, pacing and the event queue."""
+
+    def __init__(self, project_id, intent, pacer, speculative=SPECULATIVE_EXECUTION, intent_backend=None,
+                 stream_suppliers=INTENT_PIPELINE, enrich_retail=retail.RETAIL_ENRICHMENT, constraints=None):
+        self.project_id = project_id
+        self.intent = intent
+        self.pacer = pacer
+        self.speculative = speculative
+        self.intent_backend = intent_backend
+        self.stream_suppliers = stream_suppliers
+        self.enrich_retail = enrich_retail
+        self.constraints = constraints or {}
+        self.events = asyncio.Queue()
+        self.enrichment_task = None
+        self.dag = None
+
+    def log(self, *args, **kwargs):
+        self.events.put_nowait(sse_event(log_entry(*args, **kwargs)))
+
+    async def pause(self, seconds):
+        await self.pacer.pause(seconds)
+
+
+# ═══════════════════════════════════════════
+# Nodes
+# ═══════════════════════════════════════════
+
+async def intent_node(run, inputs):
+    """Procurement Agent: decompose the intent into components (cache → streaming analysis → fallback)."""
+    intent = run.intent
+    run.log(
+        "procurement_main", "Procurement Agent", "analyzing_intent",
+        "CrewAI agent analyzing request and identifying all required components...",
+        phase="analysis",
+    )
+    await run.pause(0.1)
+
+    components_data, intent_cache_info = intent_cache.lookup(intent)
+    # Suppliers start quoting each batch of components as the analysis streams it
+    pipeline = None
+    if components_data is not None:
+        run.log(
+            "procurement_main", "Procurement Agent", "intent_cache_hit",
+            f"Reusing component analysis from a previous request ({intent_cache_info['match'].replace('_', '-')} match, "
+            f"similarity {intent_cache_info['similarity']:.2f}): \"{intent_cache_info['matched_intent'][:80]}\"",
+            data=intent_cache_info,
+            phase="analysis",
+        )
+    else:
+        try:
+            if run.stream_suppliers:
+                pipeline = SupplierPipeline(run.project_id, intent, pick_suppliers)
+                components_data = await asyncio.to_thread(analyze_intent_streaming, intent, pipeline.add, run.intent_backend)
+            else:
+                components_data = await asyncio.to_thread(analyze_intent, intent, run.intent_backend)
+            if not str(components_data.get("notes", "")).startswith("Fallback"):
+                intent_cache.store(intent, components_data)
+        except Exception as e:
+            if pipeline is not None:
+                pipeline.cancel()
+                pipeline = None
+            run.log(
+                "procurement_main", "Procurement Agent", "analysis_error",
+                f"CrewAI analysis failed: {str(e)[:100]}. Using fallback.",
+                phase="analysis",
+            )
+            components_data = {
+                "product": intent,
+                "product_category": "general",
+                "components": [{"name": "Primary component", "category": "general", "specifications": "As requested", "estimated_quantity": 1, "priority": "critical", "estimated_unit_cost_usd": 0}],
+                "assembly_complexity": "medium",
+            }
+
+    product_name = components_data.get("product", intent)
+    components = components_data.get("components", [])
+
+    run.log(
+        "procurement_main", "Procurement Agent", "components_identified",
+        f"Identified {len(components)} component groups for: {product_name}",
+        data={"product": product_name, "component_count": len(components), "components": components},
+        phase="analysis",
+    )
+    if pipeline is not None and pipeline.dispatched_early:
+        run.log(
+            "procurement_main", "Procurement Agent", "supplier_batches_pipelined",
+            f"{pipeline.dispatched_early} supplier quote batches were already dispatched while the analysis was streaming",
+            data={"batch_sizes": [len(b) for b in pipeline.batches]},
+            phase="analysis",
+        )
+    await run.pause(0.5)
+
+    return {
+        "product_name": product_name,
+        "components": components,
+        "product_category": components_data.get("product_category", "general"),
+        "assembly_complexity": components_data.get("assembly_complexity", "medium"),
+        "intent_cache": intent_cache_info,
+        "pipeline": pipeline,
+    }
+
+
+async def selection_node(run, inputs):
+    """Registry discovery: score and shortlist suppliers, manufacturers and logistics providers."""
+    components = inputs["intent"]["components"]
+    run.log(
+        "procurement_main", "Procurement Agent", "querying_registry",
+        "Querying agent registry and partner databases (30 suppliers, 30 manufacturers, 30 logistics providers)...",
+        phase="discovery",
+    )
+    await run.pause(0.3)
+
+    # Dynamic partner count based on complexity
+    num_components = len(components)
+    manufacturer_count = min(max(num_components // 2, 2), 5)  # 2-5 manufacturers
+    logistics_count = min(max(num_components // 3, 2), 4)     # 2-4 logistics providers
+
+    # Build capability keywords from components for manufacturer matching
+    mfg_keywords = ["assembly", "production"]
+    for c in components:
+        if isinstance(c, dict):
+            cat = c.get("category", "").lower()
+            name = c.get("name", "").lower()
+            if cat: mfg_keywords.append(cat)
+            # Add relevant keywords
+            for kw in ["electronics", "mechanical", "automotive", "metal", "chemical", "textile", "precision", "machining", "injection", "welding"]:
+                if kw in name or kw in cat:
+                    mfg_keywords.append(kw)
+
+    # Smart selection from database
+    best_suppliers = pick_suppliers(components)
+    best_manufacturers = select_manufacturers(
+        mfg_keywords,
+        DEFAULT_REF_X, DEFAULT_REF_Y, top_n=manufacturer_count
+    )
+    best_logistics = select_logistics(DEFAULT_REF_X, DEFAULT_REF_Y, DEFAULT_REF_X, DEFAULT_REF_Y, top_n=logistics_count)
+
+    run.log(
+        "procurement_main", "Procurement Agent", "partners_selected",
+        f"Selected top {len(best_suppliers)} suppliers, {len(best_manufacturers)} manufacturers, {len(best_logistics)} logistics providers based on distance, cost, and reliability scoring",
+        data={
+            "selected_suppliers": [{"name": s["name"], "location": f"{s['city']}, {s['country']}", "score": s["_score"]} for s in best_suppliers],
+            "selected_manufacturers": [{"name": m["name"], "location": f"{m['city']}, {m['country']}", "score": m["_score"]} for m in best_manufacturers],
+            "selected_logistics": [{"name": l["name"], "hub": f"{l['city']}, {l['country']}", "score": l["_score"]} for l in best_logistics],
+        },
+        phase="discovery",
+    )
+    await run.pause(0.3)
+
+    return {
+        "best_suppliers": best_suppliers,
+        "best_manufacturers": best_manufacturers,
+        "best_logistics": best_logistics,
+        "supplier_summaries": [format_supplier_summary(s) for s in best_suppliers],
+        "manufacturer_summaries": [format_manufacturer_summary(m) for m in best_manufacturers],
+        "logistics_summaries": [format_logistics_summary(l) for l in best_logistics],
+    }
+
+
+def fallback_quotes(components, best_suppliers):
+    """Synthetic quotes from the procurement estimates when the Supplier Agent returned none."""
+    quotes = []
+    suppliers = set()
+    for idx, c in enumerate(components):
+        cname = c.get("name", f"Component {idx+1}") if isinstance(c, dict) else str(c)
+        cat = c.get("category", "general") if isinstance(c, dict) else "general"
+        est_cost = float(c.get("estimated_unit_cost_usd", 0)) if isinstance(c, dict) else 0
+        est_qty = int(c.get("estimated_quantity", 1)) if isinstance(c, dict) else 1
+        # Assign to a supplier from the pre-selected list (round-robin)
+        assigned = best_suppliers[idx % len(best_suppliers)] if best_suppliers else {}
+        sname = assigned.get("name", "Unassigned")
+        sloc = f"{assigned.get('city', '?')}, {assigned.get('country', '?')}"
+        lead = assigned.get("lead_time_days", 14)
+        suppliers.add(sname)
+        quotes.append({
+            "component_name": cname,
+            "assigned_supplier": sname,
+            "supplier_location": sloc,
+            "available": True,
+            "description": c.get("specifications", f"{cname} — {cat}") if isinstance(c, dict) else cname,
+            "specifications": cat,
+            "unit_cost_usd": est_cost if est_cost > 0 else 50.0,
+            "quantity": est_qty,
+            "total_line_cost": (est_cost if est_cost > 0 else 50.0) * est_qty,
+            "lead_time_days": lead,
+            "constraints": [],
+            "supplier_notes": "Fallback quote — supplier agent did not return data for this component",
+        })
+    return quotes, list(suppliers)
+
+
+def verified_supplier_cost(supplier_response):
+    """Supplier cost: use AI total, but verify against individual quotes."""
+    ai_supplier_total = safe_num(supplier_response.get("total_estimated_cost"))
+    computed_from_quotes = 0
+    for q in supplier_response.get("quotes", []):
+        line_cost = safe_num(q.get("total_line_cost", 0))
+        if line_cost > 0:
+            computed_from_quotes += line_cost
+        else:
+            unit = safe_num(q.get("unit_cost_usd", 0))
+            qty = safe_num(q.get("quantity", q.get("quantity_available", 1)))
+            if qty < 1:
+                qty = 1
+            computed_from_quotes += unit * qty
+
+    if ai_supplier_total < 50 and computed_from_quotes > 50:
+        print(f"[DEBUG] Supplier cost corrected: AI said ${ai_supplier_total:.2f}, computed ${computed_from_quotes:.2f}")
+        return computed_from_quotes
+    if computed_from_quotes > ai_supplier_total * 1.5:
+        return computed_from_quotes
+    return max(ai_supplier_total, computed_from_quotes)
+
+
+async def supplier_node(run, inputs):
+    """Supplier Agent: quotes for every component from the shortlisted suppliers."""
+    analysis, selection = inputs["intent"], inputs["selection"]
+    components, product_name = analysis["components"], analysis["product_name"]
+    best_suppliers, _ = shortlist(run, selection, "suppliers")
+    pipeline = analysis["pipeline"]
+
+    run.log(
+        "procurement_main", "Procurement Agent", "contacting_supplier",
+        f"Sending A2A availability request to Supplier Agent with {len(best_suppliers)} pre-selected suppliers...",
+        data={"message_type": "A2A_REQUEST", "to": "supplier_alpha"},
+        phase="supplier_coordination",
+    )
+    await run.pause(0.2)
+
+    run.log(
+        "supplier_alpha", "Supplier Agent", "processing_request",
+        f"Evaluating {len(components)} components against {len(best_suppliers)} suppliers: {', '.join(s['name'] for s in best_suppliers)}",
+        phase="supplier_coordination",
+    )
+
+    try:
+        if pipeline is not None:
+            supplier_response = await asyncio.to_thread(pipeline.finish, product_name, best_suppliers, components)
+        else:
+            supplier_response = await asyncio.to_thread(
+                supplier_check_availability, run.project_id, components, product_name, best_suppliers
+            )
+    except Exception as e:
+        print(f"[ERROR] Supplier agent call failed: {str(e)[:200]}")
+        supplier_response = {"agent_id": "supplier_alpha", "status": "error", "error": str(e), "quotes": []}
+
+    num_quotes = len(supplier_response.get("quotes", []))
+    suppliers_used = supplier_response.get("suppliers_used", [])
+    print(f"[DEBUG] Supplier response: {num_quotes} quotes, {len(suppliers_used)} suppliers used, total_cost={supplier_response.get('total_estimated_cost', 'N/A')}")
+
+    # ── Fallback: if supplier returned 0 quotes, build synthetic quotes from procurement data ──
+    if num_quotes == 0 and len(components) > 0:
+        print(f"[WARN] Supplier agent returned 0 quotes for {len(components)} components. Building fallback quotes from procurement data...")
+        quotes, suppliers_used = fallback_quotes(components, best_suppliers)
+        supplier_response["quotes"] = quotes
+        supplier_response["suppliers_used"] = suppliers_used
+        supplier_response["total_estimated_cost"] = sum(q["total_line_cost"] for q in quotes)
+        supplier_response["status"] = "fallback_quotes_generated"
+        num_quotes = len(quotes)
+        print(f"[INFO] Built {num_quotes} fallback quotes, total=${supplier_response['total_estimated_cost']:,.2f}")
+
+    cost_display = ""
+    if isinstance(supplier_response.get('total_estimated_cost'), (int, float)):
+        cost_display = f". Total: ${supplier_response['total_estimated_cost']:,.2f}"
+
+    run.log(
+        "supplier_alpha", "Supplier Agent", "quotes_generated",
+        f"Generated {num_quotes} component quotes across {len(suppliers_used)} suppliers{cost_display}",
+        data={"message_type": "A2A_RESPONSE", "response": supplier_response},
+        phase="supplier_coordination",
+    )
+    await run.pause(0.3)
+
+    # Trust verification
+    run.log(
+        "procurement_main", "Procurement Agent", "verifying_supplier",
+        f"Verifying supplier certifications and policy compliance for {len(suppliers_used)} selected partners...",
+        data={"trust_check": "passed", "verified_suppliers": suppliers_used},
+        phase="verification",
+    )
+    await run.pause(0.3)
+
+    return {
+        "response": supplier_response,
+        "quotes": supplier_response.get("quotes", []),
+        "suppliers_used": suppliers_used,
+        "num_quotes": num_quotes,
+        "supplier_cost": verified_supplier_cost(supplier_response),
+    }
+
+
+async def manufacturer_node(run, inputs):
+    """Manufacturer Agent: pick a facility and an assembly plan for the quoted parts."""
+    analysis, selection, supplier = inputs["intent"], inputs["selection"], inputs["supplier"]
+    best_manufacturers, _ = shortlist(run, selection, "manufacturers")
+
+    run.log(
+        "procurement_main", "Procurement Agent", "contacting_manufacturer",
+        f"Sending A2A assembly request to Manufacturer Agent with {len(best_manufacturers)} pre-selected facilities...",
+        data={"message_type": "A2A_REQUEST", "to": "manufacturer_prime"},
+        phase="manufacturer_coordination",
+    )
+    await run.pause(0.2)
+
+    run.log(
+        "manufacturer_prime", "Manufacturer Agent", "evaluating_capacity",
+        f"Evaluating {len(best_manufacturers)} facilities: {', '.join(m['name'] for m in best_manufacturers)}",
+        phase="manufacturer_coordination",
+    )
+
+    manufacturer_response = await call_agent(
+        "manufacturer_prime", manufacturer_check_capacity, run.project_id, analysis["components"],
+        supplier["response"], analysis["product_name"], best_manufacturers
+    )
+
+    selected_mfg = manufacturer_response.get("selected_manufacturer", "N/A")
+    run.log(
+        "manufacturer_prime", "Manufacturer Agent", "assembly_plan_ready",
+        f"Selected: {selected_mfg}. Assembly time: {manufacturer_response.get('assembly_plan', {}).get('total_assembly_time_days', 'N/A')} days",
+        data={"message_type": "A2A_RESPONSE", "response": manufacturer_response},
+        phase="manufacturer_coordination",
+    )
+    await run.pause(0.3)
+
+    return {
+        "response": manufacturer_response,
+        "selected": selected_mfg,
+        "location": manufacturer_response.get("manufacturer_location", "EU"),
+    }
+
+
+async def logistics_node(run, inputs):
+    """
+    Logistics Agent. Routing only needs the manufacturer's location, so with speculation
+    on it starts from the top-scored shortlist entry while the Manufacturer Agent runs
+    and is redone only if the agent picks someone else.
+    """
+    analysis, selection, supplier = inputs["intent"], inputs["selection"], inputs["supplier"]
+    mode = run.constraints.get("transport_mode")
+    delivery_info = {"destination": "Customer location", "product_type": analysis["product_name"]}
+    if mode:
+        delivery_info["required_transport_mode"] = mode
+    best_manufacturers, _ = shortlist(run, selection, "manufacturers")
+
+    def plan_logistics(mfg_name, mfg_location, cancel=None, delivery=delivery_info):
+        """(task, shortlist) — the shortlist is re-scored from the manufacturer's site under a mode constraint."""
+        mfg = next((m for m in best_manufacturers if names_match(m["name"], mfg_name)), None)
+        partners = shortlist(run, selection, "logistics", pickup=(mfg["x"], mfg["y"]) if mfg else None)
+        pickup_info = {
+            "suppliers": supplier["suppliers_used"],
+            "manufacturer": mfg_name,
+            "manufacturer_location": mfg_location,
+        }
+        return asyncio.create_task(call_agent(
+            "logistics_global", logistics_plan_route, run.project_id, pickup_info, delivery,
+            analysis["product_name"], partners[0], cancel=cancel
+        )), partners
+
+    guess = best_manufacturers[0] if run.speculative and best_manufacturers else None
+    if guess:
+        # Cancelling the task does not stop its worker thread; the event stops it before the provider call
+        speculation_cancel = threading.Event()
+        logistics_task, logistics_shortlist = plan_logistics(guess["name"], f"{guess['city']}, {guess['country']}", speculation_cancel)
+        run.log(
+            "procurement_main", "Procurement Agent", "speculative_dispatch",
+            f"Speculatively dispatching the Logistics Agent with top-scored manufacturer {guess['name']} while the Manufacturer Agent evaluates",
+            data={"speculative_manufacturer": guess["name"]},
+            phase="manufacturer_coordination",
+        )
+
+    manufacturer = await run.dag.result("manufacturer")
+    speculation = None
+    if guess:
+        # A failed Manufacturer Agent names no one ("N/A"); the guess is still the best-scored option
+        failed = manufacturer["response"].get("status") == "error" or manufacturer["selected"] in ("N/A", "", None)
+        hit = failed or names_match(manufacturer["selected"], guess["name"])
+        speculation = {"guessed_manufacturer": guess["name"], "selected_manufacturer": manufacturer["selected"], "hit": hit}
+        if failed:
+            speculation["manufacturer_failed"] = True
+        if not hit:
+            # Wrong guess: only the location-dependent phases are redone
+            speculation_cancel.set()
+            logistics_task.cancel()
+            logistics_task, logistics_shortlist = plan_logistics(manufacturer["selected"], manufacturer["location"])
+        run.log(
+            "procurement_main", "Procurement Agent", "speculation_confirmed" if hit else "speculation_missed",
+            f"Speculative logistics plan for {guess['name']} " + ("kept" if hit else f"discarded — re-planning from {manufacturer['selected']}"),
+            data=speculation,
+            phase="logistics_coordination",
+        )
+    else:
+        logistics_task, logistics_shortlist = plan_logistics(manufacturer["selected"], manufacturer["location"])
+    best_logistics = logistics_shortlist[0]
+
+    run.log(
+        "procurement_main", "Procurement Agent", "contacting_logistics",
+        f"Sending A2A routing request to Logistics Agent with {len(best_logistics)} pre-selected providers...",
+        data={"message_type": "A2A_REQUEST", "to": "logistics_global"},
+        phase="logistics_coordination",
+    )
+    await run.pause(0.2)
+
+    run.log(
+        "logistics_global", "Logistics Provider Agent", "planning_route",
+        f"Evaluating {len(best_logistics)} providers: {', '.join(l['name'] for l in best_logistics)}",
+        phase="logistics_coordination",
+    )
+
+    logistics_response = await logistics_task
+    route = route_for_mode(logistics_response, mode)
+    if route is None:
+        # The mode is only a hint in the prompt: a route by anything else is asked for once more
+        modes = sorted({str(r.get("mode", "")) for r in logistics_response.get("routes") or [] if isinstance(r, dict)})
+        run.log(
+            "procurement_main", "Procurement Agent", "route_rejected",
+            f"Logistics Agent proposed {', '.join(modes) or 'no'} routes; {mode} transport is required — re-requesting",
+            data={"required_transport_mode": mode, "proposed_modes": modes},
+            phase="logistics_coordination",
+        )
+        retry_task, logistics_shortlist = plan_logistics(
+            manufacturer["selected"], manufacturer["location"],
+            delivery={**delivery_info, "rejected_route_modes": modes},
+        )
+        logistics_response = await retry_task
+        best_logistics = logistics_shortlist[0]
+        route = route_for_mode(logistics_response, mode)
+        if route is None:
+            raise ConstraintError(f"Logistics Agent returned no {mode} route")
+
+    selected_log = logistics_response.get("selected_provider", "N/A")
+    run.log(
+        "logistics_global", "Logistics Provider Agent", "route_planned",
+        f"Selected: {selected_log}. Recommended route ready.",
+        data={"message_type": "A2A_RESPONSE", "response": logistics_response},
+        phase="logistics_coordination",
+    )
+    await run.pause(0.3)
+
+    return {
+        "response": logistics_response,
+        "shortlist": logistics_shortlist,
+        "selected": selected_log,
+        "route": route,
+        "cost": safe_num(route.get("cost_usd")),
+        "days": int(safe_num(route.get("total_duration_days"))),
+        "speculation": speculation,
+    }
+
+
+async def pricing_node(run, inputs):
+    """Procurement totals and, under the rule engine, the retail price — no LLM involved."""
+    analysis, supplier, logistics = inputs["intent"], inputs["supplier"], inputs["logistics"]
+    supplier_cost, logistics_cost = supplier["supplier_cost"], logistics["cost"]
+    total_cost = supplier_cost + logistics_cost
+    print(f"[DEBUG] Pre-retailer costs: supplier=${supplier_cost:,.2f}, logistics=${logistics_cost:,.2f}, total=${total_cost:,.2f}")
+    # Pass actual procurement costs to retailer so it can price realistically
+    cost_data = {
+        "parts_cost_usd": supplier_cost,
+        "shipping_cost_usd": logistics_cost,
+        "total_procurement_cost_usd": total_cost,
+    }
+    rule_plan = None
+    if retail.RETAIL_ENGINE != "llm":
+        rule_plan = retail.plan_retail(
+            run.project_id, analysis["product_name"], analysis["product_category"], analysis["assembly_complexity"], cost_data
+        )
+    return {"logistics_cost": logistics_cost, "total_cost": total_cost, "cost_data": cost_data, "rule_plan": rule_plan}
+
+
+async def retailer_node(run, inputs):
+    """Retailer Agent: delivery plan and retail price (LLM engine), or prose enrichment in the background."""
+    analysis, manufacturer, logistics, pricing = inputs["intent"], inputs["manufacturer"], inputs["logistics"], inputs["pricing"]
+    total_cost = pricing["total_cost"]
+
+    run.log(
+        "procurement_main", "Procurement Agent", "contacting_retailer",
+        "Sending A2A delivery request to Retailer Agent...",
+        data={"message_type": "A2A_REQUEST", "to": "retailer_direct"},
+        phase="retailer_coordination",
+    )
+    await run.pause(0.2)
+
+    run.log(
+        "retailer_direct", "Retailer Agent", "planning_delivery",
+        "Creating customer delivery plan, packaging, and support...",
+        phase="retailer_coordination",
+    )
+
+    agent_args = (
+        run.project_id, analysis["product_name"], manufacturer["response"], logistics["response"], pricing["cost_data"]
+    )
+    if pricing["rule_plan"] is None:
+        retailer_response = await call_agent("retailer_direct", retailer_plan_delivery, *agent_args)
+    else:
+        # Numbers come from the rule engine; the agent only enriches prose, off the critical path
+        retailer_response = dict(pricing["rule_plan"])
+        if run.enrich_retail:
+            run.enrichment_task = asyncio.create_task(call_agent("retailer_direct", retailer_plan_delivery, *agent_args))
+
+    # ── Validate retail price: must be > total procurement cost ──
+    raw_retail = safe_num(retailer_response.get("final_retail_price_usd"))
+    if raw_retail < total_cost * 1.05:
+        # AI returned an unrealistic retail price — recompute with margin
+        margin_pct = safe_num(retailer_response.get("margin_percentage"), 25)
+        if margin_pct < 10:
+            margin_pct = 25
+        corrected_retail = round(total_cost * (1 + margin_pct / 100), 2)
+        print(f"[DEBUG] Retail price corrected: AI said ${raw_retail:,.2f}, total_cost=${total_cost:,.2f}, corrected to ${corrected_retail:,.2f} ({margin_pct}% margin)")
+        retailer_response["final_retail_price_usd"] = corrected_retail
+        retailer_response["margin_percentage"] = margin_pct
+
+    run.log(
+        "retailer_direct", "Retailer Agent", "delivery_planned",
+        f"Delivery plan ready. Offset: {retailer_response.get('delivery_plan', {}).get('estimated_delivery_date_offset_days', 'N/A')} days. Retail: ${safe_num(retailer_response.get('final_retail_price_usd')):,.2f}",
+        data={"message_type": "A2A_RESPONSE", "response": retailer_response},
+        phase="retailer_coordination",
+    )
+    await run.pause(0.3)
+
+    return {"response": retailer_response}
+
+
+async def report_node(run, inputs):
+    """Procurement Agent: timeline, coordination report and the execution plan."""
+    analysis, selection, supplier = inputs["intent"], inputs["selection"], inputs["supplier"]
+    manufacturer, logistics, pricing, retailer = inputs["manufacturer"], inputs["logistics"], inputs["pricing"], inputs["retailer"]
+    product_name, components = analysis["product_name"], analysis["components"]
+    retailer_response = retailer["response"]
+    supplier_cost, logistics_cost, total_cost = supplier["supplier_cost"], pricing["logistics_cost"], pricing["total_cost"]
+    quotes = supplier["quotes"]
+    best_suppliers, supplier_summaries = shortlist(run, selection, "suppliers")
+    best_manufacturers, manufacturer_summaries = shortlist(run, selection, "manufacturers")
+    best_logistics, logistics_summaries = logistics.get("shortlist") or shortlist(run, selection, "logistics")
+
+    run.log(
+        "procurement_main", "Procurement Agent", "compiling_plan",
+        "All agents responded. Compiling final execution plan...",
+        phase="decision",
+    )
+    await run.pause(0.5)
+
+    # Finalize all computed values
+    retail_price = safe_num(retailer_response.get("final_retail_price_usd"))
+    assembly_days = int(safe_num(manufacturer["response"].get("assembly_plan", {}).get("total_assembly_time_days")))
+    supplier_lead = int(safe_num(max(
+        (safe_num(q.get("lead_time_days")) for q in quotes) if quotes else [0],
+        default=0
+    )))
+    logistics_days = logistics["days"]
+    delivery_offset = int(safe_num(retailer_response.get("delivery_plan", {}).get("estimated_delivery_date_offset_days")))
+    total_days = supplier_lead + assembly_days + logistics_days + delivery_offset
+    print(f"[DEBUG] Final costs: supplier=${supplier_cost:,.2f}, logistics=${logistics_cost:,.2f}, total=${total_cost:,.2f}, retail=${retail_price:,.2f}")
+
+    # Facts only — the report is rendered from its template when a client asks for it
+    facts = report_facts(
+        intent=run.intent,
+        product_name=product_name,
+        components=components,
+        best_suppliers=best_suppliers,
+        best_manufacturers=best_manufacturers,
+        best_logistics=best_logistics,
+        suppliers_used=supplier["suppliers_used"],
+        num_quotes=supplier["num_quotes"],
+        selected_mfg=manufacturer["selected"],
+        selected_log=logistics["selected"],
+        supplier_cost=supplier_cost,
+        logistics_cost=logistics_cost,
+        total_cost=total_cost,
+        retail_price=retail_price,
+        retailer_response=retailer_response,
+        supplier_lead=supplier_lead,
+        assembly_days=assembly_days,
+        logistics_days=logistics_days,
+        delivery_offset=delivery_offset,
+        total_days=total_days,
+    )
+
+    manufacturer_response, logistics_response = manufacturer["response"], logistics["response"]
+    execution_plan = {
+        "project_id": run.project_id,
+        "product": product_name,
+        "intent": run.intent,
+        "status": "completed",
+        "components": components,  # Always include full component list from procurement agent
+        "suppliers": {
+            "selected": supplier["suppliers_used"],
+            "selected_details": supplier_summaries,
+            "component_count": max(supplier["num_quotes"], len(components)),
+            "quote_count": supplier["num_quotes"],
+            "total_parts_cost_usd": supplier_cost,
+            "quotes": quotes,
+        },
+        "manufacturer": {
+            "selected": manufacturer["selected"],
+            "selected_details": find_matching_summary(manufacturer_summaries, manufacturer["selected"]),
+            "assembly_plan": manufacturer_response.get("assembly_plan", {}),
+            "can_assemble": manufacturer_response.get("can_assemble", False),
+            "selection_rationale": manufacturer_response.get("selection_rationale", ""),
+        },
+        "logistics": {
+            "selected": logistics["selected"],
+            "selected_details": find_matching_summary(logistics_summaries, logistics["selected"]),
+            "route": logistics["route"],
+            "recommended": logistics_response.get("recommended_route", ""),
+            "shipping_cost_usd": logistics_cost,
+            "selection_rationale": logistics_response.get("selection_rationale", ""),
+        },
+        "retailer": {
+            "selected": "retailer_direct",
+            "delivery_plan": retailer_response.get("delivery_plan", {}),
+            "customer_experience": retailer_response.get("customer_experience", {}),
+            "retail_price_usd": retail_price,
+        },
+        "timeline": {
+            "parts_procurement_days": supplier_lead,
+            "assembly_days": assembly_days,
+            "shipping_days": logistics_days,
+            "delivery_days": delivery_offset,
+            "total_days": total_days,
+        },
+        "cost_summary": {
+            "parts_cost_usd": supplier_cost,
+            "shipping_cost_usd": logistics_cost,
+            "total_cost_usd": total_cost,
+            "retail_price_usd": retail_price,
+        },
+        "coordination_report": {"$ref": report_url(run.project_id)},
+        "report_facts": facts,
+        "constraints": run.constraints,
+        "speculation": logistics["speculation"],
+        "intent_cache": analysis["intent_cache"],
+        "pacing": run.pacer.summary(),
+        "llm_usage": usage_ledger.project_summary(run.project_id),
+    }
+
+    run.log(
+        "procurement_main", "Procurement Agent", "plan_complete",
+        "Execution plan complete. Total cost: $" + f"{total_cost:,.2f}" + ". Timeline: " + str(total_days) + " days.",
+        phase="decision",
+    )
+    await run.pause(0.3)
+
+    return {"plan": execution_plan, "retailer_response": retailer_response}
+
+
+# ═══════════════════════════════════════════
+# Graph
+# ═══════════════════════════════════════════
+
+def in_phase(phase, fn):
+    """
+    Node fn whose LLM calls are booked under `phase` in the usage ledger. Each node runs
+    in its own task, so the ContextVar holds for the node and the threads/tasks it starts.
+    """
+    async def node(run, inputs):
+        current_phase.set(phase)
+        return await fn(run, inputs)
+    return node
+
+
+PIPELINE = Dag([
+    Node("intent", in_phase("analysis", intent_node)),
+    Node("selection", in_phase("discovery", selection_node), inputs=["intent"]),
+    Node("supplier", in_phase("supplier_coordination", supplier_node), inputs=["intent", "selection"]),
+    Node("manufacturer", in_phase("manufacturer_coordination", manufacturer_node), inputs=["intent", "selection", "supplier"]),
+    # Starts with the manufacturer (speculatively) and waits for its pick mid-run
+    Node("logistics", in_phase("logistics_coordination", logistics_node), inputs=["intent", "selection", "supplier"], awaits=["manufacturer"]),
+    Node("pricing", in_phase("pricing", pricing_node), inputs=["intent", "supplier", "logistics"]),
+    Node("retailer", in_phase("retailer_coordination", retailer_node), inputs=["intent", "manufacturer", "logistics", "pricing"]),
+    Node("report", in_phase("decision", report_node), inputs=["intent", "selection", "supplier", "manufacturer", "logistics", "pricing", "retailer"]),
+])
+
+
+async def execute(run, seed=None):
+    """Run the pipeline, closing the run's event queue with None when done (or failed)."""
+    try:
+        return await PIPELINE.run(run, seed)
+    finally:
+        run.events.put_nowait(None)
@@ -0,0 +1,86 @@
+"""
+Pacing — optional presentation delays between orchestration events.
+The dashboard's step-by-step animation used to come from fixed sleeps inside the
+orchestrator. Each run now gets a pace factor (1 = the original rhythm, 0 = emit as
+fast as the agents finish); time actually spent sleeping is counted for /api/metrics.
+"""
+
+import asyncio
+import os
+import threading
+
+from scheduler import BATCH
+
+# Default pace for interactive runs; batch-priority runs default to 0 (no pacing)
+SSE_PACE = float(os.getenv("SSE_PACE", "1"))
+MAX_PACE = 5.0
+
+
+def parse_pace(value, priority: int) -> float:
+    """Body "pace" → factor in [0, MAX_PACE]; missing/invalid falls back to the default."""
+    if value is None or value == "":
+        return 0.0 if priority == BATCH else SSE_PACE
+    if isinstance(value, bool):
+        return SSE_PACE if value else 0.0
+    try:
+        pace = float(value)
+    except (TypeError, ValueError):
+        return SSE_PACE
+    return min(max(pace, 0.0), MAX_PACE)
+
+
+class PacingStats:
+    """Process-wide totals of presentation sleep, split by paced vs unpaced runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.paced_runs = 0
+        self.pauses = 0
+        self.slept_s = 0.0
+        self.skipped_s = 0.0
+
+    def start_run(self, pace: float):
+        with self._lock:
+            self.runs += 1
+            self.paced_runs += 1 if pace > 0 else 0
+
+    def add(self, slept: float, skipped: float):
+        with self._lock:
+            self.pauses += 1
+            self.slept_s += slept
+            self.skipped_s += skipped
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "default_pace": SSE_PACE,
+                "runs": self.runs,
+                "paced_runs": self.paced_runs,
+                "pauses": self.pauses,
+                "slept_s": round(self.slept_s, 3),
+                "skipped_s": round(self.skipped_s, 3),
+                "avg_slept_per_run_s": round(self.slept_s / self.runs, 3) if self.runs else 0.0,
+            }
+
+
+pacing_stats = PacingStats()
+
+
+class Pacer:
+    """Per-run pacing: `await pacer.pause(0.3)` sleeps 0.3 × pace seconds."""
+
+    def __init__(self, pace: float):
+        self.pace = pace
+        self.slept_s = 0.0
+        pacing_stats.start_run(pace)
+
+    async def pause(self, seconds: float):
+        delay = seconds * self.pace
+        if delay > 0:
+            await asyncio.sleep(delay)
+            self.slept_s += delay
+        pacing_stats.add(max(delay, 0.0), max(seconds - delay, 0.0))
+
+    def summary(self) -> dict:
+        return {"pace": self.pace, "slept_s": round(self.slept_s, 3)}
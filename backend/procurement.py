@@ -1,36 +1,32 @@
 """
 Procurement Agent — Built with CrewAI.
 Analyzes user intent and identifies all required components.
+With INTENT_BACKEND=direct the crew is replaced by a single structured JSON call.
+With LLM_PROVIDER=offline the crew is bypassed for the local stand-in.
 """
 
 import json
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 
-# CrewAI imports
-from crewai import Agent, Task, Crew
+from scheduler import scheduler
+from resilience import breaker
+from providers import get_provider, offline_intent_analysis
+from schemas import validate_response, validate_item, SchemaError
+from component_stream import ComponentStream
+from usage import usage_ledger
+from prompts import system_prompt_for
+from agents import _call_openai
 
+# CrewAI talks to the provider itself, so the crew run is admitted as one
+# coarse reservation (prompt + long component list) before kickoff.
+INTENT_TOKEN_ESTIMATE = 6000
 
-def analyze_intent(intent: str) -> dict:
-    """
-    Use CrewAI to analyze the user's procurement intent
-    and identify all required components/parts.
-    """
-    procurement_agent = Agent(
-        role="Supply Chain Procurement Specialist",
-        goal="Analyze procurement requests and identify every single component, material, and part needed to fulfill the order",
-        backstory=(
-            "You are a world-class procurement specialist with 25 years of experience "
-            "in global supply chain management. You have deep expertise across automotive, "
-            "electronics, aerospace, consumer goods, and industrial manufacturing. "
-            "You know exactly what components, sub-assemblies, raw materials, and parts "
-            "are needed to build any product. You are meticulous and thorough."
-        ),
-        verbose=False,
-        allow_delegation=False,
-    )
 
-    task = Task(
-        description=f"""Analyze this procurement request and identify ALL required components:
+TASK_TEMPLATE = """Analyze this procurement request and identify ALL required components:
 
 REQUEST: "{intent}"
 
@@ -54,7 +50,37 @@ You must return a valid JSON object (and NOTHING else) with this exact structure
 }}
 
 Be EXTREMELY thorough. For complex products like vehicles, include 15-25 major component groups.
-Include realistic cost estimates. Return ONLY the JSON object, no other text.""",
+Include realistic cost estimates. Return ONLY the JSON object, no other text."""
+
+INTENT_CREW_POOL_SIZE = int(os.getenv("INTENT_CREW_POOL_SIZE", "4"))
+# "crewai" (default) runs the procurement crew; "direct" makes one structured JSON call
+INTENT_BACKENDS = ("crewai", "direct")
+INTENT_BACKEND = os.getenv("INTENT_BACKEND", "crewai").lower()
+INTENT_MAX_TOKENS = int(os.getenv("INTENT_MAX_TOKENS", "4000"))
+
+
+def build_crew(model: str, intent: str = ""):
+    """One procurement Agent + Task + Crew. Returns (crew, task)."""
+    # CrewAI imports — deferred so offline runs do not need the framework installed
+    from crewai import Agent, Task, Crew
+
+    procurement_agent = Agent(
+        role="Supply Chain Procurement Specialist",
+        goal="Analyze procurement requests and identify every single component, material, and part needed to fulfill the order",
+        backstory=(
+            "You are a world-class procurement specialist with 25 years of experience "
+            "in global supply chain management. You have deep expertise across automotive, "
+            "electronics, aerospace, consumer goods, and industrial manufacturing. "
+            "You know exactly what components, sub-assemblies, raw materials, and parts "
+            "are needed to build any product. You are meticulous and thorough."
+        ),
+        verbose=False,
+        allow_delegation=False,
+        llm=model,
+    )
+
+    task = Task(
+        description=TASK_TEMPLATE.format(intent=intent),
         expected_output="A valid JSON object with product details and comprehensive component list",
         agent=procurement_agent,
     )
@@ -64,25 +90,235 @@ Include realistic cost estimates. Return ONLY the JSON object, no other text."""
         tasks=[task],
         verbose=False,
     )
+    return crew, task
+
 
-    result = crew.kickoff()
+# ═══════════════════════════════════════════
+# Prewarmed crew pool
+# ═══════════════════════════════════════════
+
+class CrewPool:
+    """
+    Pre-built procurement crews, checked out one request at a time. Only the task
+    description changes between runs, so Agent/LLM client setup happens once per slot.
+    """
+
+    def __init__(self, size: int = INTENT_CREW_POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue()  # most recently used slot first — its client is warm
+        self._lock = threading.Lock()
+        self._created = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.build_s = 0.0
+
+    def _build(self, model: str) -> dict:
+        started = time.perf_counter()
+        crew, task = build_crew(model)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.build_s += elapsed
+        return {"crew": crew, "task": task, "model": model, "usage_seen": (0, 0, 0)}
+
+    def warm(self, model: str):
+        """Fill the pool up to `size` slots; called once at startup."""
+        started = time.perf_counter()
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                self._idle.put(self._build(model))
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        print(f"[CrewPool] {self._idle.qsize()} procurement crews ready in {time.perf_counter() - started:.2f}s")
+
+    @contextmanager
+    def checkout(self, model: str):
+        if self.size <= 0:
+            # Pooling disabled: a fresh crew per request (the pre-pool behaviour)
+            yield self._build(model)
+            return
+        try:
+            slot = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+                else:
+                    self.waits += 1
+            if grow:
+                try:
+                    slot = self._build(model)
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                slot = self._idle.get()
+        with self._lock:
+            self.checkouts += 1
+        if slot["model"] != model:
+            slot = self._build(model)
+        try:
+            yield slot
+        finally:
+            self._idle.put(slot)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "build_s": round(self.build_s, 3),
+            }
+
+
+crew_pool = CrewPool()
+
+
+def _usage_delta(slot: dict, metrics):
+    """CrewAI's per-agent token counters survive across kickoffs; report this run only."""
+    current = tuple(int(getattr(metrics, k, 0) or 0) for k in ("prompt_tokens", "cached_prompt_tokens", "completion_tokens"))
+    seen = slot["usage_seen"]
+    slot["usage_seen"] = current
+    if any(c < s for c, s in zip(current, seen)):
+        return current  # counters were reset by the framework
+    return tuple(c - s for c, s in zip(current, seen))
+
+
+def analyze_intent(intent: str, backend: str = None) -> dict:
+    """
+    Analyze the user's procurement intent and identify all required components/parts,
+    with CrewAI (default) or one structured call through the shared LLM client.
+    """
+    backend = (backend or INTENT_BACKEND).lower()
+    if backend == "direct":
+        return _analyze_direct(intent)
+    if backend not in INTENT_BACKENDS:
+        raise ValueError(f"Unknown INTENT_BACKEND '{backend}' (expected {' or '.join(INTENT_BACKENDS)})")
+
+    provider = get_provider()
+    if provider.name == "offline":
+        return offline_intent_analysis(intent)
+
+    # Fails fast while the provider is unhealthy so main.py uses its fallback components
+    breaker.allow()
+    scheduler.acquire(INTENT_TOKEN_ESTIMATE)
+    with crew_pool.checkout(provider.model) as slot:
+        slot["task"].description = TASK_TEMPLATE.format(intent=intent)
+        started = time.monotonic()
+        try:
+            result = slot["crew"].kickoff()
+        except Exception:
+            breaker.record(False)
+            usage_ledger.record("procurement", model=provider.model, latency_s=time.monotonic() - started, ok=False)
+            raise
+        breaker.record(True)
+        # CrewAI aggregates the crew's own LLM requests into UsageMetrics
+        prompt_tokens, cached_tokens, completion_tokens = _usage_delta(slot, getattr(result, "token_usage", None))
+    # Hand back what the coarse reservation over-estimated, as agents._request_once does
+    scheduler.settle(INTENT_TOKEN_ESTIMATE, prompt_tokens + completion_tokens or None)
+    usage_ledger.record(
+        "procurement", model=provider.model, prompt_tokens=prompt_tokens, cached_tokens=cached_tokens,
+        completion_tokens=completion_tokens, latency_s=time.monotonic() - started,
+    )
     raw_output = result.raw if hasattr(result, "raw") else str(result)
 
     # Parse JSON from the output
     try:
         # Try direct parse
-        return json.loads(raw_output)
+        return _validated(json.loads(raw_output), intent)
     except json.JSONDecodeError:
         # Try to extract JSON from the text
         start = raw_output.find("{")
         end = raw_output.rfind("}") + 1
         if start != -1 and end > start:
             try:
-                return json.loads(raw_output[start:end])
+                return _validated(json.loads(raw_output[start:end]), intent)
             except json.JSONDecodeError:
                 pass
 
-    # Fallback: return a basic structure
+    return _fallback_analysis(intent)
+
+
+def _analyze_direct(intent: str) -> dict:
+    """
+    One schema-constrained JSON call via agents._call_openai, so intent analysis shares
+    the scheduler, breaker, hedging, prompt-prefix caching and usage ledger with the
+    other agents. The reply is already validated against IntentAnalysis there.
+    """
+    system_prompt = system_prompt_for("intent")
+    try:
+        result = _call_openai(system_prompt, f'REQUEST: "{intent}"', max_tokens=INTENT_MAX_TOKENS,
+                              agent="intent", payload={"intent": intent})
+    except SchemaError as e:
+        print(f"[Schema] intent: {str(e)[:120]} — using fallback analysis")
+        return _fallback_analysis(intent)
+    result["total_estimated_components"] = len(result.get("components", []))
+    return result
+
+
+def analyze_intent_streaming(intent: str, on_component, backend: str = None) -> dict:
+    """
+    analyze_intent(), but each component is passed to on_component(component) as soon
+    as it is known. The direct backend streams the reply and hands components out as
+    their JSON objects close; the CrewAI backend can only hand them out at the end.
+    on_component may see a component twice (retries); consumers dedupe.
+    """
+    backend = (backend or INTENT_BACKEND).lower()
+    if backend != "direct":
+        analysis = analyze_intent(intent, backend)
+        for component in analysis.get("components", []):
+            on_component(component)
+        return analysis
+
+    def sink_factory():
+        stream = ComponentStream()
+
+        def sink(text):
+            for item in stream.feed(text):
+                component = validate_item("intent", item)
+                if component is not None:
+                    on_component(component)
+        return sink
+
+    system_prompt = system_prompt_for("intent")
+    try:
+        analysis = _call_openai(system_prompt, f'REQUEST: "{intent}"', max_tokens=INTENT_MAX_TOKENS,
+                                agent="intent", payload={"intent": intent}, on_stream=sink_factory)
+    except SchemaError as e:
+        print(f"[Schema] intent: {str(e)[:120]} — using fallback analysis")
+        analysis = _fallback_analysis(intent)
+    analysis["total_estimated_components"] = len(analysis.get("components", []))
+    # The validated final list is authoritative; anything the stream missed goes out now
+    for component in analysis["components"]:
+        on_component(component)
+    return analysis
+
+
+def _validated(data, intent: str) -> dict:
+    """Repair the crew's JSON against the IntentAnalysis schema; unusable output → fallback."""
+    try:
+        clean, report = validate_response("intent", data)
+    except SchemaError as e:
+        print(f"[Schema] intent: {str(e)[:120]} — using fallback analysis")
+        return _fallback_analysis(intent)
+    if report["repairs"] or report["invalid_items"]:
+        print(f"[Schema] intent: {len(report['repairs'])} local repairs, {len(report['invalid_items'])} invalid components dropped")
+    clean["total_estimated_components"] = len(clean["components"])
+    return clean
+
+
+def _fallback_analysis(intent: str) -> dict:
+    """Basic structure used when the crew's output cannot be parsed."""
     return {
         "product": intent,
         "product_category": "general",
@@ -0,0 +1,239 @@
+"""
+Project Store — every run's SSE events and final execution plan, persisted to SQLite.
+Events are appended by a background writer thread (the stream never waits on disk)
+and can be replayed later with zero LLM calls; projects are indexed by creation time
+for listing recent runs.
+"""
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from encoding import dumps, loads
+
+PROJECT_STORE_ENABLED = os.getenv("PROJECT_STORE", "1") != "0"
+PROJECT_STORE_PATH = os.getenv("PROJECT_STORE_PATH", os.path.join(os.path.dirname(__file__), "projects.db"))
+WRITE_BATCH = 200  # max queued writes committed in one transaction
+
+_TYPE_RE = re.compile(rb'"type"\s*:\s*"([a-z_]+)"')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id              TEXT PRIMARY KEY,
+    intent          TEXT NOT NULL,
+    status          TEXT NOT NULL,
+    created_at      REAL NOT NULL,
+    finished_at     REAL,
+    event_count     INTEGER NOT NULL DEFAULT 0,
+    product         TEXT,
+    total_cost_usd  REAL,
+    total_days      INTEGER,
+    plan_json       TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_projects_created ON projects (created_at DESC);
+CREATE TABLE IF NOT EXISTS events (
+    project_id  TEXT NOT NULL,
+    seq         INTEGER NOT NULL,
+    elapsed_s   REAL NOT NULL,
+    type        TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    PRIMARY KEY (project_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+def _payload(chunk) -> bytes:
+    """b'data: {...}\\n\\n' → b'{...}'."""
+    if isinstance(chunk, str):
+        chunk = chunk.encode()
+    return chunk[6:].rstrip(b"\n") if chunk.startswith(b"data: ") else chunk.rstrip(b"\n")
+
+
+class ProjectStore:
+    """SQLite-backed project history with a single writer thread."""
+
+    def __init__(self, path: str = PROJECT_STORE_PATH, enabled: bool = PROJECT_STORE_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._queue = queue.Queue()
+        self._runs = {}  # project_id -> [next seq, started monotonic]
+        self._lock = threading.Lock()
+        self._writer = None
+        self.events_written = 0
+        self.write_errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _ensure_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is not None:
+                return
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            conn.commit()
+            self._writer = threading.Thread(target=self._write_loop, args=(conn,), name="project-store", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self, conn: sqlite3.Connection):
+        while True:
+            ops = [self._queue.get()]
+            while len(ops) < WRITE_BATCH:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for sql, params in ops:
+                        conn.execute(sql, params)
+                self.events_written += sum(1 for sql, _ in ops if sql.startswith("INSERT INTO events"))
+            except sqlite3.Error as e:
+                self.write_errors += 1
+                print(f"[ProjectStore] Write failed: {str(e)[:120]}")
+            finally:
+                for _ in ops:
+                    self._queue.task_done()
+
+    def _put(self, sql: str, params: tuple):
+        self._ensure_writer()
+        self._queue.put((sql, params))
+
+    def flush(self):
+        """Block until every queued write is committed."""
+        if self.enabled and self._writer is not None:
+            self._queue.join()
+
+    # ── Recording ──
+
+    def start(self, project_id: str, intent: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._runs[project_id] = [0, time.monotonic()]
+        self._put(
+            "INSERT OR REPLACE INTO projects (id, intent, status, created_at) VALUES (?, ?, 'running', ?)",
+            (project_id, intent, time.time()),
+        )
+
+    def append(self, project_id: str, chunk: bytes):
+        """Record one encoded SSE chunk exactly as it was sent (no re-encoding)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            run = self._runs.get(project_id)
+            if run is None:
+                return
+            seq = run[0]
+            run[0] += 1
+            elapsed = time.monotonic() - run[1]
+        payload = _payload(chunk)
+        match = _TYPE_RE.search(payload, 0, 64)
+        self._put(
+            "INSERT INTO events (project_id, seq, elapsed_s, type, payload) VALUES (?, ?, ?, ?, ?)",
+            (project_id, seq, round(elapsed, 4), match.group(1).decode() if match else "unknown", payload),
+        )
+
+    def append_late(self, project_id: str, chunk: bytes):
+        """Record an event that arrives after the run finished (a background plan_update)."""
+        if not self.enabled:
+            return
+        payload = _payload(chunk)
+        match = _TYPE_RE.search(payload, 0, 64)
+        self._put(
+            "INSERT INTO events (project_id, seq, elapsed_s, type, payload) "
+            "SELECT ?, COALESCE(MAX(seq) + 1, 0), ROUND(? - (SELECT created_at FROM projects WHERE id = ?), 4), ?, ? "
+            "FROM events WHERE project_id = ?",
+            (project_id, time.time(), project_id, match.group(1).decode() if match else "unknown", payload, project_id),
+        )
+        self._put("UPDATE projects SET event_count = event_count + 1 WHERE id = ?", (project_id,))
+
+    def save_plan(self, project_id: str, plan: dict, encoded: bytes = None):
+        """Store the final plan; pass `encoded` when its JSON bytes already exist."""
+        if not self.enabled:
+            return
+        timeline = plan.get("timeline", {})
+        costs = plan.get("cost_summary", {})
+        self._put(
+            "UPDATE projects SET plan_json = ?, product = ?, total_cost_usd = ?, total_days = ? WHERE id = ?",
+            (encoded if encoded is not None else dumps(plan), plan.get("product"), costs.get("total_cost_usd"), timeline.get("total_days"), project_id),
+        )
+
+    def finish(self, project_id: str, status: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            run = self._runs.pop(project_id, None)
+        if run is None:
+            return
+        self._put(
+            "UPDATE projects SET status = ?, finished_at = ?, event_count = ? WHERE id = ?",
+            (status, time.time(), run[0], project_id),
+        )
+
+    # ── Reading ──
+
+    def _read(self, sql: str, params: tuple = ()) -> list:
+        if not self.enabled:
+            return []
+        self._ensure_writer()
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def get(self, project_id: str):
+        """Project row with its decoded plan, or None."""
+        rows = self._read("SELECT * FROM projects WHERE id = ?", (project_id,))
+        if not rows:
+            return None
+        project = dict(rows[0])
+        plan_json = project.pop("plan_json")
+        project["plan"] = loads(plan_json) if plan_json else None
+        return project
+
+    def events(self, project_id: str, after_seq: int = -1) -> list:
+        """[(seq, elapsed_s, type, payload bytes), ...] in emission order."""
+        rows = self._read(
+            "SELECT seq, elapsed_s, type, payload FROM events WHERE project_id = ? AND seq > ? ORDER BY seq",
+            (project_id, after_seq),
+        )
+        return [(r["seq"], r["elapsed_s"], r["type"],
+                 r["payload"] if isinstance(r["payload"], bytes) else r["payload"].encode())
+                for r in rows]
+
+    def recent(self, limit: int = 20, before: float = None) -> list:
+        """Newest projects first, without their plans."""
+        limit = min(max(int(limit), 1), 200)
+        if before is None:
+            rows = self._read(
+                "SELECT id, intent, status, created_at, finished_at, event_count, product, total_cost_usd, total_days "
+                "FROM projects ORDER BY created_at DESC LIMIT ?", (limit,))
+        else:
+            rows = self._read(
+                "SELECT id, intent, status, created_at, finished_at, event_count, product, total_cost_usd, total_days "
+                "FROM projects WHERE created_at < ? ORDER BY created_at DESC LIMIT ?", (before, limit))
+        return [dict(r) for r in rows]
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.path if self.enabled else None,
+            "active_runs": len(self._runs),
+            "queued_writes": self._queue.qsize(),
+            "events_written": self.events_written,
+            "write_errors": self.write_errors,
+        }
+
+
+project_store = ProjectStore()
@@ -0,0 +1,463 @@
+"""
+Prompt Builder — compact serialization, per-agent field projection and input budgets.
+Payloads are embedded as minified JSON with only the fields each agent reads.
+Input tokens are counted locally (tiktoken when installed, else a chars/4 estimate)
+and sections are trimmed lowest-priority first until the agent's budget is met.
+System prompts are compiled stable-prefix templates, cached per partner shortlist.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # optional dependency — fall back to a character estimate
+    _encoding = None
+
+CHARS_PER_TOKEN = 4
+
+# Input-token budgets per agent (system + user prompt); PROMPT_BUDGET_<AGENT> overrides
+AGENT_INPUT_BUDGETS = {
+    "supplier": 4000,
+    "manufacturer": 3500,
+    "logistics": 2000,
+    "retailer": 1500,
+    "intent": 1500,
+}
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def budget_for(agent: str) -> int:
+    return int(os.getenv(f"PROMPT_BUDGET_{agent.upper()}", AGENT_INPUT_BUDGETS.get(agent, 4000)))
+
+
+# ═══════════════════════════════════════════
+# Field projections — only what each agent reads
+# ═══════════════════════════════════════════
+
+def _pick(d: dict, keys) -> dict:
+    return {k: d[k] for k in keys if isinstance(d, dict) and d.get(k) not in (None, "", [], {})}
+
+
+def project_components(components: list, keys=("name", "category", "specifications", "estimated_quantity")) -> list:
+    return [_pick(c, keys) if isinstance(c, dict) else {"name": str(c)} for c in components]
+
+
+def project_supplier_data(supplier_data: dict) -> dict:
+    """What the manufacturer needs from the supplier phase: who ships what, from where, when."""
+    if not supplier_data:
+        return {}
+    return {
+        "suppliers_used": supplier_data.get("suppliers_used", []),
+        "total_estimated_cost": supplier_data.get("total_estimated_cost"),
+        "parts": [
+            _pick(q, ("component_name", "assigned_supplier", "supplier_location", "quantity", "lead_time_days"))
+            for q in supplier_data.get("quotes", [])
+        ],
+    }
+
+
+def project_manufacturing(manufacturing_data: dict) -> dict:
+    """What the retailer needs from the manufacturer: where, how long, and whether it can be built."""
+    if not manufacturing_data:
+        return {}
+    plan = manufacturing_data.get("assembly_plan") or {}
+    return {
+        **_pick(manufacturing_data, ("selected_manufacturer", "manufacturer_location", "can_assemble",
+                                     "estimated_completion_date_offset_days")),
+        **_pick(plan, ("total_assembly_time_days", "quality_checks")),
+    }
+
+
+def project_logistics(logistics_data: dict) -> dict:
+    """What the retailer needs from logistics: the recommended route's mode, duration, cost and risk."""
+    if not logistics_data:
+        return {}
+    routes = logistics_data.get("routes") or []
+    recommended = logistics_data.get("recommended_route")
+    route = next((r for r in routes if isinstance(r, dict) and r.get("route_id") == recommended), routes[0] if routes else {})
+    return {
+        **_pick(logistics_data, ("selected_provider", "provider_hub", "customs_requirements")),
+        "route": _pick(route, ("mode", "total_duration_days", "cost_usd", "risk_level", "tracking_type")),
+    }
+
+
+# ═══════════════════════════════════════════
+# Budgeted prompt assembly
+# ═══════════════════════════════════════════
+
+class Section:
+    """
+    One labelled payload in a prompt; higher priority is trimmed later.
+    keep_items sections never lose list entries, only long text inside them.
+    """
+
+    def __init__(self, label: str, value, priority: int = 0, keep_items: bool = False):
+        self.label = label
+        self.value = value
+        self.priority = priority
+        self.keep_items = keep_items
+        self.trimmed = False
+
+    def render(self) -> str:
+        body = self.value if isinstance(self.value, str) else compact_json(self.value)
+        return f"{self.label}: {body}"
+
+
+def _shrink(value, keep_items: bool = False):
+    """One trimming step: halve a list (noting what was omitted), cut a string, or shrink a dict's largest field."""
+    if isinstance(value, list) and keep_items:
+        if not value:
+            return value
+        largest = max(range(len(value)), key=lambda i: len(compact_json(value[i])))
+        return value[:largest] + [_shrink(value[largest])] + value[largest + 1:]
+    if isinstance(value, list):
+        kept = [v for v in value if not (isinstance(v, dict) and "omitted_items" in v)]
+        omitted = sum(v["omitted_items"] for v in value if isinstance(v, dict) and "omitted_items" in v)
+        if len(kept) <= 1:
+            return [_shrink(kept[0])] + ([{"omitted_items": omitted}] if omitted else []) if kept else value
+        half = max(1, len(kept) // 2)
+        return kept[:half] + [{"omitted_items": omitted + len(kept) - half}]
+    if isinstance(value, str):
+        return value[: max(16, len(value) // 2)] + "…" if len(value) > 32 else value
+    if isinstance(value, dict) and value:
+        largest = max(value, key=lambda k: len(compact_json(value[k])))
+        return {**value, largest: _shrink(value[largest])}
+    return value
+
+
+def build_prompt(agent: str, system_prompt: str, header: str, sections: list, footer: str = "") -> tuple:
+    """
+    Render the user prompt from sections, trimming the lowest-priority ones until
+    system + user fit the agent's input budget. Returns (user_prompt, stats).
+    """
+    budget = budget_for(agent)
+    fixed = count_tokens(system_prompt) + count_tokens(header) + count_tokens(footer)
+
+    def render():
+        parts = [header] + [s.render() for s in sections] + ([footer] if footer else [])
+        return "\n".join(p for p in parts if p)
+
+    text = render()
+    tokens = count_tokens(system_prompt) + count_tokens(text)
+    for section in sorted(sections, key=lambda s: s.priority):
+        while tokens > budget:
+            before = compact_json(section.value)
+            section.value = _shrink(section.value, section.keep_items)
+            if compact_json(section.value) == before:
+                break
+            section.trimmed = True
+            text = render()
+            tokens = count_tokens(system_prompt) + count_tokens(text)
+        if tokens <= budget:
+            break
+
+    trimmed = [s.label for s in sections if s.trimmed]
+    stats = {
+        "agent": agent,
+        "input_tokens_est": tokens,
+        "system_tokens_est": count_tokens(system_prompt),
+        "fixed_tokens_est": fixed,
+        "budget": budget,
+        "trimmed_sections": trimmed,
+    }
+    print(f"[Prompt] {agent}: ~{tokens} input tokens (budget {budget})"
+          + (f" — trimmed {', '.join(trimmed)}" if trimmed else "")
+          + ("" if _encoding else " [estimated]"))
+    return text, stats
+
+
+# ═══════════════════════════════════════════
+# Stable-prefix system prompts
+# ═══════════════════════════════════════════
+# Providers cache prompt prefixes (OpenAI: from 1024 tokens, in 128-token steps),
+# so every system prompt is fixed instructions + schema first, then the partner
+# shortlist in canonical id order. Per-request values only appear in the user prompt.
+
+SUPPLIER_INSTRUCTIONS = """You are a Supplier Agent in a supply chain AI system.
+For each component in the request, assign it to the BEST matching supplier from the
+REAL supplier database at the end of this message and generate a quote.
+
+COST RULES:
+- unit_cost_usd = realistic market price in USD (steel rod $15-50, circuit board $8-200, engine block $2000-8000, etc.)
+- Multiply base market price by the supplier's cost_multiplier
+- quantity = units the project needs
+- total_line_cost = unit_cost_usd × quantity
+- Prices MUST be realistic USD, NOT raw cost_multiplier values
+
+Return JSON:
+{
+  "quotes": [
+    {
+      "component_name": "...",
+      "assigned_supplier": "supplier name",
+      "supplier_location": "city, country",
+      "available": true,
+      "description": "Product description",
+      "specifications": "Specs",
+      "unit_cost_usd": 0.00,
+      "quantity": 0,
+      "total_line_cost": 0.00,
+      "lead_time_days": 0,
+      "constraints": [],
+      "supplier_notes": "Why this supplier"
+    }
+  ]
+}"""
+
+MANUFACTURER_INSTRUCTIONS = """You are a Manufacturer Agent in a supply chain AI system.
+Choose the BEST manufacturer from the REAL manufacturing facilities listed at the end
+of this message and create an assembly plan. Copy project_id from the request.
+
+Return JSON:
+{
+  "agent_id": "manufacturer_prime",
+  "project_id": "<project id from the request>",
+  "status": "assembly_plan_created",
+  "selected_manufacturer": "manufacturer name",
+  "manufacturer_location": "city, country",
+  "can_assemble": true,
+  "assembly_plan": {
+    "steps": [
+      {"step": 1, "description": "...", "duration_hours": 0, "dependencies": ["..."]}
+    ],
+    "total_assembly_time_days": 0,
+    "facility": "facility name and location",
+    "quality_checks": ["..."]
+  },
+  "capacity_status": "available",
+  "estimated_completion_date_offset_days": 0,
+  "selection_rationale": "Why this manufacturer was chosen over others",
+  "constraints": ["..."],
+  "reasoning": "Full reasoning"
+}"""
+
+LOGISTICS_INSTRUCTIONS = """You are a Logistics Provider Agent in a supply chain AI system.
+Choose the BEST provider(s) from the REAL logistics providers listed at the end of this
+message and plan optimal routes. Copy project_id from the request.
+
+Return JSON:
+{
+  "agent_id": "logistics_global",
+  "project_id": "<project id from the request>",
+  "status": "route_planned",
+  "selected_provider": "provider name",
+  "provider_hub": "city, country",
+  "routes": [
+    {
+      "route_id": "...",
+      "provider": "provider name",
+      "mode": "ground/air/sea",
+      "segments": [
+        {"from": "...", "to": "...", "carrier": "...", "duration_days": 0}
+      ],
+      "total_duration_days": 0,
+      "cost_usd": 0.00,
+      "risk_level": "low/medium/high",
+      "risk_flags": ["..."],
+      "insurance_cost_usd": 0.00,
+      "tracking_type": "..."
+    }
+  ],
+  "recommended_route": "route_id",
+  "selection_rationale": "Why this provider and route were chosen",
+  "customs_requirements": ["..."],
+  "reasoning": "Full reasoning"
+}"""
+
+RETAILER_INSTRUCTIONS = """You are a Retailer Agent in a supply chain AI system.
+You manage the final delivery to the customer and post-sale experience.
+Copy project_id from the request.
+
+PRICING RULES (when procurement costs are given in the request you MUST use them):
+  final_retail_price_usd = total_procurement_cost × (1 + margin_percentage / 100)
+A typical margin is 15-35% depending on product complexity.
+The retail price must ALWAYS be HIGHER than the total procurement cost.
+NEVER return a retail price lower than the total procurement cost.
+
+Return JSON:
+{
+  "agent_id": "retailer_direct",
+  "project_id": "<project id from the request>",
+  "status": "delivery_planned",
+  "delivery_plan": {
+    "packaging": "...",
+    "delivery_method": "...",
+    "estimated_delivery_date_offset_days": 0,
+    "tracking_number": "...",
+    "notifications": ["order confirmed", "shipped", "out for delivery", "delivered"]
+  },
+  "customer_experience": {
+    "warranty": "...",
+    "return_policy": "...",
+    "support_channel": "...",
+    "documentation_included": ["..."]
+  },
+  "final_retail_price_usd": 0.00,
+  "margin_percentage": 0,
+  "reasoning": "Delivery plan rationale including how retail price was calculated from procurement costs"
+}"""
+
+
+INTENT_INSTRUCTIONS = """You are a world-class Supply Chain Procurement Specialist with 25 years of
+experience across automotive, electronics, aerospace, consumer goods and industrial
+manufacturing. Analyze the procurement request and identify ALL required components,
+sub-assemblies, raw materials and parts.
+
+Be EXTREMELY thorough. For complex products like vehicles, include 15-25 major component groups.
+Include realistic cost estimates (estimated_unit_cost_usd per unit, in USD).
+
+Return JSON:
+{
+  "product": "Name of the main product being assembled",
+  "product_category": "Category (automotive, electronics, etc.)",
+  "components": [
+    {
+      "name": "Component name",
+      "category": "Sub-category (engine, body, electronics, interior, etc.)",
+      "specifications": "Detailed technical specifications",
+      "estimated_quantity": 1,
+      "priority": "critical or standard",
+      "estimated_unit_cost_usd": 0
+    }
+  ],
+  "total_estimated_components": 0,
+  "assembly_complexity": "low/medium/high/very_high",
+  "notes": "Any important procurement notes"
+}"""
+
+
+def _supplier_view(s: dict) -> dict:
+    return {
+        "name": s["name"],
+        "location": f"{s['city']}, {s['country']}",
+        "specialization": s["specialization"],
+        "lead_time_days": s["lead_time_days"],
+        "cost_multiplier": s["cost_multiplier"],
+        "reliability": f"{s['reliability']*100:.0f}%",
+        "certifications": s["certifications"],
+        "min_order_usd": s["min_order_usd"],
+    }
+
+
+def _manufacturer_view(m: dict) -> dict:
+    return {
+        "name": m["name"],
+        "location": f"{m['city']}, {m['country']}",
+        "specialization": m["specialization"],
+        "capabilities": m["capabilities"],
+        "lead_time_days": m["lead_time_days"],
+        "cost_per_hour": f"${m['cost_per_unit_hour']}",
+        "reliability": f"{m['reliability']*100:.0f}%",
+        "capacity_units_monthly": m["capacity_units_monthly"],
+        "facility_size_sqm": f"{m['facility_size_sqm']:,}",
+        "certifications": m["certifications"],
+    }
+
+
+def _logistics_view(l: dict) -> dict:
+    return {
+        "name": l["name"],
+        "hub": f"{l['city']}, {l['country']}",
+        "modes": l["modes"],
+        "coverage": l["coverage_regions"],
+        "cost_per_km": f"${l['cost_per_km_usd']}",
+        "base_fee": f"${l['base_fee_usd']}",
+        "avg_speed_kmh": l["avg_speed_kmh"],
+        "reliability": f"{l['reliability']*100:.0f}%",
+        "max_weight_tons": l["max_weight_tons"],
+        "customs_capable": l.get("customs_capable", False),
+        "hazmat_certified": l.get("hazmat_certified", False),
+        "tracking": l.get("tracking", "none"),
+    }
+
+
+TEMPLATES = {
+    # agent: (instructions, partner section label, partner projection)
+    "supplier": (SUPPLIER_INSTRUCTIONS, "SUPPLIER DATABASE", _supplier_view),
+    "manufacturer": (MANUFACTURER_INSTRUCTIONS, "MANUFACTURING FACILITIES", _manufacturer_view),
+    "logistics": (LOGISTICS_INSTRUCTIONS, "LOGISTICS PROVIDERS", _logistics_view),
+    "retailer": (RETAILER_INSTRUCTIONS, None, None),
+    "intent": (INTENT_INSTRUCTIONS, None, None),
+}
+
+TEMPLATE_CACHE_SIZE = 256
+_template_cache = OrderedDict()
+_template_lock = threading.Lock()
+_template_stats = {"hits": 0, "misses": 0}
+
+
+def shortlist_fingerprint(partners: list) -> str:
+    """Order-independent identity of a partner shortlist."""
+    ids = sorted(str(p.get("id", p.get("name", ""))) for p in partners or [])
+    return hashlib.sha1(",".join(ids).encode()).hexdigest()[:16]
+
+
+def system_prompt_for(agent: str, partners: list = None) -> str:
+    """Compiled system prompt for an agent + shortlist, cached per shortlist fingerprint."""
+    key = (agent, shortlist_fingerprint(partners))
+    with _template_lock:
+        cached = _template_cache.get(key)
+        if cached is not None:
+            _template_cache.move_to_end(key)
+            _template_stats["hits"] += 1
+            return cached
+        _template_stats["misses"] += 1
+
+    instructions, label, view = TEMPLATES[agent]
+    text = instructions
+    if label:
+        ordered = sorted(partners or [], key=lambda p: str(p.get("id", p.get("name", ""))))
+        text += f"\n\n{label}:\n" + compact_json([view(p) for p in ordered])
+
+    with _template_lock:
+        _template_cache[key] = text
+        while len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return text
+
+
+# ── Provider prefix-cache effectiveness ──
+
+_prefix_lock = threading.Lock()
+_prefix_usage = {}  # agent -> {"prompt_tokens", "cached_tokens", "calls"}
+
+
+def record_prompt_usage(agent: str, prompt_tokens: int, cached_tokens: int):
+    with _prefix_lock:
+        row = _prefix_usage.setdefault(agent, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        row["calls"] += 1
+        row["prompt_tokens"] += prompt_tokens or 0
+        row["cached_tokens"] += cached_tokens or 0
+
+
+def prefix_cache_snapshot() -> dict:
+    with _prefix_lock:
+        agents = {
+            agent: {**row, "cached_ratio": round(row["cached_tokens"] / row["prompt_tokens"], 3) if row["prompt_tokens"] else 0.0}
+            for agent, row in _prefix_usage.items()
+        }
+    prompt = sum(r["prompt_tokens"] for r in agents.values())
+    cached = sum(r["cached_tokens"] for r in agents.values())
+    with _template_lock:
+        templates = {**_template_stats, "compiled": len(_template_cache)}
+    return {
+        "cached_token_ratio": round(cached / prompt, 3) if prompt else 0.0,
+        "by_agent": agents,
+        "templates": templates,
+    }
@@ -0,0 +1,478 @@
+"""
+LLM Providers — pluggable chat-completion backends selected by LLM_PROVIDER.
+"openai" talks to the real API; "offline" is a deterministic local stand-in that
+answers every agent with schema-valid JSON built from the partner database, with
+configurable latency and error distributions for benchmarks, CI and load tests.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+from data.suppliers import SUPPLIERS
+from data.manufacturers import MANUFACTURERS
+from selector import haversine, score_supplier
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower()
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+CHARS_PER_TOKEN = 4
+
+
+class ProviderError(Exception):
+    """Provider-neutral failure; status_code 429 is treated as a rate limit."""
+
+    def __init__(self, message: str, status_code: int = 500, headers: dict = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+def is_rate_limit_error(error) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+# ═══════════════════════════════════════════
+# OpenAI
+# ═══════════════════════════════════════════
+
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self, model: str = LLM_MODEL):
+        self.model = model
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use so offline runs never need a key or the SDK
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    def complete_json(self, agent: str, system_prompt: str, user_prompt: str, max_tokens: int,
+                      timeout_s: float, payload: dict = None, response_schema: dict = None):
+        """Return (parsed JSON, usage info, response headers). `response_schema` enables structured output."""
+        started = time.perf_counter()
+        raw = self.client.chat.completions.with_raw_response.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            response_format=self._response_format(agent, response_schema),
+            temperature=0.4,
+            max_tokens=max_tokens,
+            timeout=timeout_s,
+        )
+        response = raw.parse()
+        return json.loads(response.choices[0].message.content), self._info(response.usage, started), raw.headers
+
+    def stream_json(self, agent: str, system_prompt: str, user_prompt: str, max_tokens: int,
+                    timeout_s: float, on_text, payload: dict = None, response_schema: dict = None):
+        """Like complete_json, but each content delta is passed to on_text as it arrives."""
+        started = time.perf_counter()
+        raw = self.client.chat.completions.with_raw_response.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            response_format=self._response_format(agent, response_schema),
+            temperature=0.4,
+            max_tokens=max_tokens,
+            timeout=timeout_s,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        parts, usage = [], None
+        for chunk in raw.parse():
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_text(delta)
+        return json.loads("".join(parts)), self._info(usage, started), raw.headers
+
+    @staticmethod
+    def _response_format(agent: str, response_schema: dict = None) -> dict:
+        if response_schema:
+            return {"type": "json_schema", "json_schema": {"name": agent, "schema": response_schema, "strict": True}}
+        return {"type": "json_object"}
+
+    def _info(self, usage, started: float) -> dict:
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "latency_s": time.perf_counter() - started,
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "total_tokens": getattr(usage, "total_tokens", None),
+            "model": self.model,
+        }
+
+
+# ═══════════════════════════════════════════
+# Offline stand-in
+# ═══════════════════════════════════════════
+
+OFFLINE_SEED = int(os.getenv("OFFLINE_SEED", "7"))
+OFFLINE_LATENCY_DIST = os.getenv("OFFLINE_LATENCY_DIST", "fixed")       # fixed | uniform | lognormal
+OFFLINE_LATENCY_MS = float(os.getenv("OFFLINE_LATENCY_MS", "0"))         # mean / median
+OFFLINE_LATENCY_SPREAD = float(os.getenv("OFFLINE_LATENCY_SPREAD", "0.5"))  # uniform ± fraction, lognormal sigma
+OFFLINE_TOKENS_PER_S = float(os.getenv("OFFLINE_TOKENS_PER_S", "0"))     # 0 = no generation-time cost
+OFFLINE_ERROR_RATE = float(os.getenv("OFFLINE_ERROR_RATE", "0"))         # 5xx
+OFFLINE_RATE_LIMIT_RATE = float(os.getenv("OFFLINE_RATE_LIMIT_RATE", "0"))  # 429
+OFFLINE_STREAM_CHUNK = 64   # characters per simulated stream delta
+OFFLINE_TIMEOUT_RATE = float(os.getenv("OFFLINE_TIMEOUT_RATE", "0"))     # hangs until timeout
+# Simulated provider prefix cache: system prompts seen before count as cached
+# once they reach the minimum cacheable length, in 128-token increments.
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_STEP = 128
+
+VEHICLE_WORDS = ("car", "suv", "vehicle", "truck", "sedan", "ferrari", "porsche", "van", "bus", "motorcycle", "ev")
+ELECTRONICS_WORDS = ("phone", "laptop", "computer", "server", "drone", "robot", "tablet", "camera", "router", "watch")
+
+VEHICLE_COMPONENTS = [
+    ("Chassis frame", "chassis", "High-strength structural steel ladder frame", 1, "critical", 4200),
+    ("Body panels", "body", "Stamped aluminum and sheet metal panels, e-coated", 1, "critical", 3800),
+    ("Powertrain unit", "engine", "Drivetrain assembly with transmission and mounts", 1, "critical", 6500),
+    ("Lithium-ion battery pack", "electrical", "High-voltage battery modules with BMS", 1, "critical", 9000),
+    ("Brake calipers", "brakes", "Four-piston brake calipers with rotors and pads", 4, "critical", 320),
+    ("Suspension kit", "suspension", "Independent suspension with dampers and springs", 1, "critical", 1800),
+    ("Wheels and tires", "wheels", "Alloy wheels with all-season tires", 4, "standard", 280),
+    ("Wiring harness", "electrical", "Main vehicle wiring harnesses and connectors", 1, "critical", 950),
+    ("ECU and control units", "electronics", "Engine/vehicle control units and sensors", 1, "critical", 1400),
+    ("Headlights and tail lights", "lighting", "LED headlight and tail light assemblies", 1, "standard", 850),
+    ("Windshield and glass", "glass", "Laminated windshield and tempered side glass", 1, "standard", 700),
+    ("Seats and upholstery", "interior", "Front and rear seats with fabric upholstery", 1, "standard", 1600),
+    ("Dashboard assembly", "interior", "Dashboard with gauges and touchscreen display", 1, "standard", 1200),
+    ("Seals and gaskets", "rubber", "Door seals, gaskets and hoses", 1, "standard", 240),
+    ("Paint and coatings", "paint", "Primer, base coat and clear coat", 1, "standard", 900),
+]
+ELECTRONICS_COMPONENTS = [
+    ("PCB controller", "electronics", "Multilayer PCB with SoC and power ICs", 1, "critical", 85),
+    ("Processor", "semiconductors", "Application processor / SoC", 1, "critical", 120),
+    ("Memory chips", "semiconductors", "LPDDR memory and flash storage", 2, "critical", 30),
+    ("Display panel", "display", "Touchscreen display panel with driver", 1, "critical", 90),
+    ("Battery cells", "electrical", "Lithium-ion cells with protection circuit", 2, "critical", 18),
+    ("Plastic housing", "enclosure", "Injection-molded thermoplastic housing", 1, "standard", 12),
+    ("Sensors", "electronics", "IMU, proximity and ambient light sensors", 1, "standard", 15),
+    ("Connectors and cables", "electrical", "Board-to-board connectors and cable assemblies", 1, "standard", 6),
+    ("Camera module", "optics", "Camera module with optical lens", 1, "standard", 25),
+]
+GENERIC_COMPONENTS = [
+    ("Structural frame", "structure", "Steel or aluminum structural frame", 1, "critical", 400),
+    ("Control electronics", "electronics", "Control PCB with sensors", 1, "critical", 150),
+    ("Power supply", "electrical", "Power supply and wiring", 1, "critical", 90),
+    ("Mechanical parts", "mechanical", "Gears, bearings and shafts", 1, "standard", 120),
+    ("Housing", "enclosure", "Injection-molded housing", 1, "standard", 40),
+    ("Fasteners and seals", "hardware", "Fasteners, gaskets and seals", 1, "standard", 15),
+]
+
+
+def _leading_quantity(intent: str) -> int:
+    match = re.search(r"\b(\d{1,6})\b", intent)
+    return max(1, int(match.group(1))) if match else 1
+
+
+def offline_intent_analysis(intent: str) -> dict:
+    """Component decomposition from keyword templates — the stand-in for the procurement agent."""
+    lowered = intent.lower()
+    words = set(re.findall(r"[a-z]+", lowered))
+    if words & set(VEHICLE_WORDS):
+        template, category, complexity = VEHICLE_COMPONENTS, "automotive", "very_high"
+    elif words & set(ELECTRONICS_WORDS):
+        template, category, complexity = ELECTRONICS_COMPONENTS, "electronics", "high"
+    else:
+        template, category, complexity = GENERIC_COMPONENTS, "industrial", "medium"
+    units = _leading_quantity(intent)
+    components = [
+        {
+            "name": name,
+            "category": cat,
+            "specifications": spec,
+            "estimated_quantity": qty * units,
+            "priority": priority,
+            "estimated_unit_cost_usd": cost,
+        }
+        for name, cat, spec, qty, priority, cost in template
+    ]
+    return {
+        "product": intent.strip()[:80] or "Product",
+        "product_category": category,
+        "components": components,
+        "total_estimated_components": len(components),
+        "assembly_complexity": complexity,
+        "notes": "Offline stand-in decomposition",
+    }
+
+
+def _offline_supplier(payload: dict, rng: random.Random) -> dict:
+    shortlist = payload.get("suppliers") or SUPPLIERS[:5]
+    quotes = []
+    for component in payload.get("components", []):
+        c = component if isinstance(component, dict) else {"name": str(component)}
+        specs = [str(c.get("name", "")).lower(), str(c.get("category", "")).lower()]
+        supplier = max(shortlist, key=lambda s: (score_supplier(s, specs), -shortlist.index(s)))
+        base = float(c.get("estimated_unit_cost_usd") or 0) or rng.uniform(20, 400)
+        unit = round(base * supplier.get("cost_multiplier", 1.0), 2)
+        qty = int(c.get("estimated_quantity") or 1)
+        quotes.append({
+            "component_name": c.get("name", "Component"),
+            "assigned_supplier": supplier["name"],
+            "supplier_location": f"{supplier['city']}, {supplier['country']}",
+            "available": True,
+            "description": c.get("specifications") or c.get("name", ""),
+            "specifications": c.get("category", "general"),
+            "unit_cost_usd": unit,
+            "quantity": qty,
+            "total_line_cost": round(unit * qty, 2),
+            "lead_time_days": supplier.get("lead_time_days", 7) + rng.randint(0, 3),
+            "constraints": [],
+            "supplier_notes": f"Best specialization match in shortlist (min order ${supplier.get('min_order_usd', 0):,})",
+        })
+    return {"quotes": quotes}
+
+
+def _offline_manufacturer(payload: dict, rng: random.Random) -> dict:
+    shortlist = payload.get("manufacturers") or MANUFACTURERS[:3]
+    mfg = shortlist[0]
+    categories = []
+    for c in payload.get("components", []):
+        cat = c.get("category", "general") if isinstance(c, dict) else "general"
+        if cat not in categories:
+            categories.append(cat)
+    steps = [
+        {"step": i + 1, "description": f"Assemble and fit {cat} components", "duration_hours": rng.randint(4, 24),
+         "dependencies": [f"step {i}"] if i else []}
+        for i, cat in enumerate(categories[:10])
+    ]
+    steps.append({"step": len(steps) + 1, "description": "Final quality inspection", "duration_hours": 8,
+                  "dependencies": [f"step {len(steps)}"] if steps else []})
+    assembly_days = max(1, math.ceil(sum(s["duration_hours"] for s in steps) / 16)) + mfg.get("lead_time_days", 7) // 2
+    return {
+        "agent_id": "manufacturer_prime",
+        "project_id": payload.get("project_id", ""),
+        "status": "assembly_plan_created",
+        "selected_manufacturer": mfg["name"],
+        "manufacturer_location": f"{mfg['city']}, {mfg['country']}",
+        "can_assemble": True,
+        "assembly_plan": {
+            "steps": steps,
+            "total_assembly_time_days": assembly_days,
+            "facility": f"{mfg['name']}, {mfg['city']}",
+            "quality_checks": ["incoming parts inspection", "in-line torque checks", "end-of-line functional test"],
+        },
+        "capacity_status": "available",
+        "estimated_completion_date_offset_days": assembly_days + mfg.get("lead_time_days", 7),
+        "selection_rationale": f"Highest selection score ({mfg.get('_score', 0)}) with matching capabilities",
+        "constraints": [],
+        "reasoning": "Offline stand-in: top-scored manufacturer from shortlist",
+    }
+
+
+# Per-km cost and transit time of a mode relative to the provider's ground rates
+OFFLINE_MODE_FACTORS = {"ground": (1.0, 1.0), "rail": (0.8, 1.3), "sea": (0.5, 2.5), "barge": (0.6, 2.0), "air": (3.0, 0.3)}
+
+
+def _offline_logistics(payload: dict, rng: random.Random) -> dict:
+    shortlist = payload.get("providers") or []
+    if not shortlist:
+        return {"agent_id": "logistics_global", "project_id": payload.get("project_id", ""), "status": "route_planned",
+                "selected_provider": "N/A", "routes": [], "recommended_route": ""}
+    # A required transport mode picks the first provider offering it, as the prompt asks
+    required = str((payload.get("delivery") or {}).get("required_transport_mode") or "").lower()
+    capable = [p for p in shortlist if required in (m.lower() for m in p["modes"])] if required else []
+    provider = capable[0] if capable else shortlist[0]
+    mode = required if capable else provider["modes"][0]
+    cost_factor, time_factor = OFFLINE_MODE_FACTORS.get(mode, (1.0, 1.0))
+    pickup = payload.get("pickup") or {}
+    mfg_name = str(pickup.get("manufacturer", "")).lower()
+    mfg = next((m for m in MANUFACTURERS if mfg_name and m["name"].lower() in mfg_name), None)
+    distance = haversine(provider["x"], provider["y"], mfg["x"], mfg["y"]) + 800 if mfg else 1500.0
+    days = max(1, math.ceil(distance / max(provider["avg_speed_kmh"], 1) / 10 * time_factor))
+    cost = round(provider["base_fee_usd"] + distance * provider["cost_per_km_usd"] * cost_factor, 2)
+    return {
+        "agent_id": "logistics_global",
+        "project_id": payload.get("project_id", ""),
+        "status": "route_planned",
+        "selected_provider": provider["name"],
+        "provider_hub": f"{provider['city']}, {provider['country']}",
+        "routes": [{
+            "route_id": "route_1",
+            "provider": provider["name"],
+            "mode": mode,
+            "segments": [
+                {"from": pickup.get("manufacturer_location", "Manufacturer"), "to": f"{provider['city']} hub",
+                 "carrier": provider["name"], "duration_days": max(1, days // 2)},
+                {"from": f"{provider['city']} hub", "to": "Customer location",
+                 "carrier": provider["name"], "duration_days": max(1, days - days // 2)},
+            ],
+            "total_duration_days": days,
+            "cost_usd": cost,
+            "risk_level": "low" if provider.get("reliability", 0) >= 0.95 else "medium",
+            "risk_flags": [],
+            "insurance_cost_usd": round(cost * 0.02, 2),
+            "tracking_type": provider.get("tracking", "none"),
+        }],
+        "recommended_route": "route_1",
+        "selection_rationale": f"Top-scored provider ({provider.get('_score', 0)}) for this lane",
+        "customs_requirements": ["commercial invoice"] if provider.get("customs_capable") else [],
+        "reasoning": "Offline stand-in: top-scored provider, distance-based cost",
+    }
+
+
+def _offline_retailer(payload: dict, rng: random.Random) -> dict:
+    cost = payload.get("cost_data") or {}
+    total = float(cost.get("total_procurement_cost_usd") or 0)
+    margin = 25
+    return {
+        "agent_id": "retailer_direct",
+        "project_id": payload.get("project_id", ""),
+        "status": "delivery_planned",
+        "delivery_plan": {
+            "packaging": "standard protective packaging",
+            "delivery_method": "scheduled carrier delivery",
+            "estimated_delivery_date_offset_days": rng.randint(2, 5),
+            "tracking_number": f"OFF{rng.randint(10**8, 10**9 - 1)}",
+            "notifications": ["order confirmed", "shipped", "out for delivery", "delivered"],
+        },
+        "customer_experience": {
+            "warranty": "1 year limited warranty",
+            "return_policy": "30-day returns",
+            "support_channel": "email and phone",
+            "documentation_included": ["user manual", "warranty card"],
+        },
+        "final_retail_price_usd": round(total * (1 + margin / 100), 2),
+        "margin_percentage": margin,
+        "reasoning": "Offline stand-in: fixed margin over procurement cost",
+    }
+
+
+OFFLINE_HANDLERS = {
+    "supplier": _offline_supplier,
+    "manufacturer": _offline_manufacturer,
+    "logistics": _offline_logistics,
+    "retailer": _offline_retailer,
+    "intent": lambda payload, rng: offline_intent_analysis(payload.get("intent", "")),
+}
+
+
+class OfflineProvider:
+    """Deterministic stand-in: content depends only on the request, timing/errors on the seed."""
+
+    name = "offline"
+
+    def __init__(self, model: str = "offline-standin"):
+        self.model = model
+        self._fault_rng = random.Random(OFFLINE_SEED)
+        self._lock = threading.Lock()
+        self._seen_prefixes = set()
+
+    def _cached_tokens(self, system_prompt: str) -> int:
+        tokens = len(system_prompt) // CHARS_PER_TOKEN
+        if tokens < PREFIX_CACHE_MIN_TOKENS:
+            return 0
+        digest = hashlib.sha1(system_prompt.encode()).hexdigest()
+        with self._lock:
+            seen = digest in self._seen_prefixes
+            self._seen_prefixes.add(digest)
+        return (tokens // PREFIX_CACHE_STEP) * PREFIX_CACHE_STEP if seen else 0
+
+    def _sample_latency(self, completion_tokens: int) -> float:
+        with self._lock:
+            r = self._fault_rng.random()
+            if OFFLINE_LATENCY_DIST == "uniform":
+                base = OFFLINE_LATENCY_MS * (1 + OFFLINE_LATENCY_SPREAD * (2 * r - 1))
+            elif OFFLINE_LATENCY_DIST == "lognormal":
+                base = OFFLINE_LATENCY_MS * math.exp(self._fault_rng.gauss(0, OFFLINE_LATENCY_SPREAD))
+            else:
+                base = OFFLINE_LATENCY_MS
+        generation = completion_tokens / OFFLINE_TOKENS_PER_S if OFFLINE_TOKENS_PER_S > 0 else 0.0
+        return max(0.0, base / 1000.0) + generation
+
+    def _sample_fault(self):
+        with self._lock:
+            r = self._fault_rng.random()
+        if r < OFFLINE_RATE_LIMIT_RATE:
+            return "rate_limit"
+        if r < OFFLINE_RATE_LIMIT_RATE + OFFLINE_ERROR_RATE:
+            return "error"
+        if r < OFFLINE_RATE_LIMIT_RATE + OFFLINE_ERROR_RATE + OFFLINE_TIMEOUT_RATE:
+            return "timeout"
+        return None
+
+    def complete_json(self, agent: str, system_prompt: str, user_prompt: str, max_tokens: int,
+                      timeout_s: float, payload: dict = None, response_schema: dict = None):
+        return self.stream_json(agent, system_prompt, user_prompt, max_tokens, timeout_s, None,
+                                payload=payload, response_schema=response_schema)
+
+    def stream_json(self, agent: str, system_prompt: str, user_prompt: str, max_tokens: int,
+                    timeout_s: float, on_text, payload: dict = None, response_schema: dict = None):
+        started = time.perf_counter()
+        fault = self._sample_fault()
+        if fault == "rate_limit":
+            raise ProviderError("offline stand-in: simulated rate limit", 429, {"retry-after": "1"})
+        if fault == "timeout":
+            time.sleep(timeout_s)
+            raise TimeoutError("offline stand-in: simulated timeout")
+        if fault == "error":
+            raise ProviderError("offline stand-in: simulated server error", 500)
+
+        handler = OFFLINE_HANDLERS.get(agent)
+        if handler is None:
+            raise ProviderError(f"offline stand-in has no handler for agent '{agent}'", 400)
+        digest = hashlib.sha256(f"{agent}\n{system_prompt}\n{user_prompt}".encode()).hexdigest()
+        result = handler(payload or {}, random.Random(int(digest[:16], 16)))
+
+        prompt_tokens = (len(system_prompt) + len(user_prompt)) // CHARS_PER_TOKEN
+        text = json.dumps(result)
+        completion_tokens = min(len(text) // CHARS_PER_TOKEN, max_tokens)
+        delay = min(self._sample_latency(completion_tokens), timeout_s)
+        if on_text is None:
+            if delay:
+                time.sleep(delay)
+        else:
+            # Spread the simulated generation time over the chunks, like a token stream
+            chunks = [text[i:i + OFFLINE_STREAM_CHUNK] for i in range(0, len(text), OFFLINE_STREAM_CHUNK)]
+            for chunk in chunks:
+                if delay:
+                    time.sleep(delay / len(chunks))
+                on_text(chunk)
+        info = {
+            "latency_s": time.perf_counter() - started,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": self._cached_tokens(system_prompt),
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "model": self.model,
+        }
+        return result, info, {}
+
+
+PROVIDERS = {"openai": OpenAIProvider, "offline": OfflineProvider}
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """The process-wide provider chosen by LLM_PROVIDER."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                if LLM_PROVIDER not in PROVIDERS:
+                    raise ValueError(f"Unknown LLM_PROVIDER '{LLM_PROVIDER}' (expected one of {', '.join(PROVIDERS)})")
+                _provider = PROVIDERS[LLM_PROVIDER]()
+    return _provider
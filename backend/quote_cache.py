@@ -0,0 +1,136 @@
+"""
+Quote Cache — per-component supplier quote memoization across projects.
+Quotes are keyed by (normalized component name + category, supplier id, quantity
+band) and reused while fresh, so recurring parts are only priced by the LLM once.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+QUOTE_CACHE_TTL_S = float(os.getenv("QUOTE_CACHE_TTL_S", str(6 * 3600)))
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "20000"))
+QUOTE_CACHE_ENABLED = os.getenv("QUOTE_CACHE", "1") != "0"
+
+
+def normalize_name(text) -> str:
+    """'Brake Calipers' / 'brake caliper ' → 'brake caliper'."""
+    words = re.findall(r"[a-z0-9]+", str(text or "").lower())
+    # Naive singular so 'cells'/'cell' and 'calipers'/'caliper' share a key
+    return " ".join(w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words)
+
+
+def normalize_component(name: str, category: str = "") -> str:
+    """Cache key part for a component: normalized name and category joined by '|'."""
+    return f"{normalize_name(name)}|{normalize_name(category)}"
+
+
+def quantity_band(quantity) -> int:
+    """Power-of-two band: 1 → 0, 2-3 → 1, 4-7 → 2, ... Unit prices hold within a band."""
+    try:
+        qty = max(1, int(float(quantity)))
+    except (TypeError, ValueError):
+        qty = 1
+    return int(math.log2(qty))
+
+
+def component_key(component) -> str:
+    if isinstance(component, dict):
+        return normalize_component(component.get("name", ""), component.get("category", ""))
+    return normalize_component(str(component))
+
+
+def component_quantity(component) -> int:
+    if isinstance(component, dict):
+        try:
+            return max(1, int(float(component.get("estimated_quantity", 1) or 1)))
+        except (TypeError, ValueError):
+            return 1
+    return 1
+
+
+class QuoteStore:
+    """Thread-safe LRU of fresh quotes with hit/miss counters."""
+
+    def __init__(self, ttl_s: float = QUOTE_CACHE_TTL_S, max_entries: int = QUOTE_CACHE_MAX_ENTRIES):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stored_at, quote)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, component, suppliers: list):
+        """
+        Return a fresh cached quote for `component` from any shortlisted supplier
+        (in shortlist order), re-costed for the requested quantity, or None.
+        """
+        if not QUOTE_CACHE_ENABLED:
+            return None
+        name_key = component_key(component)
+        qty = component_quantity(component)
+        band = quantity_band(qty)
+        now = time.time()
+        with self._lock:
+            for supplier in suppliers:
+                key = (name_key, supplier.get("id"), band)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                stored_at, quote = entry
+                if now - stored_at > self.ttl_s:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                unit = quote.get("unit_cost_usd") or 0
+                return {
+                    **quote,
+                    "component_name": component.get("name", quote.get("component_name")) if isinstance(component, dict) else quote.get("component_name"),
+                    "quantity": qty,
+                    "total_line_cost": round(float(unit) * qty, 2) if unit else quote.get("total_line_cost"),
+                    "quote_source": "cache",
+                    "quote_age_s": int(now - stored_at),
+                }
+            self.misses += 1
+        return None
+
+    def store(self, component, supplier_id: str, quote: dict):
+        if not QUOTE_CACHE_ENABLED or not supplier_id:
+            return
+        key = (component_key(component), supplier_id, quantity_band(component_quantity(component)))
+        with self._lock:
+            self._entries[key] = (time.time(), dict(quote))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": QUOTE_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def match_supplier_id(assigned_name: str, suppliers: list):
+    """Map the LLM's free-text supplier name back to a shortlisted supplier id."""
+    name = (assigned_name or "").lower().strip()
+    if not name:
+        return None
+    for s in suppliers:
+        candidate = s.get("name", "").lower()
+        if candidate and (name in candidate or candidate in name):
+            return s.get("id")
+    return None
+
+
+quote_store = QuoteStore()
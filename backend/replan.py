@@ -0,0 +1,251 @@
+"""
+Replan — incremental what-if re-planning from a finished project's phase outputs.
+Every run leaves its DAG node outputs here; POST /api/projects/{id}/replan changes a
+constraint ("use sea freight", "exclude supplier X"), re-runs only the phases that
+constraint invalidates (and their dependents), reuses every other phase's output and
+answers with a JSON Patch (RFC 6902) from the old plan to the new one. The replan is
+stored like any run, so /api/projects/{id}/events replays its log, plan and patch.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from encoding import sse_event
+from orchestration import CONSTRAINT_PHASES, PIPELINE, TRANSPORT_MODES, ConstraintError, Run, execute, log_entry
+from pacing import Pacer
+from project_store import project_store
+from usage import current_project
+
+REPLAN_CACHE_MAX_ENTRIES = int(os.getenv("REPLAN_CACHE_MAX_ENTRIES", "200"))
+
+# Added to a plan by whichever run produced it, not by its phases — left out of the patch
+RUN_KEYS = ("execution", "serialization", "pacing", "llm_usage", "replanned_from")
+# Identifiers minted per project inside the phase outputs — also left out
+RUN_PATHS = ("retailer.delivery_plan.tracking_number",)
+
+
+class ReplanError(ValueError):
+    """A replan request that cannot be served; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+# ═══════════════════════════════════════════
+# Phase outputs per project
+# ═══════════════════════════════════════════
+
+class PhaseCache:
+    """Node outputs of recent runs (LRU), keyed by project id."""
+
+    def __init__(self, max_entries: int = REPLAN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.replans = 0
+        self.phases_run = 0
+        self.phases_reused = 0
+
+    def put(self, run, results: dict):
+        """
+        Keep a finished run's node outputs; its plan is results["report"]["plan"], as the
+        phases produced it (retailer enrichment goes into a copy), so a replan — which
+        skips enrichment — is diffed like for like.
+        """
+        results = dict(results)
+        # The supplier pipeline streamed during the original run cannot be finished twice
+        results["intent"] = {**results["intent"], "pipeline": None}
+        with self._lock:
+            self._entries[run.project_id] = {
+                "intent": run.intent,
+                "speculative": run.speculative,
+                "intent_backend": run.intent_backend,
+                "constraints": dict(run.constraints),
+                "results": results,
+            }
+            self._entries.move_to_end(run.project_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, project_id: str):
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is not None:
+                self._entries.move_to_end(project_id)
+            return entry
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "replans": self.replans,
+                "phases_run": self.phases_run,
+                "phases_reused": self.phases_reused,
+            }
+
+
+phase_cache = PhaseCache()
+
+
+# ═══════════════════════════════════════════
+# Constraints
+# ═══════════════════════════════════════════
+
+def merge_constraints(current: dict, changes: dict) -> dict:
+    """Apply constraint changes (null removes one) to a project's current constraints."""
+    if not isinstance(changes, dict) or not changes:
+        raise ReplanError("constraints must be a non-empty object")
+    merged = dict(current)
+    for key, value in changes.items():
+        if key not in CONSTRAINT_PHASES:
+            raise ReplanError(f"Unknown constraint {key!r}; supported: {', '.join(CONSTRAINT_PHASES)}")
+        if value in (None, "", []):
+            merged.pop(key, None)
+        elif key == "transport_mode":
+            mode = str(value).lower()
+            if mode not in TRANSPORT_MODES:
+                raise ReplanError(f"transport_mode must be one of {', '.join(TRANSPORT_MODES)}")
+            merged[key] = mode
+        else:
+            names = [value] if isinstance(value, str) else value
+            if not isinstance(names, list) or not all(isinstance(n, str) and n.strip() for n in names):
+                raise ReplanError(f"{key} must be a name or a list of names")
+            merged[key] = sorted({n.strip() for n in names})
+    return merged
+
+
+def invalidated_phases(before: dict, after: dict) -> set:
+    """Phases whose output a constraint change affects, plus everything downstream of them."""
+    changed = {key for key in set(before) | set(after) if before.get(key) != after.get(key)}
+    return PIPELINE.downstream({CONSTRAINT_PHASES[key] for key in changed}) if changed else set()
+
+
+# ═══════════════════════════════════════════
+# JSON Patch
+# ═══════════════════════════════════════════
+
+def _pointer(path: list) -> str:
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in path)
+
+
+def plan_content(plan: dict) -> dict:
+    """The plan without RUN_KEYS and RUN_PATHS (containing dicts are copied, never modified)."""
+    content = {key: value for key, value in plan.items() if key not in RUN_KEYS}
+    for path in RUN_PATHS:
+        *parents, last = path.split(".")
+        node = content
+        for key in parents:
+            if not isinstance(node.get(key), dict):
+                break
+            node[key] = dict(node[key])
+            node = node[key]
+        else:
+            node.pop(last, None)
+    return content
+
+
+def json_patch(old, new, path: list = None) -> list:
+    """RFC 6902 operations turning `old` into `new`. Lists of unequal length are replaced whole."""
+    path = path or []
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": _pointer(path + [key])})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer(path + [key]), "value": value})
+            else:
+                ops.extend(json_patch(old[key], value, path + [key]))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for index, (a, b) in enumerate(zip(old, new)):
+            ops.extend(json_patch(a, b, path + [index]))
+        return ops
+    return [{"op": "replace", "path": _pointer(path), "value": new}]
+
+
+# ═══════════════════════════════════════════
+# Replan
+# ═══════════════════════════════════════════
+
+async def replan(project_id: str, changes: dict) -> dict:
+    """Re-run the phases `changes` invalidate for `project_id` as a new project; return the patch."""
+    started = time.perf_counter()
+    parent = phase_cache.get(project_id)
+    if parent is None:
+        raise ReplanError(f"No phase results cached for {project_id} (unknown, still running or expired) — run it again", 409)
+    constraints = merge_constraints(parent["constraints"], changes)
+    dirty = invalidated_phases(parent["constraints"], constraints)
+    old_plan = parent["results"]["report"]["plan"]
+    if not dirty:
+        return {"project_id": project_id, "parent_id": project_id, "constraints": constraints,
+                "invalidated": [], "reused": list(PIPELINE.order), "elapsed_s": 0.0, "patch": []}
+
+    new_id = f"proj_{uuid.uuid4().hex[:8]}"
+    current_project.set(new_id)
+    run = Run(
+        new_id, parent["intent"], Pacer(0.0),
+        speculative=parent["speculative"], intent_backend=parent["intent_backend"],
+        stream_suppliers=False, enrich_retail=False, constraints=constraints,
+    )
+    seed = {name: output for name, output in parent["results"].items() if name not in dirty}
+    invalidated = [name for name in PIPELINE.order if name in dirty]
+    reused = [name for name in PIPELINE.order if name not in dirty]
+    project_store.start(new_id, parent["intent"])
+    project_store.append(new_id, sse_event(log_entry(
+        "system", "System", "project_replanned",
+        f"Project {new_id} re-planned from {project_id}: re-running {', '.join(invalidated)}",
+        data={"parent_id": project_id, "constraints": constraints}, phase="initialization",
+    )))
+    try:
+        dag_run = await execute(run, seed=seed)
+    except Exception as e:
+        _record_logs(run)
+        project_store.append(new_id, sse_event({"type": "error", "message": str(e)[:300]}))
+        project_store.finish(new_id, "error")
+        if isinstance(e, ConstraintError):
+            raise ReplanError(f"Constraints cannot be met: {e}", 422) from e
+        raise
+    _record_logs(run)
+    plan = dag_run.results["report"]["plan"]
+    plan["execution"] = dag_run.breakdown()
+    plan["replanned_from"] = project_id
+    patch = json_patch(plan_content(old_plan), plan_content(plan))
+    project_store.append(new_id, sse_event({"type": "plan", "data": plan}))
+    project_store.append(new_id, sse_event({"type": "plan_patch", "data": {"parent_id": project_id, "patch": patch}}))
+    project_store.append(new_id, sse_event({"type": "complete"}))
+    project_store.save_plan(new_id, plan)
+    project_store.finish(new_id, "completed")
+    phase_cache.put(run, dag_run.results)
+
+    with phase_cache._lock:
+        phase_cache.replans += 1
+        phase_cache.phases_run += len(invalidated)
+        phase_cache.phases_reused += len(reused)
+    elapsed = time.perf_counter() - started
+    print(f"[Replan] {project_id} → {new_id}: re-ran {', '.join(invalidated)}; reused {', '.join(reused)} ({elapsed:.2f}s)")
+    return {
+        "project_id": new_id,
+        "parent_id": project_id,
+        "constraints": constraints,
+        "invalidated": invalidated,
+        "reused": reused,
+        "elapsed_s": round(elapsed, 3),
+        "patch": patch,
+    }
+
+
+def _record_logs(run):
+    """Store the log events the re-run phases queued (nobody streams them live)."""
+    while not run.events.empty():
+        chunk = run.events.get_nowait()
+        if chunk is not None:
+            project_store.append(run.project_id, chunk)
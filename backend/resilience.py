@@ -0,0 +1,248 @@
+"""
+Resilience — per-call deadlines, hedged requests and a circuit breaker for LLM calls.
+A call that has not answered by its agent's observed p95 gets a duplicate; whichever
+finishes first wins. When the provider error rate spikes the breaker opens and calls
+fail fast, so main.py drops straight to its deterministic fallbacks.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+CALL_DEADLINE_S = float(os.getenv("LLM_CALL_DEADLINE_S", "60"))
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "1") != "0"
+HEDGE_MIN_DELAY_S = float(os.getenv("LLM_HEDGE_MIN_DELAY_S", "2"))
+HEDGE_MIN_SAMPLES = 20     # no hedging until the p95 is meaningful
+LATENCY_SAMPLES = 200
+
+BREAKER_WINDOW_S = float(os.getenv("LLM_BREAKER_WINDOW_S", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "6"))
+BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "32")), thread_name_prefix="llm-call")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the provider while the breaker is open."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when no attempt finished within the call deadline."""
+
+
+class CallCancelled(RuntimeError):
+    """Raised instead of calling the provider once the caller no longer needs the result."""
+
+
+# threading.Event the caller sets when it gives up on a call (e.g. a discarded
+# speculative request); attempts check it before they reach the provider
+call_cancelled = contextvars.ContextVar("call_cancelled", default=None)
+
+
+def raise_if_cancelled(agent: str):
+    cancel = call_cancelled.get()
+    if cancel is not None and cancel.is_set():
+        raise CallCancelled(f"{agent} call cancelled by its caller")
+
+
+# ═══════════════════════════════════════════
+# Circuit breaker
+# ═══════════════════════════════════════════
+
+class CircuitBreaker:
+    """Error-rate breaker over a sliding time window with a single half-open probe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, ok)
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+
+    def _prune(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > BREAKER_WINDOW_S:
+            self._outcomes.popleft()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go to the provider now."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= BREAKER_COOLDOWN_S:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"LLM circuit breaker is {self.state} — using fallback")
+
+    def record(self, ok: bool):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip(now)
+                return
+            self._outcomes.append((now, ok))
+            self._prune(now)
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if (self.state == CLOSED and len(self._outcomes) >= BREAKER_MIN_CALLS
+                    and failures / len(self._outcomes) >= BREAKER_ERROR_RATE):
+                self._trip(now)
+
+    def abandon(self):
+        """An admitted call was cancelled before its outcome was known; free the half-open probe."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = False
+
+    def _trip(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self.trips += 1
+        print(f"[Breaker] Opened — provider error rate over threshold, failing fast for {BREAKER_COOLDOWN_S:.0f}s")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._prune(time.monotonic())
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self.state,
+                "window_calls": len(self._outcomes),
+                "window_error_rate": round(failures / len(self._outcomes), 3) if self._outcomes else 0.0,
+                "trips": self.trips,
+                "rejected_calls": self.rejected,
+            }
+
+
+# ═══════════════════════════════════════════
+# Latency tracking + hedging
+# ═══════════════════════════════════════════
+
+class LatencyTracker:
+    """Recent successful attempt latencies per agent, for p95-based hedge delays."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def observe(self, agent: str, latency_s: float):
+        with self._lock:
+            self._samples.setdefault(agent, deque(maxlen=LATENCY_SAMPLES)).append(latency_s)
+
+    def p95(self, agent: str):
+        with self._lock:
+            samples = sorted(self._samples.get(agent, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def snapshot(self) -> dict:
+        return {agent: self.p95(agent) for agent in list(self._samples)}
+
+
+class HedgeStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def record(self, hedged: bool, hedge_won: bool = False, timed_out: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.hedged += hedged
+            self.hedge_wins += hedge_won
+            self.deadline_exceeded += timed_out
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "hedge_win_rate": round(self.hedge_wins / self.hedged, 3) if self.hedged else 0.0,
+                "deadline_exceeded": self.deadline_exceeded,
+            }
+
+
+breaker = CircuitBreaker()
+latencies = LatencyTracker()
+hedge_stats = HedgeStats()
+
+
+def hedged_call(agent: str, attempt_fn, deadline_s: float):
+    """
+    Run attempt_fn(timeout_s) and, if it is slower than the agent's p95, race a
+    duplicate against it. Returns the first successful result; raises the last
+    error if every attempt fails, or DeadlineExceeded if none finishes in time.
+    """
+    started = time.monotonic()
+    end = started + deadline_s
+    submitted_at = {}  # future → its own start, so a winning hedge is timed from when it was sent
+
+    def submit():
+        now = time.monotonic()
+        remaining = max(end - now, 0.1)
+        # Each attempt carries the caller's context (e.g. its scheduler priority)
+        future = _pool.submit(contextvars.copy_context().run, attempt_fn, remaining)
+        submitted_at[future] = now
+        return future
+
+    primary = submit()
+    pending = {primary}
+    hedge = None
+    p95 = latencies.p95(agent) if HEDGING_ENABLED else None
+    hedge_at = started + max(p95, HEDGE_MIN_DELAY_S) if p95 is not None else None
+    last_error = None
+
+    while pending:
+        now = time.monotonic()
+        if now >= end:
+            break
+        timeout = end - now
+        if hedge is None and hedge_at is not None:
+            timeout = max(min(timeout, hedge_at - now), 0)
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                last_error = e
+                continue
+            latencies.observe(agent, time.monotonic() - submitted_at[future])
+            hedge_stats.record(hedged=hedge is not None, hedge_won=future is hedge)
+            return result
+        if hedge is None and hedge_at is not None and time.monotonic() >= hedge_at and pending:
+            hedge = submit()
+            pending.add(hedge)
+            print(f"[Hedge] {agent} call exceeded p95 ({p95:.1f}s) — sending duplicate request")
+
+    if pending or last_error is None:
+        hedge_stats.record(hedged=hedge is not None, timed_out=True)
+        raise DeadlineExceeded(f"{agent} call exceeded {deadline_s:.1f}s deadline")
+    hedge_stats.record(hedged=hedge is not None)
+    raise last_error
+
+
+def snapshot() -> dict:
+    return {
+        "breaker": breaker.snapshot(),
+        "hedging": {**hedge_stats.snapshot(), "enabled": HEDGING_ENABLED, "p95_s": latencies.snapshot()},
+        "call_deadline_s": CALL_DEADLINE_S,
+    }
@@ -0,0 +1,192 @@
+"""
+Retail Engine — rule-based retail pricing and delivery planning.
+Price, margin, packaging class and delivery offset are derived from the procurement
+costs and the product category, so the retailer phase no longer waits on an LLM.
+The Retailer Agent can still enrich a few descriptive text fields in the background.
+"""
+
+import hashlib
+import os
+
+# "rules" (default) prices deterministically; "llm" keeps the Retailer Agent on the critical path
+RETAIL_ENGINE = os.getenv("RETAIL_ENGINE", "rules").lower()
+RETAIL_ENRICHMENT = os.getenv("RETAIL_ENRICHMENT", "1") != "0"
+RETAIL_ENRICHMENT_TIMEOUT_S = float(os.getenv("RETAIL_ENRICHMENT_TIMEOUT_S", "20"))
+
+MIN_MARKUP = 1.05   # same floor main.py applies to agent-quoted prices
+
+# ═══════════════════════════════════════════
+# Category profiles
+# ═══════════════════════════════════════════
+
+CATEGORY_PROFILES = {
+    "automotive": {
+        "keywords": ["automotive", "vehicle", "car", "truck", "motor", "ev", "bike", "scooter"],
+        "margin": 18, "packaging": "crated_freight", "handling_days": 5,
+        "delivery_method": "white-glove freight delivery with handover inspection",
+        "warranty": "2 year / 40,000 km limited warranty",
+        "documentation": ["owner's manual", "service schedule", "certificate of conformity"],
+    },
+    "electronics": {
+        "keywords": ["electronic", "computer", "phone", "device", "drone", "sensor", "pcb", "laptop", "robot"],
+        "margin": 28, "packaging": "esd_protective_box", "handling_days": 2,
+        "delivery_method": "tracked parcel delivery",
+        "warranty": "1 year limited warranty",
+        "documentation": ["quick start guide", "safety information", "warranty card"],
+    },
+    "industrial": {
+        "keywords": ["industrial", "machine", "machinery", "equipment", "pump", "tool", "generator"],
+        "margin": 22, "packaging": "palletized", "handling_days": 4,
+        "delivery_method": "scheduled pallet freight",
+        "warranty": "1 year parts and labour warranty",
+        "documentation": ["installation manual", "maintenance guide", "CE declaration"],
+    },
+    "medical": {
+        "keywords": ["medical", "health", "clinical", "surgical"],
+        "margin": 35, "packaging": "sterile_sealed", "handling_days": 3,
+        "delivery_method": "temperature-logged courier",
+        "warranty": "2 year limited warranty",
+        "documentation": ["instructions for use", "regulatory declaration", "calibration certificate"],
+    },
+    "furniture": {
+        "keywords": ["furniture", "chair", "table", "desk", "sofa", "cabinet"],
+        "margin": 32, "packaging": "flat_pack_carton", "handling_days": 3,
+        "delivery_method": "two-person home delivery",
+        "warranty": "5 year structural warranty",
+        "documentation": ["assembly instructions", "care guide"],
+    },
+    "general": {
+        "keywords": [],
+        "margin": 25, "packaging": "standard_carton", "handling_days": 2,
+        "delivery_method": "standard carrier delivery",
+        "warranty": "1 year limited warranty",
+        "documentation": ["user manual", "warranty card"],
+    },
+}
+
+# Margin points and extra handling days added per assembly complexity
+COMPLEXITY_ADJUSTMENTS = {
+    "low": (-3, 0),
+    "medium": (0, 0),
+    "high": (4, 1),
+    "very_high": (7, 2),
+}
+
+# Packaging upgrades by order value — expensive goods get crated regardless of category
+VALUE_PACKAGING = [
+    (50000, "crated_freight"),
+    (5000, "reinforced_carton"),
+]
+
+PACKAGING_LABELS = {
+    "crated_freight": "Custom wooden crate with shock mounts and moisture barrier",
+    "reinforced_carton": "Double-wall reinforced carton with foam inserts",
+    "esd_protective_box": "Anti-static ESD box with molded foam inserts",
+    "palletized": "Shrink-wrapped pallet with corner protection",
+    "sterile_sealed": "Sealed sterile packaging inside a tamper-evident outer box",
+    "flat_pack_carton": "Flat-pack carton with edge protectors",
+    "standard_carton": "Standard protective carton",
+}
+
+NOTIFICATIONS = ["order confirmed", "shipped", "out for delivery", "delivered"]
+
+
+def _num(value, default=0.0) -> float:
+    try:
+        return float(value) if value else default
+    except (TypeError, ValueError):
+        return default
+
+
+def resolve_category(category: str, product_name: str = "") -> str:
+    """Map the intent analysis' free-text category (or the product name) to a profile key."""
+    text = f"{category or ''} {product_name or ''}".lower()
+    for key, profile in CATEGORY_PROFILES.items():
+        if key in text or any(kw in text.split() or kw + "s" in text.split() for kw in profile["keywords"]):
+            return key
+    return "general"
+
+
+def _tracking_number(project_id: str) -> str:
+    # Stable per project so replays and re-plans show the same number
+    return "OC" + hashlib.sha1(project_id.encode()).hexdigest()[:10].upper()
+
+
+# ═══════════════════════════════════════════
+# Rule-based plan
+# ═══════════════════════════════════════════
+
+def plan_retail(project_id: str, product_name: str, category: str, complexity: str, cost_data: dict) -> dict:
+    """
+    Build a retailer response with the same shape as the Retailer Agent's, computed
+    from cost_data (parts_cost_usd, shipping_cost_usd, total_procurement_cost_usd).
+    """
+    cost_data = cost_data or {}
+    parts = _num(cost_data.get("parts_cost_usd"))
+    shipping = _num(cost_data.get("shipping_cost_usd"))
+    total = _num(cost_data.get("total_procurement_cost_usd"), parts + shipping)
+
+    key = resolve_category(category, product_name)
+    profile = CATEGORY_PROFILES[key]
+    margin_adj, extra_days = COMPLEXITY_ADJUSTMENTS.get(str(complexity or "medium").lower(), (0, 0))
+    margin = max(profile["margin"] + margin_adj, round((MIN_MARKUP - 1) * 100))
+
+    packaging = profile["packaging"]
+    for threshold, upgrade in VALUE_PACKAGING:
+        if total >= threshold and packaging in ("standard_carton", "flat_pack_carton", "esd_protective_box", "reinforced_carton"):
+            packaging = upgrade
+            break
+
+    offset_days = profile["handling_days"] + extra_days + (1 if packaging == "crated_freight" else 0)
+    price = round(total * (1 + margin / 100), 2)
+
+    return {
+        "agent_id": "retailer_direct",
+        "project_id": project_id,
+        "status": "delivery_planned",
+        "delivery_plan": {
+            "packaging": PACKAGING_LABELS[packaging],
+            "packaging_class": packaging,
+            "delivery_method": profile["delivery_method"],
+            "estimated_delivery_date_offset_days": offset_days,
+            "tracking_number": _tracking_number(project_id),
+            "notifications": list(NOTIFICATIONS),
+        },
+        "customer_experience": {
+            "warranty": profile["warranty"],
+            "return_policy": "30-day returns" if key not in ("automotive", "industrial", "medical") else "14-day returns on unused goods",
+            "support_channel": "email and phone",
+            "documentation_included": list(profile["documentation"]),
+        },
+        "final_retail_price_usd": price,
+        "margin_percentage": margin,
+        "reasoning": (
+            f"Rule-based pricing for a {key} product ({complexity or 'medium'} complexity): "
+            f"${total:,.2f} procurement cost × (1 + {margin}% margin) = ${price:,.2f}. "
+            f"{PACKAGING_LABELS[packaging]}; {offset_days} days final-mile handling."
+        ),
+        "pricing_source": "rules",
+        "product_category": key,
+    }
+
+
+# Only descriptive text is taken from the agent. Numbers, warranty, returns, documentation
+# and the pricing reasoning are rule-engine facts and always stay as computed.
+ENRICHABLE_FIELDS = {
+    "delivery_plan": ("delivery_method",),
+    "customer_experience": ("support_channel",),
+}
+
+
+def merge_enrichment(plan: dict, agent_response: dict) -> dict:
+    """Return the sections of a rule-based plan with the agent's descriptive text overlaid."""
+    if not isinstance(agent_response, dict) or agent_response.get("status") == "error":
+        return {}
+    updates = {}
+    for section, fields in ENRICHABLE_FIELDS.items():
+        value = agent_response.get(section) or {}
+        text = {k: value[k].strip() for k in fields if isinstance(value.get(k), str) and value[k].strip()}
+        text = {k: v for k, v in text.items() if v != (plan.get(section) or {}).get(k)}
+        if text:
+            updates[section] = {**plan.get(section, {}), **text}
+    return updates
@@ -0,0 +1,256 @@
+"""
+LLM Scheduler — process-wide token-bucket rate limiter with priority queueing.
+Every provider call reserves one request and its estimated tokens before it is
+sent. Waiters are served strictly by priority (interactive before batch), FIFO
+within a priority, and budgets are corrected live from x-ratelimit-* headers.
+Callers block in acquire(); coroutines call it through asyncio.to_thread.
+"""
+
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))
+MAX_WAIT_SLICE = 0.25  # seconds between re-checks while queued
+
+# Priority of the LLM calls made from the current request/job. Threads started
+# through asyncio.to_thread inherit it; thread pools must copy the context.
+request_priority = contextvars.ContextVar("llm_request_priority", default=INTERACTIVE)
+
+
+def parse_priority(value) -> int:
+    """Map 'interactive' / 'batch' (or an int, clamped to those two) to a scheduler priority."""
+    if isinstance(value, int):
+        # A client-chosen number must not jump ahead of interactive work or sink below batch
+        return INTERACTIVE if value <= INTERACTIVE else BATCH
+    return PRIORITY_NAMES.get(str(value or "").lower(), INTERACTIVE)
+
+
+def _parse_duration(value):
+    """Parse provider reset/retry values such as '1s', '6m0s', '250ms' or '2'."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return total if matched else None
+
+
+def _header_int(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Continuously refilling budget; `level` may go negative after refunds are corrected."""
+
+    def __init__(self, capacity: float, refill_per_s: float):
+        self.capacity = capacity
+        self.refill_per_s = refill_per_s
+        self.level = capacity
+        self._stamp = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._stamp) * self.refill_per_s)
+        self._stamp = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it already is)."""
+        # A request larger than the whole bucket only needs a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_s if self.refill_per_s > 0 else MAX_WAIT_SLICE
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+    def reconfigure(self, limit: int = None, remaining: int = None, reset_s: float = None):
+        """Adopt the provider's view of the window: its limit and what is left of it."""
+        if limit:
+            self.capacity = float(limit)
+            self.refill_per_s = limit / 60.0
+        if remaining is not None:
+            self.level = min(self.level, float(remaining))
+            if reset_s and limit and remaining < limit:
+                # Refill at the rate that restores the budget by the reset time
+                self.refill_per_s = max(self.refill_per_s, (limit - remaining) / max(reset_s, 1.0))
+
+
+class LLMScheduler:
+    """Shared admission control for all LLM calls in this process."""
+
+    def __init__(self, rpm: int = RPM_LIMIT, tpm: int = TPM_LIMIT):
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._requests = TokenBucket(rpm, rpm / 60.0)
+        self._tokens = TokenBucket(tpm, tpm / 60.0)
+        self._queue = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._headers_seen = False
+        self._stats = {
+            "granted": {INTERACTIVE: 0, BATCH: 0},
+            "queued_s": {INTERACTIVE: 0.0, BATCH: 0.0},
+            "throttled": 0,
+            "rate_limited": 0,
+        }
+
+    # ── Admission ──
+
+    def _enqueue(self, priority: int):
+        ticket = (priority, next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _try_grant(self, ticket, tokens: int) -> float:
+        """Grant the ticket if it is at the head and budgets allow; else return seconds to wait."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._queue[0] != ticket:
+            return MAX_WAIT_SLICE
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+        if wait > 0:
+            return wait
+        heapq.heappop(self._queue)
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        return 0.0
+
+    def _granted(self, ticket, started: float):
+        waited = time.monotonic() - started
+        priority = ticket[0]
+        self._stats["granted"][priority] = self._stats["granted"].get(priority, 0) + 1
+        self._stats["queued_s"][priority] = self._stats["queued_s"].get(priority, 0.0) + waited
+        if waited > 0.05:
+            self._stats["throttled"] += 1
+        # The next waiter may now be at the head
+        self._cond.notify_all()
+
+    def acquire(self, tokens: int, priority: int = None):
+        """Block the calling thread until one request and `tokens` tokens are reserved."""
+        priority = request_priority.get() if priority is None else priority
+        started = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._try_grant(ticket, tokens)
+                    if wait <= 0:
+                        self._granted(ticket, started)
+                        return
+                    self._cond.wait(min(wait, MAX_WAIT_SLICE))
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+    def _abandon(self, ticket):
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._cond.notify_all()
+
+    def settle(self, reserved_tokens: int, used_tokens: int):
+        """Return the unused part of a reservation once real usage is known."""
+        if used_tokens is None or used_tokens >= reserved_tokens:
+            return
+        with self._cond:
+            self._tokens.give(reserved_tokens - used_tokens)
+            self._cond.notify_all()
+
+    # ── Provider feedback ──
+
+    def update_from_headers(self, headers):
+        """Adjust budgets from x-ratelimit-* response headers."""
+        if not headers:
+            return
+        limit_req = _header_int(headers, "x-ratelimit-limit-requests")
+        remaining_req = _header_int(headers, "x-ratelimit-remaining-requests")
+        limit_tok = _header_int(headers, "x-ratelimit-limit-tokens")
+        remaining_tok = _header_int(headers, "x-ratelimit-remaining-tokens")
+        if all(v is None for v in (limit_req, remaining_req, limit_tok, remaining_tok)):
+            return
+        with self._cond:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            self._requests.reconfigure(limit_req, remaining_req, _parse_duration(headers.get("x-ratelimit-reset-requests")))
+            self._tokens.reconfigure(limit_tok, remaining_tok, _parse_duration(headers.get("x-ratelimit-reset-tokens")))
+            self._headers_seen = True
+            self._cond.notify_all()
+
+    def backoff(self, retry_after_s: float):
+        """Pause all dispatch after a 429 — one stalled queue instead of a retry storm."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after_s)
+            self._stats["rate_limited"] += 1
+
+    # ── Introspection ──
+
+    def headroom(self) -> dict:
+        """Currently available request and token budget."""
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            return {
+                "remaining_requests": int(self._requests.level),
+                "remaining_tokens": int(self._tokens.level),
+                "limit_requests": int(self._requests.capacity),
+                "limit_tokens": int(self._tokens.capacity),
+                "source": "headers" if self._headers_seen else "configured",
+            }
+
+    def snapshot(self) -> dict:
+        headroom = self.headroom()
+        with self._lock:
+            return {
+                **headroom,
+                "queued": len(self._queue),
+                "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2),
+                "granted": {"interactive": self._stats["granted"][INTERACTIVE], "batch": self._stats["granted"][BATCH]},
+                "queued_s": {"interactive": round(self._stats["queued_s"][INTERACTIVE], 2), "batch": round(self._stats["queued_s"][BATCH], 2)},
+                "throttled": self._stats["throttled"],
+                "rate_limited": self._stats["rate_limited"],
+            }
+
+
+def retry_after_seconds(error, default: float) -> float:
+    """Read Retry-After (or the x-ratelimit reset) from a provider error response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for name in ("retry-after-ms", "retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = headers.get(name)
+        if value is None:
+            continue
+        seconds = _parse_duration(value)
+        if seconds is not None:
+            return seconds / 1000.0 if name == "retry-after-ms" else seconds
+    return default
+
+
+scheduler = LLMScheduler()
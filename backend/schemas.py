@@ -0,0 +1,379 @@
+"""
+Response Schemas — pydantic models for every agent's JSON reply.
+validate_response() coerces and repairs what can be fixed locally (numeric strings,
+missing totals, line-cost mismatches) and reports the list items it could not
+fix, so callers re-request just those instead of repeating the whole call.
+"""
+
+import math
+import re
+from typing import Annotated, Optional
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, ValidationError, ValidationInfo, model_validator
+
+LINE_COST_TOLERANCE = 0.02   # relative mismatch allowed before total_line_cost is recomputed
+
+
+class SchemaError(ValueError):
+    """Raised when an agent reply cannot be repaired into its schema."""
+
+
+# ═══════════════════════════════════════════
+# Coercion helpers
+# ═══════════════════════════════════════════
+
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_number(value):
+    """'$1,299.50' → 1299.5, '12 days' → 12.0, '10-20' → 10.0; None when nothing numeric."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    match = _NUMBER_RE.search(str(value).replace(",", ""))
+    return float(match.group()) if match else None
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(v) for v in value)
+    return str(value)
+
+
+def _string_list(value):
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [v if isinstance(v, (str, dict)) else str(v) for v in value]
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() not in ("false", "no", "0", "")
+    return bool(value) if value is not None else True
+
+
+Number = Annotated[Optional[float], BeforeValidator(parse_number)]
+Text = Annotated[str, BeforeValidator(_text)]
+TextList = Annotated[list, BeforeValidator(_string_list)]
+Flag = Annotated[bool, BeforeValidator(_flag)]
+
+
+def _repaired(info: ValidationInfo, message: str):
+    if info.context is not None:
+        info.context.setdefault("repairs", []).append(message)
+
+
+class AgentModel(BaseModel):
+    # Unknown keys pass through untouched so prompts can evolve without schema churn
+    model_config = ConfigDict(extra="allow")
+
+
+# ═══════════════════════════════════════════
+# Supplier
+# ═══════════════════════════════════════════
+
+class SupplierQuote(AgentModel):
+    component_name: Text
+    assigned_supplier: Text = ""
+    supplier_location: Text = ""
+    available: Flag = True
+    description: Text = ""
+    specifications: Text = ""
+    unit_cost_usd: Number = None
+    quantity: Number = None
+    total_line_cost: Number = None
+    lead_time_days: Number = 0
+    constraints: TextList = []
+    supplier_notes: Text = ""
+
+    @model_validator(mode="after")
+    def _repair_costs(self, info: ValidationInfo):
+        name = self.component_name or "?"
+        if not self.component_name.strip():
+            raise ValueError("quote has no component_name")
+        if not self.quantity or self.quantity < 1:
+            self.quantity = 1
+            _repaired(info, f"{name}: quantity defaulted to 1")
+        self.quantity = float(round(self.quantity))
+        unit, total = self.unit_cost_usd or 0, self.total_line_cost or 0
+        if unit <= 0 and total <= 0:
+            raise ValueError(f"{name}: no usable unit_cost_usd or total_line_cost")
+        if unit <= 0:
+            self.unit_cost_usd = round(total / self.quantity, 2)
+            _repaired(info, f"{name}: unit_cost_usd derived from total_line_cost")
+        expected = round(self.unit_cost_usd * self.quantity, 2)
+        if total <= 0:
+            self.total_line_cost = expected
+            _repaired(info, f"{name}: total_line_cost filled in")
+        elif abs(total - expected) > LINE_COST_TOLERANCE * expected:
+            self.total_line_cost = expected
+            _repaired(info, f"{name}: total_line_cost {total:,.2f} ≠ unit × quantity, set to {expected:,.2f}")
+        self.quantity = int(self.quantity)
+        self.lead_time_days = self.lead_time_days or 0
+        return self
+
+
+class SupplierResponse(AgentModel):
+    quotes: list = []
+
+
+# ═══════════════════════════════════════════
+# Manufacturer
+# ═══════════════════════════════════════════
+
+class AssemblyStep(AgentModel):
+    step: Number = None
+    description: Text = ""
+    duration_hours: Number = 0
+    dependencies: TextList = []
+
+
+class AssemblyPlan(AgentModel):
+    steps: list[AssemblyStep] = []
+    total_assembly_time_days: Number = None
+    facility: Text = ""
+    quality_checks: TextList = []
+
+    @model_validator(mode="after")
+    def _repair_duration(self, info: ValidationInfo):
+        if not self.total_assembly_time_days or self.total_assembly_time_days <= 0:
+            hours = sum(s.duration_hours or 0 for s in self.steps)
+            # 8-hour shifts; at least a day whenever there is any work
+            self.total_assembly_time_days = float(max(math.ceil(hours / 8), 1 if self.steps else 0))
+            _repaired(info, "assembly_plan.total_assembly_time_days derived from step hours")
+        return self
+
+
+class ManufacturerResponse(AgentModel):
+    selected_manufacturer: Text
+    manufacturer_location: Text = ""
+    can_assemble: Flag = True
+    assembly_plan: AssemblyPlan = AssemblyPlan()
+    estimated_completion_date_offset_days: Number = None
+    selection_rationale: Text = ""
+    constraints: TextList = []
+
+    @model_validator(mode="after")
+    def _require_selection(self, info: ValidationInfo):
+        if not self.selected_manufacturer.strip():
+            raise ValueError("no selected_manufacturer")
+        if not self.estimated_completion_date_offset_days:
+            self.estimated_completion_date_offset_days = self.assembly_plan.total_assembly_time_days
+        return self
+
+
+# ═══════════════════════════════════════════
+# Logistics
+# ═══════════════════════════════════════════
+
+class RouteSegment(AgentModel):
+    duration_days: Number = 0
+
+
+class LogisticsRoute(AgentModel):
+    route_id: Text = ""
+    provider: Text = ""
+    mode: Text = ""
+    segments: list[RouteSegment] = []
+    total_duration_days: Number = None
+    cost_usd: Number = None
+    insurance_cost_usd: Number = 0
+    risk_flags: TextList = []
+
+    @model_validator(mode="after")
+    def _repair_route(self, info: ValidationInfo):
+        if not self.cost_usd or self.cost_usd <= 0:
+            raise ValueError(f"route {self.route_id or '?'} has no cost_usd")
+        if not self.total_duration_days or self.total_duration_days <= 0:
+            self.total_duration_days = float(sum(s.duration_days or 0 for s in self.segments))
+            _repaired(info, f"route {self.route_id or '?'}: total_duration_days summed from segments")
+        return self
+
+
+class LogisticsResponse(AgentModel):
+    selected_provider: Text = ""
+    routes: list = []
+    recommended_route: Text = ""
+    selection_rationale: Text = ""
+    customs_requirements: TextList = []
+
+
+# ═══════════════════════════════════════════
+# Retailer
+# ═══════════════════════════════════════════
+
+class DeliveryPlan(AgentModel):
+    packaging: Text = ""
+    delivery_method: Text = ""
+    estimated_delivery_date_offset_days: Number = 0
+    tracking_number: Text = ""
+    notifications: TextList = []
+
+
+class RetailerResponse(AgentModel):
+    delivery_plan: DeliveryPlan = DeliveryPlan()
+    customer_experience: dict = {}
+    final_retail_price_usd: Number = None
+    margin_percentage: Number = None
+
+    @model_validator(mode="after")
+    def _repair_price(self, info: ValidationInfo):
+        total = parse_number(((info.context or {}).get("cost_data") or {}).get("total_procurement_cost_usd"))
+        if total and self.margin_percentage and not self.final_retail_price_usd:
+            self.final_retail_price_usd = round(total * (1 + self.margin_percentage / 100), 2)
+            _repaired(info, "final_retail_price_usd computed from margin_percentage")
+        if total and self.final_retail_price_usd and not self.margin_percentage:
+            self.margin_percentage = round((self.final_retail_price_usd / total - 1) * 100, 1)
+            _repaired(info, "margin_percentage derived from final_retail_price_usd")
+        return self
+
+
+# ═══════════════════════════════════════════
+# Procurement (intent analysis)
+# ═══════════════════════════════════════════
+
+class Component(AgentModel):
+    name: Text
+    category: Text = "general"
+    specifications: Text = ""
+    estimated_quantity: Number = 1
+    priority: Text = "standard"
+    estimated_unit_cost_usd: Number = 0
+
+    @model_validator(mode="after")
+    def _repair_component(self, info: ValidationInfo):
+        if not self.name.strip():
+            raise ValueError("component has no name")
+        self.estimated_quantity = max(int(self.estimated_quantity or 1), 1)
+        self.estimated_unit_cost_usd = self.estimated_unit_cost_usd or 0
+        return self
+
+
+COMPLEXITY_LEVELS = ("low", "medium", "high", "very_high")
+
+
+class IntentAnalysis(AgentModel):
+    product: Text
+    product_category: Text = "general"
+    components: list = []
+    total_estimated_components: Number = None
+    assembly_complexity: Text = "medium"
+
+    @model_validator(mode="after")
+    def _repair_summary(self, info: ValidationInfo):
+        level = self.assembly_complexity.strip().lower().replace(" ", "_").replace("-", "_")
+        if level not in COMPLEXITY_LEVELS:
+            _repaired(info, f"assembly_complexity {self.assembly_complexity!r} → medium")
+            level = "medium"
+        self.assembly_complexity = level
+        return self
+
+
+# ═══════════════════════════════════════════
+# Validation entry point
+# ═══════════════════════════════════════════
+
+# agent: (top-level model, list field validated item by item, item model)
+SCHEMAS = {
+    "supplier": (SupplierResponse, "quotes", SupplierQuote),
+    "manufacturer": (ManufacturerResponse, None, None),
+    "logistics": (LogisticsResponse, "routes", LogisticsRoute),
+    "retailer": (RetailerResponse, None, None),
+    "intent": (IntentAnalysis, "components", Component),
+}
+
+
+def _first_error(e: ValidationError) -> str:
+    err = e.errors()[0]
+    where = ".".join(str(p) for p in err.get("loc", ()))
+    msg = str(err.get("msg", e)).removeprefix("Value error, ")
+    return f"{where}: {msg}" if where else msg
+
+
+def validate_item(agent: str, item, context: dict = None):
+    """Validate one list item (a quote, route or component) on its own; None if unrepairable."""
+    item_model = SCHEMAS[agent][2]
+    try:
+        return item_model.model_validate(item, context={**(context or {}), "repairs": []}).model_dump()
+    except ValidationError:
+        return None
+
+
+def validate_response(agent: str, data, context: dict = None):
+    """
+    Validate and repair an agent reply. Returns (clean_dict, report) where report
+    lists the local repairs and the list items dropped as unrepairable. Raises
+    SchemaError when the reply as a whole is unusable.
+    """
+    if agent not in SCHEMAS:
+        return data, {"repairs": [], "invalid_items": []}
+    if not isinstance(data, dict):
+        raise SchemaError(f"{agent} reply is {type(data).__name__}, expected a JSON object")
+    model, list_field, item_model = SCHEMAS[agent]
+    ctx = {**(context or {}), "repairs": []}
+
+    try:
+        clean = model.model_validate(data, context=ctx).model_dump()
+    except ValidationError as e:
+        raise SchemaError(f"{agent} reply invalid — {_first_error(e)}") from e
+
+    invalid = []
+    if list_field:
+        items = []
+        raw_items = data.get(list_field) or []
+        if isinstance(raw_items, dict):
+            raw_items = [raw_items]
+        for idx, item in enumerate(raw_items):
+            item_ctx = {**ctx, "repairs": []}
+            try:
+                items.append(item_model.model_validate(item, context=item_ctx).model_dump())
+            except ValidationError as e:
+                invalid.append({"index": idx, "item": item, "error": _first_error(e)})
+                continue
+            ctx["repairs"].extend(item_ctx["repairs"])
+        clean[list_field] = items
+        if raw_items and not items:
+            raise SchemaError(f"{agent} reply has no valid {list_field} — {invalid[0]['error']}")
+
+    if agent == "supplier":
+        # Top-level total always matches the repaired lines
+        clean["total_estimated_cost"] = round(sum(q["total_line_cost"] for q in clean["quotes"]), 2)
+    return clean, {"repairs": ctx["repairs"], "invalid_items": invalid}
+
+
+# ═══════════════════════════════════════════
+# Structured-output schemas (provider-side)
+# ═══════════════════════════════════════════
+
+def _strict_object(properties: dict) -> dict:
+    # Strict structured output: every property required, nothing extra
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+
+INTENT_JSON_SCHEMA = _strict_object({
+    "product": {"type": "string"},
+    "product_category": {"type": "string"},
+    "components": {
+        "type": "array",
+        "items": _strict_object({
+            "name": {"type": "string"},
+            "category": {"type": "string"},
+            "specifications": {"type": "string"},
+            "estimated_quantity": {"type": "integer"},
+            "priority": {"type": "string", "enum": ["critical", "standard"]},
+            "estimated_unit_cost_usd": {"type": "number"},
+        }),
+    },
+    "total_estimated_components": {"type": "integer"},
+    "assembly_complexity": {"type": "string", "enum": list(COMPLEXITY_LEVELS)},
+    "notes": {"type": "string"},
+})
+
+RESPONSE_SCHEMAS = {
+    "intent": INTENT_JSON_SCHEMA,
+}
@@ -0,0 +1,142 @@
+"""
+Usage Ledger — token, cost and latency accounting for every LLM call.
+Each call is recorded with its prompt/completion/cached tokens, latency, retries and
+model, tagged with the project and phase it ran for, and rolled up per project,
+phase and agent for the final plan and /api/metrics.
+"""
+
+import contextvars
+import os
+import threading
+from collections import OrderedDict
+
+# Set by main.py for the duration of a run; inherited by to_thread and copied contexts
+current_project = contextvars.ContextVar("current_project", default="")
+# Set by each pipeline node (orchestration.in_phase) for the calls it makes
+current_phase = contextvars.ContextVar("current_phase", default="")
+
+USAGE_MAX_PROJECTS = int(os.getenv("USAGE_MAX_PROJECTS", "500"))
+
+# Phase each agent normally runs in, used for calls made outside a pipeline node (e.g. batch quotes)
+AGENT_PHASES = {
+    "procurement": "analysis",
+    "intent": "analysis",
+    "supplier": "supplier_coordination",
+    "manufacturer": "manufacturer_coordination",
+    "logistics": "logistics_coordination",
+    "retailer": "retailer_coordination",
+}
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "offline-standin": (0.0, 0.0, 0.0),
+}
+
+
+def _price(model: str):
+    override = [os.getenv(f"LLM_PRICE_{k}_PER_M") for k in ("INPUT", "CACHED", "OUTPUT")]
+    if all(v is not None for v in override):
+        return tuple(float(v) for v in override)
+    model = (model or "").lower()
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") price like their base model
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICES[name]
+    return MODEL_PRICES["gpt-4o-mini"]
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    input_price, cached_price, output_price = _price(model)
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+def _empty_row() -> dict:
+    return {
+        "calls": 0, "failed_calls": 0, "retries": 0,
+        "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+        "latency_s": 0.0, "cost_usd": 0.0,
+    }
+
+
+def _add(row: dict, rec: dict):
+    row["calls"] += 1
+    row["failed_calls"] += 0 if rec["ok"] else 1
+    row["retries"] += rec["retries"]
+    for k in ("prompt_tokens", "cached_tokens", "completion_tokens", "latency_s", "cost_usd"):
+        row[k] += rec[k]
+
+
+def _rounded(row: dict) -> dict:
+    return {**row, "latency_s": round(row["latency_s"], 3), "cost_usd": round(row["cost_usd"], 6)}
+
+
+class UsageLedger:
+    """Per-call records grouped by project, plus running totals per agent/phase/model."""
+
+    def __init__(self, max_projects: int = USAGE_MAX_PROJECTS):
+        self.max_projects = max_projects
+        self._lock = threading.Lock()
+        self._projects = OrderedDict()  # project_id -> [record, ...]
+        self._totals = {"agents": {}, "phases": {}, "models": {}}
+        self._all = _empty_row()
+
+    def record(self, agent: str, model: str = "", prompt_tokens: int = 0, cached_tokens: int = 0,
+               completion_tokens: int = 0, latency_s: float = 0.0, retries: int = 0, ok: bool = True,
+               project_id: str = None, phase: str = None) -> dict:
+        rec = {
+            "agent": agent,
+            "phase": phase or current_phase.get() or AGENT_PHASES.get(agent, "other"),
+            "model": model or "unknown",
+            "prompt_tokens": int(prompt_tokens or 0),
+            "cached_tokens": int(cached_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "latency_s": float(latency_s or 0.0),
+            "retries": int(retries or 0),
+            "ok": ok,
+        }
+        rec["cost_usd"] = estimate_cost(rec["model"], rec["prompt_tokens"], rec["cached_tokens"], rec["completion_tokens"])
+        project_id = project_id if project_id is not None else current_project.get()
+        with self._lock:
+            if project_id:
+                self._projects.setdefault(project_id, []).append(rec)
+                self._projects.move_to_end(project_id)
+                while len(self._projects) > self.max_projects:
+                    self._projects.popitem(last=False)
+            _add(self._all, rec)
+            for group, key in (("agents", rec["agent"]), ("phases", rec["phase"]), ("models", rec["model"])):
+                _add(self._totals[group].setdefault(key, _empty_row()), rec)
+        return rec
+
+    def project_summary(self, project_id: str) -> dict:
+        """Totals for one project, broken down by phase and by agent."""
+        with self._lock:
+            records = list(self._projects.get(project_id, ()))
+        totals, by_phase, by_agent = _empty_row(), {}, {}
+        for rec in records:
+            _add(totals, rec)
+            _add(by_phase.setdefault(rec["phase"], _empty_row()), rec)
+            _add(by_agent.setdefault(rec["agent"], _empty_row()), rec)
+        return {
+            "totals": _rounded(totals),
+            "by_phase": {k: _rounded(v) for k, v in by_phase.items()},
+            "by_agent": {k: _rounded(v) for k, v in by_agent.items()},
+            "models": sorted({rec["model"] for rec in records}),
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "totals": _rounded(self._all),
+                "by_agent": {k: _rounded(v) for k, v in self._totals["agents"].items()},
+                "by_phase": {k: _rounded(v) for k, v in self._totals["phases"].items()},
+                "by_model": {k: _rounded(v) for k, v in self._totals["models"].items()},
+                "projects_tracked": len(self._projects),
+            }
+
+
+usage_ledger = UsageLedger()
@@ -0,0 +1,174 @@
+"""
+Plan Views — field projection and summary views of the execution plan.
+`fields=cost_summary,timeline,suppliers.quote_count` keeps only those paths;
+`view=summary` replaces the large sections with references that clients fetch
+lazily from /api/projects/{id}/plan/{section}. The shared full plan event is
+projected once per distinct view and the result reused by every viewer asking
+for the same one; plan_update events (a partial plan) get the same projection.
+"""
+
+from encoding import dumps, loads, sse_event
+
+VIEWS = ("full", "summary")
+
+# Sections a summary view sends as references instead of inline
+LAZY_SECTIONS = (
+    "components",
+    "suppliers.quotes",
+    "suppliers.selected_details",
+    "manufacturer.assembly_plan",
+    "coordination_report",
+    "report_facts",
+    "llm_usage",
+    "execution",
+)
+
+
+def parse_view(value) -> str:
+    value = str(value or "full").lower()
+    return value if value in VIEWS else "full"
+
+
+def parse_fields(value):
+    """'a, b.c' or ['a', 'b.c'] → ('a', 'b.c'); empty → None (everything)."""
+    if not value:
+        return None
+    parts = value.split(",") if isinstance(value, str) else [str(v) for v in value]
+    fields = tuple(sorted({p.strip().strip(".") for p in parts if p.strip().strip(".")}))
+    return fields or None
+
+
+def section_url(project_id: str, path: str) -> str:
+    return f"/api/projects/{project_id}/plan/{path.replace('.', '/')}"
+
+
+def get_path(data, path: str):
+    """(True, value) for a dotted path into nested dicts, else (False, None)."""
+    for key in path.split("."):
+        if not isinstance(data, dict) or key not in data:
+            return False, None
+        data = data[key]
+    return True, data
+
+
+def _set_path(data: dict, path: str, value):
+    keys = path.split(".")
+    for key in keys[:-1]:
+        data = data.setdefault(key, {})
+    data[keys[-1]] = value
+
+
+def _reference(project_id: str, path: str, value) -> dict:
+    ref = {"$ref": section_url(project_id, path)}
+    if isinstance(value, (list, dict)):
+        ref["items"] = len(value)
+    return ref
+
+
+def project_plan(plan: dict, view: str = "full", fields=None) -> dict:
+    """The plan reduced to `fields` (dotted paths), with large sections as refs in a summary view."""
+    if view == "full" and not fields:
+        return plan
+    project_id = plan.get("project_id", "")
+    if fields:
+        out = {"project_id": project_id}
+        for path in fields:
+            found, value = get_path(plan, path)
+            if found:
+                _set_path(out, path, value)
+    else:
+        out = dict(plan)
+    if view == "summary":
+        for path in LAZY_SECTIONS:
+            found, value = get_path(out, path)
+            if found and not (isinstance(value, dict) and "$ref" in value):
+                # Copy the containing dicts so the shared plan is never modified
+                parent_path, _, key = path.rpartition(".")
+                parent = out
+                if parent_path:
+                    for part in parent_path.split("."):
+                        parent[part] = dict(parent[part])
+                        parent = parent[part]
+                parent[key] = _reference(project_id, path, value)
+    return out
+
+
+def project_update(data: dict, view: str = "full", fields=None):
+    """A plan_update's partial plan projected like the plan, or None when nothing in it is wanted."""
+    out = project_plan(data, view, fields)
+    if out is data:
+        return data
+    return out if any(key != "project_id" for key in out) else None
+
+
+def wants_report(view: str, fields) -> bool:
+    """Whether a viewer gets the report event; a fields projection only when it lists coordination_report."""
+    if fields:
+        return any(f == "coordination_report" or f.startswith("coordination_report.") for f in fields)
+    return view == "full"
+
+
+# ═══════════════════════════════════════════
+# Per-viewer projection of the event stream
+# ═══════════════════════════════════════════
+
+class TaggedChunk(bytes):
+    """An encoded event that keeps the object it encodes so viewers can project it."""
+
+    def __new__(cls, chunk: bytes, kind: str, data):
+        obj = super().__new__(cls, chunk)
+        obj.kind = kind
+        obj.data = data
+        obj.variants = {}
+        return obj
+
+
+def plan_variant(chunk: TaggedChunk, view: str, fields) -> bytes:
+    key = (view, fields)
+    if key not in chunk.variants:
+        if chunk.kind == "plan_update":
+            data = project_update(chunk.data, view, fields)
+            chunk.variants[key] = None if data is None else sse_event({"type": "plan_update", "data": data})
+        else:
+            chunk.variants[key] = sse_event({"type": "plan", "data": project_plan(chunk.data, view, fields)})
+    return chunk.variants[key]
+
+
+def stream_projection(view: str, fields):
+    """
+    Transform for Job.follow(): chunk → chunk to send, or None to skip. None when the
+    viewer wants the full stream (no work per event).
+    """
+    if view == "full" and not fields:
+        return None
+    send_report = wants_report(view, fields)
+
+    def transform(chunk):
+        kind = getattr(chunk, "kind", None)
+        if kind in ("plan", "plan_update"):
+            return plan_variant(chunk, view, fields)
+        if kind == "report" and not send_report:
+            return None
+        return chunk
+
+    return transform
+
+
+def replay_projection(view: str, fields):
+    """Like stream_projection, for stored (type, payload) rows."""
+    if view == "full" and not fields:
+        return None
+    send_report = wants_report(view, fields)
+
+    def transform(event_type: str, payload: bytes):
+        if event_type == "plan":
+            event = loads(payload)
+            return dumps({"type": "plan", "data": project_plan(event.get("data", {}), view, fields)})
+        if event_type == "plan_update":
+            data = project_update(loads(payload).get("data", {}), view, fields)
+            return None if data is None else dumps({"type": "plan_update", "data": data})
+        if event_type == "report" and not send_report:
+            return None
+        return payload
+
+    return transform
@@ -211,6 +211,11 @@ export default function DashboardPage() {
                 console.log("[OneClickAI] Plan received:", Object.keys(data.data || {}));
                 console.log("[OneClickAI] Plan has coordination_report:", !!data.data?.coordination_report);
                 updateProject(pid, { plan: data.data });
+              } else if (data.type === "plan_update") {
+                // Background enrichment (retailer text, final LLM usage) merged into the plan
+                setProjects(prev => prev.map(p =>
+                  p.id === pid && p.plan ? { ...p, plan: { ...p.plan, ...data.data } } : p
+                ));
               } else if (data.type === "complete") {
                 updateProject(pid, { status: "completed" });
               }
@@ -594,8 +599,9 @@ function ExecutionPlan({ plan, separateReport }) {
   });
   const toggle = (key) => setOpenSections(prev => ({ ...prev, [key]: !prev[key] }));
 
-  // Use plan's coordination_report if available, otherwise fall back to separate report event
-  const report = plan.coordination_report || separateReport || {};
+  // Use plan's coordination_report if inline, otherwise the separate report event (the plan only references it)
+  const inlineReport = plan.coordination_report?.$ref ? null : plan.coordination_report;
+  const report = inlineReport || separateReport || {};
   console.log("[OneClickAI] Rendering report — keys:", Object.keys(report), "discovery_paths:", report.discovery_paths?.length, "messages:", report.message_exchanges?.length);
 
   return (
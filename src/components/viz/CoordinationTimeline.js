@@ -20,7 +20,9 @@ export default function CoordinationTimeline({ plan, report, logs }) {
     if (!plan) return [];
 
     const timeline = plan.timeline || {};
-    const cr = plan.coordination_report || report || {};
+    // The plan only references the report ({$ref}) — use the streamed/fetched one then
+    const inline = plan.coordination_report?.$ref ? null : plan.coordination_report;
+    const cr = inline || report || {};
     const supplierDays = Number(timeline.parts_procurement_days) || 0;
     const assemblyDays = Number(timeline.assembly_days) || 0;
     const shippingDays = Number(timeline.shipping_days) || 0;
@@ -39,7 +39,9 @@ function normalizeName(raw) {
 export default function MessageFlow({ plan, report }) {
   const scrollRef = useRef(null);
   const messages = useMemo(() => {
-    const cr = plan?.coordination_report || report || {};
+    // The plan only references the report ({$ref}) — use the streamed/fetched one then
+    const inline = plan?.coordination_report?.$ref ? null : plan?.coordination_report;
+    const cr = inline || report || {};
     return (cr.message_exchanges || []).map((m, i) => ({
       id: i,
       from: normalizeName(m.from),